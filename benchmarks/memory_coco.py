@@ -0,0 +1,164 @@
+"""
+Memory used by decoded COCO annotations and evaluation boxes, against copies of the classes with an instance
+__dict__.
+
+Usage:
+    memory_coco.py [options]
+
+Options:
+    --num=<int>         Number of objects of each kind [default: 100000]
+    --output=<file>     JSON results file [default: memory_results.json]
+"""
+import gc
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import docopt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from podm.coco_decoder import parse_bounding_box, parse_segments, parse_image  # noqa: E402
+from podm.metrics import BoundingBox  # noqa: E402
+
+
+# the classes as they were before slots: one instance __dict__ each, an empty attributes dict per annotation and a
+# timestamp per image
+class DictBoundingBox:
+    def __init__(self, image, category, xtl, ytl, xbr, ybr, score):
+        self.xtl = xtl
+        self.ytl = ytl
+        self.xbr = xbr
+        self.ybr = ybr
+        self.image = image
+        self.category = category
+        self.score = score
+
+
+class DictPCOCOAnnotation:
+    def __init__(self):
+        self.id = None
+        self.image_id = None
+        self.score = None
+        self.contributor = ''
+        self.attributes = {}
+        self.category_id = None
+
+
+class DictPCOCOBoundingBox(DictPCOCOAnnotation):
+    def __init__(self):
+        super(DictPCOCOBoundingBox, self).__init__()
+        self.xtl = None
+        self.ytl = None
+        self.xbr = None
+        self.ybr = None
+
+
+class DictPCOCOSegments(DictPCOCOAnnotation):
+    def __init__(self):
+        super(DictPCOCOSegments, self).__init__()
+        self.segmentation = []
+        self.iscrowd = False
+
+
+class DictPCOCOImage:
+    def __init__(self):
+        self.id = None
+        self.width = 0
+        self.height = 0
+        self.file_name = ''
+        self.license = None
+        self.flickr_url = ''
+        self.coco_url = ''
+        self.date_captured = datetime.now().strftime('%m/%d/%Y')
+
+
+def dict_parse_bounding_box(obj):
+    ann = DictPCOCOBoundingBox()
+    ann.id = obj['id']
+    ann.category_id = obj['category_id']
+    ann.image_id = obj['image_id']
+    ann.xtl = obj['bbox'][0]
+    ann.ytl = obj['bbox'][1]
+    ann.xbr = ann.xtl + obj['bbox'][2]
+    ann.ybr = ann.ytl + obj['bbox'][3]
+    if 'score' in obj:
+        ann.score = obj['score']
+    return ann
+
+
+def dict_parse_segments(obj):
+    ann = DictPCOCOSegments()
+    ann.id = obj['id']
+    ann.category_id = obj['category_id']
+    ann.image_id = obj['image_id']
+    ann.iscrowd = obj['iscrowd']
+    ann.segmentation = obj['segmentation']
+    return ann
+
+
+def dict_parse_image(obj):
+    img = DictPCOCOImage()
+    img.id = obj['id']
+    img.height = obj['height']
+    img.width = obj['width']
+    img.file_name = obj['file_name']
+    img.flickr_url = obj['flickr_url']
+    img.coco_url = obj['coco_url']
+    img.date_captured = obj['date_captured']
+    img.license = obj['license']
+    return img
+
+
+def dict_bounding_box(i):
+    return DictBoundingBox(i, 1, 10., 20., 30., 40., .5)
+
+
+def slot_bounding_box(i):
+    return BoundingBox.of_bbox(i, 1, 10., 20., 30., 40., .5)
+
+
+def measure(function, objs) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = [function(obj) for obj in objs]
+    seconds = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {'seconds': seconds, 'bytes': current, 'bytes_per_object': current / max(1, len(objs))}
+
+
+def main():
+    args = docopt.docopt(__doc__)
+    n = int(args['--num'])
+    bbox_objs = [{'id': i, 'image_id': i // 10, 'category_id': 1, 'bbox': [10., 20., 30., 40.], 'score': .5}
+                 for i in range(n)]
+    segment_objs = [{'id': i, 'image_id': i // 10, 'category_id': 1, 'iscrowd': 0,
+                     'segmentation': [[10., 20., 10., 40., 30., 40.]]} for i in range(n)]
+    image_objs = [{'id': i, 'height': 480, 'width': 640, 'file_name': '%d.jpg' % i, 'flickr_url': '', 'coco_url': '',
+                   'date_captured': '01/01/2022', 'license': None} for i in range(n)]
+
+    kinds = {
+        'BoundingBox': (dict_bounding_box, slot_bounding_box, range(n)),
+        'PCOCOBoundingBox': (dict_parse_bounding_box, parse_bounding_box, bbox_objs),
+        'PCOCOSegments': (dict_parse_segments, parse_segments, segment_objs),
+        'PCOCOImage': (dict_parse_image, parse_image, image_objs),
+    }
+    results = {'num': n, 'results': {}}
+    for kind, (dict_function, slot_function, objs) in kinds.items():
+        before = measure(dict_function, objs)
+        after = measure(slot_function, objs)
+        results['results'][kind] = {'dict': before, 'slots': after}
+        print('%-18s %8.1f -> %8.1f bytes/object, %.3fs -> %.3fs'
+              % (kind, before['bytes_per_object'], after['bytes_per_object'], before['seconds'], after['seconds']))
+    with open(args['--output'], 'w') as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
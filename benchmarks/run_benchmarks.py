@@ -0,0 +1,148 @@
+"""
+Time and memory-profile the stages of the PASCAL VOC metrics on synthetic data.
+
+Usage:
+    run_benchmarks.py [options]
+
+Options:
+    --sizes=<list>              Comma-separated numbers of ground truths [default: 1000,100000,1000000]
+    --categories=<int>          Number of categories [default: 20]
+    --boxes-per-image=<int>     Average number of ground truths per image [default: 10]
+    --repeat=<int>              Number of timed runs of each stage, the fastest one is reported [default: 3]
+    --max-object-boxes=<int>    Largest size for the stages that use one Python object per box [default: 100000]
+    --seed=<int>                Seed of the synthetic data [default: 0]
+    --output=<file>             JSON results file [default: benchmark_results.json]
+"""
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import docopt
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+from synthetic import generate  # noqa: E402
+from podm.box import intersection_over_union  # noqa: E402
+from podm.columnar import EvaluationIndex, match_category, greedy_assign  # noqa: E402
+from podm.metrics import get_pascal_voc_metrics, get_pascal_voc_metrics_array, get_metric_per_class, \
+    MethodAveragePrecision  # noqa: E402
+
+
+def measure(function, repeat: int):
+    """
+    Returns:
+        the result of the last run, and a dict with the fastest time in seconds and the peak traced memory in bytes
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    # memory is traced in a separate run, tracing slows down the allocations
+    gc.collect()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {'seconds': min(times), 'peak_bytes': peak}
+
+
+def benchmark_size(num_boxes: int, args) -> dict:
+    repeat = int(args['--repeat'])
+    dataset = generate(num_boxes, int(args['--categories']), int(args['--boxes-per-image']),
+                       seed=int(args['--seed']))
+    stages = {}
+
+    def grouping():
+        return (EvaluationIndex(dataset.gold_image, dataset.gold_category, dataset.gold_xyxy),
+                EvaluationIndex(dataset.pred_image, dataset.pred_category, dataset.pred_xyxy, dataset.pred_score))
+
+    (gold_index, pred_index), stages['grouping'] = measure(grouping, repeat)
+
+    def matching():
+        return [match_category(gold_index, pred_index, c) for c in pred_index.categories]
+
+    matches, stages['matching'] = measure(matching, repeat)
+
+    def assignment():
+        return [greedy_assign(best_gt, best_iou, 0.5) for _, best_gt, best_iou, _ in matches]
+
+    tps, stages['assignment'] = measure(assignment, repeat)
+
+    for method in MethodAveragePrecision:
+        def ap():
+            return [get_metric_per_class(c, t, 1 - t, npos, method) for c, t, (_, _, _, npos)
+                    in zip(pred_index.categories, tps, matches)]
+
+        _, stages['ap_' + method.name] = measure(ap, repeat)
+
+    def end_to_end_array():
+        return get_pascal_voc_metrics_array(dataset.gold_image, dataset.gold_category, dataset.gold_xyxy,
+                                            dataset.pred_image, dataset.pred_category, dataset.pred_score,
+                                            dataset.pred_xyxy)
+
+    _, stages['end_to_end_array'] = measure(end_to_end_array, repeat)
+
+    if num_boxes <= int(args['--max-object-boxes']):
+        golds, preds = dataset.to_bounding_boxes()
+        for columnar in (False, True):
+            def end_to_end():
+                return get_pascal_voc_metrics(golds, preds, columnar=columnar)
+
+            _, stages['end_to_end_%s' % ('columnar' if columnar else 'object')] = measure(end_to_end, repeat)
+
+        pairs = list(zip(golds, preds))
+
+        def scalar_iou():
+            return [intersection_over_union(g, p) for g, p in pairs]
+
+        _, stages['scalar_iou'] = measure(scalar_iou, repeat)
+        stages['scalar_iou']['pairs'] = len(pairs)
+
+    return {
+        'num_groundtruths': num_boxes,
+        'num_detections': len(dataset.pred_image),
+        'num_images': dataset.num_images,
+        'num_categories': dataset.num_categories,
+        'stages': stages,
+    }
+
+
+def get_environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def main():
+    args = docopt.docopt(__doc__)
+    results = {'environment': get_environment(), 'results': []}
+    for size in args['--sizes'].split(','):
+        result = benchmark_size(int(size), args)
+        results['results'].append(result)
+        for stage, values in result['stages'].items():
+            print('%8d %-32s %10.4fs %10.1fMB' % (result['num_groundtruths'], stage, values['seconds'],
+                                                  values['peak_bytes'] / 2 ** 20))
+    with open(args['--output'], 'w') as fp:
+        json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
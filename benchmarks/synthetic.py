@@ -0,0 +1,106 @@
+"""
+Deterministic synthetic object detection data for benchmarks.
+
+Ground truths are random boxes inside fixed-size images. Every ground truth is detected with probability `recall`
+by a jittered copy of itself, and false positives are random boxes. Detections of ground truths get higher scores
+than false positives on average.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+from podm.metrics import BoundingBox
+
+
+class SyntheticDataset:
+    """
+    Ground truths and predictions stored as arrays, as taken by `get_pascal_voc_metrics_array`.
+    """
+    def __init__(self):
+        self.num_images = 0  # type: int
+        self.num_categories = 0  # type: int
+        self.image_width = None  # type: None or np.ndarray
+        self.image_height = None  # type: None or np.ndarray
+        self.gold_image = None  # type: None or np.ndarray
+        self.gold_category = None  # type: None or np.ndarray
+        self.gold_xyxy = None  # type: None or np.ndarray
+        self.pred_image = None  # type: None or np.ndarray
+        self.pred_category = None  # type: None or np.ndarray
+        self.pred_score = None  # type: None or np.ndarray
+        self.pred_xyxy = None  # type: None or np.ndarray
+
+    def to_bounding_boxes(self) -> Tuple[List[BoundingBox], List[BoundingBox]]:
+        """
+        Returns:
+            ground truth bounding boxes, detected bounding boxes
+        """
+        golds = [BoundingBox.of_bbox(int(i), int(c), *xyxy)
+                 for i, c, xyxy in zip(self.gold_image, self.gold_category, self.gold_xyxy.tolist())]
+        preds = [BoundingBox.of_bbox(int(i), int(c), *xyxy, score=float(s))
+                 for i, c, s, xyxy in zip(self.pred_image, self.pred_category, self.pred_score,
+                                          self.pred_xyxy.tolist())]
+        return golds, preds
+
+
+def _random_boxes(rng: np.random.Generator, width: np.ndarray, height: np.ndarray,
+                  min_size: float = 8, max_size: float = 128) -> np.ndarray:
+    w = np.minimum(rng.uniform(min_size, max_size, len(width)), width)
+    h = np.minimum(rng.uniform(min_size, max_size, len(height)), height)
+    xtl = rng.uniform(0, width - w)
+    ytl = rng.uniform(0, height - h)
+    return np.stack((xtl, ytl, xtl + w, ytl + h), axis=1)
+
+
+def generate(num_boxes: int,
+             num_categories: int = 20,
+             boxes_per_image: int = 10,
+             recall: float = 0.8,
+             false_positive_rate: float = 0.5,
+             jitter: float = 0.1,
+             image_size: Tuple[int, int] = (640, 480),
+             seed: int = 0) -> SyntheticDataset:
+    """
+    Generate ground truths and noisy predictions.
+
+    Args:
+        num_boxes: number of ground truths
+        num_categories: number of categories
+        boxes_per_image: average number of ground truths per image
+        recall: probability that a ground truth is detected
+        false_positive_rate: number of false positives per ground truth
+        jitter: standard deviation of the detection noise, relative to the box size
+        image_size: width and height of the images
+        seed: seed of the random generator
+    """
+    rng = np.random.default_rng(seed)
+    dataset = SyntheticDataset()
+    dataset.num_images = max(1, num_boxes // boxes_per_image)
+    dataset.num_categories = num_categories
+    dataset.image_width = np.full(dataset.num_images, image_size[0], dtype=float)
+    dataset.image_height = np.full(dataset.num_images, image_size[1], dtype=float)
+
+    # ground truths
+    dataset.gold_image = np.sort(rng.integers(0, dataset.num_images, num_boxes))
+    dataset.gold_category = rng.integers(0, num_categories, num_boxes)
+    dataset.gold_xyxy = _random_boxes(rng, dataset.image_width[dataset.gold_image],
+                                      dataset.image_height[dataset.gold_image])
+
+    # detections of ground truths
+    detected = np.flatnonzero(rng.random(num_boxes) < recall)
+    xyxy = dataset.gold_xyxy[detected]
+    size = np.repeat(xyxy[:, 2:] - xyxy[:, :2], 2, axis=0).reshape(-1, 4)
+    xyxy = xyxy + rng.normal(0, jitter, xyxy.shape) * size
+    xyxy[:, 2:] = np.maximum(xyxy[:, 2:], xyxy[:, :2])
+    scores = rng.beta(5, 2, len(detected))
+
+    # false positives
+    num_fps = int(num_boxes * false_positive_rate)
+    fp_image = rng.integers(0, dataset.num_images, num_fps)
+    fp_xyxy = _random_boxes(rng, dataset.image_width[fp_image], dataset.image_height[fp_image])
+
+    dataset.pred_image = np.concatenate((dataset.gold_image[detected], fp_image))
+    dataset.pred_category = np.concatenate((dataset.gold_category[detected],
+                                            rng.integers(0, num_categories, num_fps)))
+    dataset.pred_score = np.concatenate((scores, rng.beta(2, 5, num_fps)))
+    dataset.pred_xyxy = np.concatenate((xyxy, fp_xyxy))
+    return dataset
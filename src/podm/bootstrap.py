@@ -0,0 +1,234 @@
+"""
+Bootstrap confidence intervals for AP and mAP.
+
+The detections are matched once. Resampling images with replacement is then the same as weighting every image by
+the number of times it is drawn: the cumulative tp/fp counts become weighted cumulative sums, and the number of ground
+truths a weighted count. An image drawn k times contributes k identical detections next to each other in the score
+order, which does not change the interpolated AP, so the weighted AP is the AP of the resampled dataset.
+"""
+import warnings
+from typing import List, Any, Tuple
+
+import numpy as np
+
+from podm.box import BBFormat
+from podm.columnar import match_category, greedy_assign
+from podm.metrics import BoundingBox, MethodAveragePrecision, _get_columns, _get_category_sizes, _map_chunks, \
+    _get_indexes
+
+# number of resamples drawn from one random generator. Fixed so that results do not depend on n_jobs.
+RESAMPLES_PER_CHUNK = 32
+# maximum number of (resample, detection) values held at once
+MAX_ELEMENTS = 1 << 22
+
+
+class BootstrapResult:
+    """
+    labels: (C,) category labels
+    ap: (C,) average precision of each category on the original data
+    mAP: mAP on the original data
+    ap_samples: (B, C) average precision of each category on each resample (nan if a resample has no ground truth)
+    mAP_samples: (B,) mAP on each resample
+    """
+    def __init__(self):
+        self.labels = None  # type: None or List[Any]
+        self.ap = None  # type: None or np.ndarray
+        self.mAP = None  # type: None or float
+        self.ap_samples = None  # type: None or np.ndarray
+        self.mAP_samples = None  # type: None or np.ndarray
+
+    def ap_interval(self, confidence: float = 0.95) -> np.ndarray:
+        """
+        Returns:
+            (C, 2) percentile confidence interval of the AP of each category (nan if it has no ground truth)
+        """
+        alpha = (1 - confidence) / 2 * 100
+        with warnings.catch_warnings():
+            # categories without ground truths have no AP
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.nanpercentile(self.ap_samples, [alpha, 100 - alpha], axis=0).T
+
+    def mAP_interval(self, confidence: float = 0.95) -> np.ndarray:
+        """
+        Returns:
+            (2,) percentile confidence interval of the mAP
+        """
+        alpha = (1 - confidence) / 2 * 100
+        return np.nanpercentile(self.mAP_samples, [alpha, 100 - alpha])
+
+
+def bootstrap_pascal_voc_metrics(gold_standard: List[BoundingBox],
+                                 predictions: List[BoundingBox],
+                                 iou_threshold: float = 0.5,
+                                 method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation,
+                                 num_samples: int = 1000,
+                                 seed: int = None,
+                                 n_jobs: int = 1) -> BootstrapResult:
+    """Bootstrap the metrics used by the VOC Pascal 2012 challenge by resampling images.
+
+    Args:
+        gold_standard: ground truth bounding boxes;
+        predictions: detected bounding boxes;
+        iou_threshold: IOU threshold indicating which detections will be considered TP or FP (default value = 0.5);
+        method: AllPointsInterpolation, ElevenPointsInterpolation or HundredOnePointsInterpolation;
+        num_samples: number of resamples (default value = 1000);
+        seed: seed of the random generator;
+        n_jobs: number of processes that compute the resamples. None or -1 uses all CPUs (default value = 1);
+    Returns:
+        AP and mAP on the original data and on each resample.
+    """
+    categories, (gold_image, gold_category, _, gold_xyxy), (pred_image, pred_category, pred_score, pred_xyxy) = \
+        _get_columns(gold_standard, predictions)
+    return bootstrap_pascal_voc_metrics_array(gold_image, gold_category, gold_xyxy,
+                                              pred_image, pred_category, pred_score, pred_xyxy,
+                                              iou_threshold, method, num_samples, seed, n_jobs, categories)
+
+
+def bootstrap_pascal_voc_metrics_array(gold_image: np.ndarray,
+                                       gold_category: np.ndarray,
+                                       gold_xyxy: np.ndarray,
+                                       pred_image: np.ndarray,
+                                       pred_category: np.ndarray,
+                                       pred_score: np.ndarray,
+                                       pred_xyxy: np.ndarray,
+                                       iou_threshold: float = 0.5,
+                                       method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation,
+                                       num_samples: int = 1000,
+                                       seed: int = None,
+                                       n_jobs: int = 1,
+                                       category_labels: List[Any] = None,
+                                       num_images: int = None,
+                                       bbox_format: BBFormat = BBFormat.X1Y1X2Y2,
+                                       image_width: np.ndarray = None,
+                                       image_height: np.ndarray = None) -> BootstrapResult:
+    """Bootstrap the metrics used by the VOC Pascal 2012 challenge from boxes stored as arrays.
+
+    See `bootstrap_pascal_voc_metrics` and `get_pascal_voc_metrics_array` for the arguments.
+
+    Args:
+        num_images: number of images to resample, image indexes are in [0, num_images). Default is the largest image
+            index + 1.
+    """
+    pred_image = np.asarray(pred_image, dtype=np.int64)
+    gold_index, pred_index = _get_indexes(gold_image, gold_category, gold_xyxy,
+                                          pred_image, pred_category, pred_score, pred_xyxy,
+                                          bbox_format, image_width, image_height)
+    if num_images is None:
+        num_images = int(max(gold_index.image.max(initial=-1), pred_index.image.max(initial=-1))) + 1
+
+    # match once, then keep the image and the tp flag of every detection, and the ground truths per image
+    categories = np.union1d(gold_index.categories, pred_index.categories)
+    matches = _map_chunks(_match_category, (gold_index, pred_index, pred_image, iou_threshold), categories,
+                          _get_category_sizes(gold_index, pred_index, categories), n_jobs)
+
+    result = BootstrapResult()
+    result.labels = [c if category_labels is None else category_labels[c] for c in categories]
+    weights = np.ones((1, num_images), dtype=np.int64)
+    result.ap = np.array([_weighted_average_precision(weights, *m, method)[0] for m in matches]).reshape(-1)
+    result.mAP = _mAP(result.ap[None, :])[0]
+
+    # each chunk of resamples has its own random generator
+    seeds = np.random.SeedSequence(seed).spawn((num_samples + RESAMPLES_PER_CHUNK - 1) // RESAMPLES_PER_CHUNK)
+    chunks = [(s, min(RESAMPLES_PER_CHUNK, num_samples - i * RESAMPLES_PER_CHUNK)) for i, s in enumerate(seeds)]
+    samples = _map_chunks(_resample, (matches, num_images, method), chunks, [n for _, n in chunks], n_jobs)
+    result.ap_samples = np.concatenate(samples + [np.zeros((0, len(categories)))], axis=0)
+    result.mAP_samples = _mAP(result.ap_samples)
+    return result
+
+
+def _mAP(ap: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        mAP of each row, averaged over the categories that have ground truths
+    """
+    valid = ~np.isnan(ap)
+    count = valid.sum(axis=1)
+    return np.divide(np.where(valid, ap, 0).sum(axis=1), count, out=np.full(len(ap), np.nan), where=count > 0)
+
+
+def _match_category(context: Tuple, category: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns:
+        image of the detections sorted by decreasing confidence, their tp flags,
+        images that have ground truths and their number of ground truths
+    """
+    gold_index, pred_index, pred_image, iou_threshold = context
+    preds, best_gt, best_iou, _ = match_category(gold_index, pred_index, category)
+    tps = greedy_assign(best_gt, best_iou, iou_threshold)
+    gold_images, gold_counts = np.unique(gold_index.image[gold_index.category_slice(category)], return_counts=True)
+    return pred_image[preds], tps, gold_images, gold_counts
+
+
+def _resample(context: Tuple, chunk: Tuple[np.random.SeedSequence, int]) -> np.ndarray:
+    """
+    Returns:
+        (n, C) average precision of each category on each resample of the chunk
+    """
+    matches, num_images, method = context
+    seed, n = chunk
+    rng = np.random.default_rng(seed)
+    # number of times each image is drawn
+    weights = rng.multinomial(num_images, np.full(num_images, 1 / num_images), size=n)
+    return np.array([_weighted_average_precision(weights, *m, method) for m in matches]).reshape(len(matches), n).T
+
+
+def _weighted_average_precision(weights: np.ndarray, det_images: np.ndarray, tps: np.ndarray,
+                                gold_images: np.ndarray, gold_counts: np.ndarray,
+                                method: MethodAveragePrecision) -> np.ndarray:
+    """
+    Args:
+        weights: (B, num_images) weight of every image in each resample
+        det_images: image of the detections sorted by decreasing confidence
+        tps: tp flags of the detections
+        gold_images: images that have ground truths
+        gold_counts: number of ground truths of these images
+
+    Returns:
+        (B,) average precision of each resample (nan if a resample has no ground truth)
+    """
+    npos = weights[:, gold_images] @ gold_counts
+    ap = np.empty(len(weights))
+    block = max(1, MAX_ELEMENTS // max(1, len(det_images)))
+    for start in range(0, len(weights), block):
+        rows = slice(start, start + block)
+        det_weights = weights[rows][:, det_images]
+        cumulative_tps = np.cumsum(det_weights * tps, axis=1)
+        cumulative_fps = np.cumsum(det_weights * (1 - tps), axis=1)
+        # detections of images that are not drawn repeat the previous point, or precision 0 at recall 0
+        precisions = np.divide(cumulative_tps, cumulative_fps + cumulative_tps,
+                               out=np.zeros(cumulative_tps.shape), where=(cumulative_fps + cumulative_tps) > 0)
+        recalls = np.divide(cumulative_tps, npos[rows, None],
+                            out=np.zeros(cumulative_tps.shape), where=npos[rows, None] > 0)
+        ap[rows] = _batch_average_precision(recalls, precisions, method)
+    ap[npos == 0] = np.nan
+    return ap
+
+
+def _batch_average_precision(recalls: np.ndarray, precisions: np.ndarray, method: MethodAveragePrecision) \
+        -> np.ndarray:
+    """
+    Row-wise `calculate_all_points_average_precision`, `calculate_11_points_average_precision` or
+    `calculate_101_points_average_precision` of (B, D) recalls and precisions.
+    """
+    n = len(recalls)
+    if method == MethodAveragePrecision.AllPointsInterpolation:
+        mrec = np.concatenate((np.zeros((n, 1)), recalls, np.ones((n, 1))), axis=1)
+        mpre = np.concatenate((np.zeros((n, 1)), precisions, np.zeros((n, 1))), axis=1)
+        mpre = np.maximum.accumulate(mpre[:, ::-1], axis=1)[:, ::-1]
+        return np.sum((mrec[:, 1:] - mrec[:, :-1]) * mpre[:, 1:], axis=1)
+
+    num_points = 101 if method == MethodAveragePrecision.HundredOnePointsInterpolation else 11
+    recall_values = np.linspace(0, 1, num_points)
+    width = recalls.shape[1]
+    if width == 0:
+        return np.zeros(n)
+    # shift every row so that one searchsorted over the flattened recalls finds the first position of each row
+    # whose recall is higher or equal than r
+    offsets = 2 * np.arange(n)[:, None]
+    running_recalls = np.maximum.accumulate(recalls, axis=1) + offsets
+    first = np.searchsorted(running_recalls.ravel(), (recall_values[None, :] + offsets).ravel(), side='left')
+    first = first.reshape(n, num_points)
+    found = first < (np.arange(n)[:, None] + 1) * width
+    max_precisions = np.maximum.accumulate(precisions[:, ::-1], axis=1)[:, ::-1].ravel()
+    rho_interp = np.where(found, max_precisions[np.minimum(first, n * width - 1)], 0)
+    return np.sum(rho_interp, axis=1) / num_points
@@ -1,5 +1,8 @@
+import sys
 from enum import Enum
-from typing import Tuple
+from typing import Tuple, List
+
+import numpy as np
 
 
 class Box:
@@ -19,6 +22,8 @@ class Box:
     xbr: the X bottom-right coordinate of the bounding box.
     ybr: the Y bottom-right coordinate of the bounding box.
     """
+    __slots__ = ('xtl', 'ytl', 'xbr', 'ybr')
+
     def __init__(self):
         self.xtl = None  # type: float or None
         self.ytl = None  # type: float or None
@@ -92,11 +97,15 @@ def intersection_over_union(box1: 'Box', box2: 'Box') -> float:
     """
     Intersection Over Union (IOU) is measure based on Jaccard Index that evaluates the overlap between
     two bounding boxes.
+
+    The boxes are not verified, validate them once in bulk with `podm.validation`.
     """
     # if boxes dont intersect
     if not is_intersecting(box1, box2):
         return 0
-    intersection_area = intersection(box1, box2).area
+    # the intersection of intersecting boxes is a valid box, no need to build and verify it
+    intersection_area = (min(box1.xbr, box2.xbr) - max(box1.xtl, box2.xtl)) \
+        * (min(box1.ybr, box2.ybr) - max(box1.ytl, box2.ytl))
     union = union_areas(box1, box2, intersection_area=intersection_area)
     # intersection over union
     iou = intersection_area / union
@@ -138,17 +147,416 @@ def intersection(box1: 'Box', box2: 'Box'):
     return Box.of_box(xtl, ytl, xbr, ybr)
 
 
+def pairwise_intersection_over_union(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    IOU between every pair of boxes in two (N, 4) and (M, 4) arrays of [xtl, ytl, xbr, ybr].
+    Gives the same values as `intersection_over_union` for each pair.
+
+    Returns:
+        (N, M) IOU matrix
+    """
+    boxes1 = np.asarray(boxes1, dtype=float).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=float).reshape(-1, 4)
+    return _intersection_over_union(boxes1[:, None, :], boxes2[None, :, :])
+
+
+def paired_intersection_over_union(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """
+    IOU between the i-th boxes of two (N, 4) arrays of [xtl, ytl, xbr, ybr].
+
+    Returns:
+        (N,) IOUs
+    """
+    boxes1 = np.asarray(boxes1, dtype=float).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=float).reshape(-1, 4)
+    return _intersection_over_union(boxes1, boxes2)
+
+
+def _intersection_over_union(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    # boxes broadcast against each other on all but the last axis
+    xtl = np.maximum(boxes1[..., 0], boxes2[..., 0])
+    ytl = np.maximum(boxes1[..., 1], boxes2[..., 1])
+    xbr = np.minimum(boxes1[..., 2], boxes2[..., 2])
+    ybr = np.minimum(boxes1[..., 3], boxes2[..., 3])
+    intersection_area = np.maximum(xbr - xtl, 0) * np.maximum(ybr - ytl, 0)
+    area1 = (boxes1[..., 2] - boxes1[..., 0]) * (boxes1[..., 3] - boxes1[..., 1])
+    area2 = (boxes2[..., 2] - boxes2[..., 0]) * (boxes2[..., 3] - boxes2[..., 1])
+    union = area1 + area2 - intersection_area
+    return np.divide(intersection_area, union, out=np.zeros_like(intersection_area), where=union > 0)
+
+
+class BoxArray:
+    """
+    N boxes stored as an (N, 4) float array of [xtl, ytl, xbr, ybr], with the geometry of `Box` vectorized over
+    the boxes.
+
+    xyxy: (N, 4) coordinates
+    """
+    def __init__(self, xyxy: np.ndarray = None):
+        if xyxy is None:
+            xyxy = np.zeros((0, 4))
+        self.xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+
+    @classmethod
+    def of_boxes(cls, boxes: List[Box]) -> 'BoxArray':
+        return BoxArray(np.array([(b.xtl, b.ytl, b.xbr, b.ybr) for b in boxes], dtype=float).reshape(len(boxes), 4))
+
+    def to_boxes(self) -> List[Box]:
+        return [Box.of_box(*xyxy) for xyxy in self.xyxy.tolist()]
+
+    def verify(self):
+        invalid = np.flatnonzero((self.xtl > self.xbr) | (self.ytl > self.ybr))
+        assert len(invalid) == 0, f'xtl > xbr or ytl > ybr: {self.xyxy[invalid[:5]].tolist()}'
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __getitem__(self, item) -> 'BoxArray':
+        return BoxArray(self.xyxy[item])
+
+    def __eq__(self, other):
+        if not isinstance(other, BoxArray):
+            return False
+        return np.array_equal(self.xyxy, other.xyxy)
+
+    def __str__(self):
+        return 'BoxArray[n={}]'.format(len(self))
+
+    @property
+    def xtl(self) -> np.ndarray:
+        return self.xyxy[:, 0]
+
+    @property
+    def ytl(self) -> np.ndarray:
+        return self.xyxy[:, 1]
+
+    @property
+    def xbr(self) -> np.ndarray:
+        return self.xyxy[:, 2]
+
+    @property
+    def ybr(self) -> np.ndarray:
+        return self.xyxy[:, 3]
+
+    @property
+    def width(self) -> np.ndarray:
+        return self.xbr - self.xtl
+
+    @property
+    def height(self) -> np.ndarray:
+        return self.ybr - self.ytl
+
+    @property
+    def area(self) -> np.ndarray:
+        return (self.xbr - self.xtl) * (self.ybr - self.ytl)
+
+    @property
+    def center(self) -> np.ndarray:
+        """
+        Returns:
+            (N, 2) centers
+        """
+        return (self.xyxy[:, :2] + self.xyxy[:, 2:]) / 2
+
+    def intersection(self, other: 'BoxArray') -> 'BoxArray':
+        """
+        Elementwise intersection. Boxes that do not intersect give an empty box at the corner of their
+        intersection, unlike `intersection` that fails on them.
+        """
+        tl = np.maximum(self.xyxy[:, :2], other.xyxy[:, :2])
+        br = np.maximum(np.minimum(self.xyxy[:, 2:], other.xyxy[:, 2:]), tl)
+        return BoxArray(np.concatenate((tl, br), axis=1))
+
+    def union(self, other: 'BoxArray') -> 'BoxArray':
+        """
+        Elementwise smallest box that encloses both boxes, as `union`.
+        """
+        tl = np.minimum(self.xyxy[:, :2], other.xyxy[:, :2])
+        br = np.maximum(self.xyxy[:, 2:], other.xyxy[:, 2:])
+        return BoxArray(np.concatenate((tl, br), axis=1))
+
+    def union_areas(self, other: 'BoxArray') -> np.ndarray:
+        """
+        Elementwise area covered by both boxes, as `union_areas`.
+        """
+        return self.area + other.area - self.intersection(other).area
+
+    def intersection_over_union(self, other: 'BoxArray') -> np.ndarray:
+        """
+        Returns:
+            (N,) IOU between the i-th boxes of both arrays
+        """
+        return paired_intersection_over_union(self.xyxy, other.xyxy)
+
+    def pairwise_intersection_over_union(self, other: 'BoxArray') -> np.ndarray:
+        """
+        Returns:
+            (N, M) IOU between every box of self and every box of other
+        """
+        return pairwise_intersection_over_union(self.xyxy, other.xyxy)
+
+
+class SortAndSweepIndex:
+    """
+    Spatial index that finds the boxes overlapping query boxes without comparing every pair.
+
+    The boxes are sorted by xtl. The boxes that can overlap a query start before its xbr, which is a prefix of the
+    sorted boxes, and end after its xtl, which excludes a prefix given by the running maximum of xbr. Both bounds are
+    found with binary searches, and the candidates between them are checked on both axes.
+
+    xyxy: (N, 4) coordinates of the indexed boxes
+    """
+    def __init__(self, xyxy: np.ndarray):
+        self.xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+        self._order = np.argsort(self.xyxy[:, 0], kind='stable')
+        self._sorted = self.xyxy[self._order]
+        self._max_xbr = np.maximum.accumulate(self._sorted[:, 2]) if len(self._sorted) else np.zeros(0)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def query(self, xyxy) -> np.ndarray:
+        """
+        Returns:
+            indexes of the boxes whose intersection with the [xtl, ytl, xbr, ybr] box has a positive area, in
+            increasing order
+        """
+        _, boxes = self.query_pairs(np.reshape(np.asarray(xyxy, dtype=float), (1, 4)))
+        return boxes
+
+    def query_pairs(self, xyxy: np.ndarray, max_pairs: int = 1 << 22) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the overlapping boxes of many (M, 4) query boxes, checking at most max_pairs candidates at a time.
+
+        Returns:
+            (query, box) index pairs whose intersection has a positive area, sorted by query then by box
+        """
+        xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+        starts = np.searchsorted(self._max_xbr, xyxy[:, 0], side='right')
+        ends = np.searchsorted(self._sorted[:, 0], xyxy[:, 2], side='left')
+        counts = np.maximum(ends - starts, 0)
+        cumulative_counts = np.cumsum(counts)
+
+        queries = []
+        boxes = []
+        start = 0
+        while start < len(xyxy):
+            # queries [start, end) have at most max_pairs candidates, or a single query
+            end = np.searchsorted(cumulative_counts, cumulative_counts[start] - counts[start] + max_pairs,
+                                  side='right')
+            chunk = np.arange(start, max(end, start + 1))
+            start = chunk[-1] + 1
+
+            query = np.repeat(chunk, counts[chunk])
+            candidate = _ranges(starts[chunk], counts[chunk])
+            q = xyxy[query]
+            b = self._sorted[candidate]
+            overlap = (b[:, 0] < q[:, 2]) & (b[:, 2] > q[:, 0]) & (b[:, 1] < q[:, 3]) & (b[:, 3] > q[:, 1])
+            queries.append(query[overlap])
+            boxes.append(self._order[candidate[overlap]])
+
+        queries = np.concatenate(queries + [np.zeros(0, dtype=np.intp)])
+        boxes = np.concatenate(boxes + [np.zeros(0, dtype=np.intp)])
+        order = np.lexsort((boxes, queries))
+        return queries[order], boxes[order]
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        the concatenation of arange(start, start + length)
+    """
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(np.sum(lengths), dtype=np.intp)
+
+
+def contains_points(boxes: 'BoxArray' or np.ndarray, points: np.ndarray, sparse: bool = False,
+                    max_pairs: int = 1 << 22) -> np.ndarray or Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized `Box.__contains__`: the point (x, y) is in a box if xtl <= x < xbr and ytl <= y < ybr.
+
+    Args:
+        boxes: (N, 4) coordinates or a BoxArray
+        points: (M, 2) x and y of the points
+        sparse: return the (box, point) index pairs instead of the matrix, without comparing every pair
+        max_pairs: maximum number of candidates checked at a time in the sparse mode
+    Returns:
+        (N, M) boolean matrix, or (box, point) index pairs sorted by box then by point
+    """
+    xyxy = boxes.xyxy if isinstance(boxes, BoxArray) else np.asarray(boxes, dtype=float).reshape(-1, 4)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if sparse:
+        return _contains_points_pairs(xyxy, points, np.zeros(len(xyxy), dtype=np.int64),
+                                      np.zeros(len(points), dtype=np.int64), max_pairs)
+    x = points[None, :, 0]
+    y = points[None, :, 1]
+    return (xyxy[:, 0:1] <= x) & (x < xyxy[:, 2:3]) & (xyxy[:, 1:2] <= y) & (y < xyxy[:, 3:4])
+
+
+def _contains_points_pairs(xyxy: np.ndarray, points: np.ndarray, box_group: np.ndarray, point_group: np.ndarray,
+                           max_pairs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the points in the boxes of the same group.
+
+    The points are bucketed in columns as wide as the median box, and sorted by (group, column, y). The candidates
+    of a box in one of the columns it spans are the points with ytl <= y < ybr, found with two binary searches, and
+    are then checked on x.
+
+    Args:
+        box_group: (N,) integer group of the boxes
+        point_group: (M,) integer group of the points
+    Returns:
+        (box, point) index pairs sorted by box then by point
+    """
+    valid_boxes = np.flatnonzero(~np.isnan(xyxy).any(axis=1) & (xyxy[:, 2] > xyxy[:, 0]) & (xyxy[:, 3] > xyxy[:, 1]))
+    valid_points = np.flatnonzero(~np.isnan(points).any(axis=1))
+    if len(valid_boxes) == 0 or len(valid_points) == 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    xyxy, box_group = xyxy[valid_boxes], box_group[valid_boxes]
+    points, point_group = points[valid_points], point_group[valid_points]
+
+    x_min = points[:, 0].min()
+    x_max = points[:, 0].max()
+    widths = xyxy[:, 2] - xyxy[:, 0]
+    widths = widths[np.isfinite(widths)]
+    cell = max(float(np.median(widths)) if len(widths) else x_max - x_min, (x_max - x_min) / len(points),
+               sys.float_info.min)
+    num_columns = int((x_max - x_min) // cell) + 1
+
+    def get_column(x):
+        return np.clip(np.floor((x - x_min) / cell), -1, num_columns).astype(np.int64)
+
+    # sort the points by (group, column, rank of y)
+    cells, point_cell = np.unique(point_group * num_columns + get_column(points[:, 0]), return_inverse=True)
+    ys = np.unique(points[:, 1])
+    height = len(ys) + 1
+    keys = point_cell.reshape(-1) * height + np.searchsorted(ys, points[:, 1], side='left')
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    sorted_x = points[order, 0]
+
+    # one query per box and column
+    first = np.maximum(get_column(xyxy[:, 0]), 0)
+    last = np.minimum(get_column(xyxy[:, 2]), num_columns - 1)
+    num_queries = np.maximum(last - first + 1, 0)
+    query_box = np.repeat(np.arange(len(xyxy)), num_queries)
+    query_cell = box_group[query_box] * num_columns + _ranges(first, num_queries)
+    query_cell_position = np.minimum(np.searchsorted(cells, query_cell), len(cells) - 1)
+    found = cells[query_cell_position] == query_cell
+    query_box, query_cell_position = query_box[found], query_cell_position[found]
+    starts = np.searchsorted(sorted_keys, query_cell_position * height
+                             + np.searchsorted(ys, xyxy[query_box, 1], side='left'))
+    counts = np.searchsorted(sorted_keys, query_cell_position * height
+                             + np.searchsorted(ys, xyxy[query_box, 3], side='left')) - starts
+    cumulative_counts = np.cumsum(counts)
+
+    boxes = []
+    points = []
+    start = 0
+    while start < len(query_box):
+        # queries [start, end) have at most max_pairs candidates, or a single query
+        end = np.searchsorted(cumulative_counts, cumulative_counts[start] - counts[start] + max_pairs, side='right')
+        chunk = np.arange(start, max(end, start + 1))
+        start = chunk[-1] + 1
+
+        box = np.repeat(query_box[chunk], counts[chunk])
+        candidate = _ranges(starts[chunk], counts[chunk])
+        x = sorted_x[candidate]
+        inside = (xyxy[box, 0] <= x) & (x < xyxy[box, 2])
+        boxes.append(box[inside])
+        points.append(order[candidate[inside]])
+
+    boxes = valid_boxes[np.concatenate(boxes + [np.zeros(0, dtype=np.intp)])]
+    points = valid_points[np.concatenate(points + [np.zeros(0, dtype=np.intp)])]
+    # sorting one integer key is much faster than lexsort
+    pairs = np.sort(boxes.astype(np.int64) * (valid_points[-1] + 1) + points)
+    return pairs // (valid_points[-1] + 1), pairs % (valid_points[-1] + 1)
+
+
 class BBFormat(Enum):
     """
     Class representing the format of a bounding box.
     It can be (X,Y,width,height) => XYWH
     or (X1,Y1,X2,Y2) => XYX2Y2
+    or (center X,center Y,width,height) => CXCYWH
+    The *_NORMALIZED formats are divided by the width and the height of the image.
 
         Developed by: Rafael Padilla
         Last modification: May 24 2018
     """
     XYWH = 1
     X1Y1X2Y2 = 2
+    CXCYWH = 3
+    XYWH_NORMALIZED = 4
+    X1Y1X2Y2_NORMALIZED = 5
+    CXCYWH_NORMALIZED = 6
+
+    @property
+    def normalized(self) -> bool:
+        return self.value > 3
+
+    @property
+    def absolute(self) -> 'BBFormat':
+        """
+        The format without normalization.
+        """
+        return BBFormat((self.value - 1) % 3 + 1)
+
+
+def convert_boxes(boxes: np.ndarray, src: BBFormat, dst: BBFormat = BBFormat.X1Y1X2Y2,
+                  image_width: np.ndarray = None, image_height: np.ndarray = None, image: np.ndarray = None) \
+        -> np.ndarray:
+    """
+    Convert an (N, 4) array of boxes from one format to another.
+
+    Args:
+        boxes: (N, 4) boxes in the src format
+        src: format of the boxes
+        dst: format of the returned boxes
+        image_width: width of the image of each box, or of each image if image is given. Required by normalized
+            formats.
+        image_height: height of the image of each box, or of each image if image is given
+        image: (N,) image index of each box
+
+    Returns:
+        (N, 4) boxes in the dst format, the input itself if there is nothing to convert. Conversions between XYWH
+        and X1Y1X2Y2 keep integer coordinates, the others are floats.
+    """
+    boxes = np.asarray(boxes)
+    if boxes.dtype.kind not in 'iu' or src.absolute == BBFormat.CXCYWH or dst.absolute == BBFormat.CXCYWH \
+            or src.normalized or dst.normalized:
+        boxes = boxes.astype(float)
+    boxes = boxes.reshape(-1, 4)
+    if src == dst:
+        return boxes
+
+    scale = None
+    if src.normalized or dst.normalized:
+        if image_width is None or image_height is None:
+            raise ValueError('%s to %s: image_width and image_height are required' % (src, dst))
+        width = np.asarray(image_width, dtype=float)
+        height = np.asarray(image_height, dtype=float)
+        if image is not None:
+            width, height = width[image], height[image]
+        scale = np.stack(np.broadcast_arrays(width, height, width, height), axis=-1).reshape(-1, 4)
+    if src.normalized:
+        boxes = boxes * scale
+
+    # to X1Y1X2Y2
+    src = src.absolute
+    if src == BBFormat.XYWH:
+        boxes = np.concatenate((boxes[:, :2], boxes[:, :2] + boxes[:, 2:]), axis=1)
+    elif src == BBFormat.CXCYWH:
+        boxes = np.concatenate((boxes[:, :2] - boxes[:, 2:] / 2, boxes[:, :2] + boxes[:, 2:] / 2), axis=1)
+
+    # to dst
+    if dst.absolute == BBFormat.XYWH:
+        boxes = np.concatenate((boxes[:, :2], boxes[:, 2:] - boxes[:, :2]), axis=1)
+    elif dst.absolute == BBFormat.CXCYWH:
+        boxes = np.concatenate(((boxes[:, :2] + boxes[:, 2:]) / 2, boxes[:, 2:] - boxes[:, :2]), axis=1)
+    if dst.normalized:
+        boxes = boxes / scale
+    return boxes
 
 
 # class BoundingBox(Box):
@@ -1,31 +1,72 @@
 import copy
+import itertools
 from abc import ABC
-from typing import List, Tuple, Set, Collection
+from typing import List, Tuple, Set, Collection, Iterable, Dict, Any, KeysView
 from datetime import date, datetime
-from shapely.geometry import Polygon, Point
-from podm import box
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from podm import box, mask
 
 
 class PCOCOInfo:
+    __slots__ = ('year', 'version', 'description', 'contributor', 'url', '_date_created')
+
     def __init__(self):
         self.year = date.today().year  # type:int
         self.version = ''  # type: str
         self.description = ''  # type: str
         self.contributor = ''  # type: str
         self.url = ''  # type: str
-        self.date_created = datetime.now().strftime('%m/%d/%Y')  # type:str
+        self._date_created = None  # type:str or None
+
+    @property
+    def date_created(self) -> str:
+        """
+        Defaults to the date of the first access.
+        """
+        if self._date_created is None:
+            self._date_created = datetime.now().strftime('%m/%d/%Y')
+        return self._date_created
+
+    @date_created.setter
+    def date_created(self, value: str):
+        self._date_created = value
 
 
 class PCOCOAnnotation(ABC):
+    """
+    The slots of the annotation fields are declared by the subclasses, so that they can also inherit from `box.Box`.
+    """
+    __slots__ = ()
+
     def __init__(self):
         self.id = None  # type:int or None
         self.image_id = None  # type:int or None
         self.score = None  # type:float or None
         self.contributor = ''  # type: str
-        self.attributes = {}  # type: dict
+        self._attributes = None  # type: dict or None
+
+    @property
+    def attributes(self) -> dict:
+        """
+        Created on the first access.
+        """
+        if self._attributes is None:
+            self._attributes = {}
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, value: dict):
+        self._attributes = value
+
+
+_ANNOTATION_SLOTS = ('id', 'image_id', 'score', 'contributor', '_attributes')
 
 
 class PCOCOImage:
+    __slots__ = ('id', 'width', 'height', 'file_name', 'license', 'flickr_url', 'coco_url', '_date_captured')
+
     def __init__(self):
         self.id = None  # type:int or None
         self.width = 0  # type:int
@@ -34,10 +75,25 @@ class PCOCOImage:
         self.license = None  # type:int or None
         self.flickr_url = ''  # type:str
         self.coco_url = ''  # type:str
-        self.date_captured = datetime.now().strftime('%m/%d/%Y')  # type:str
+        self._date_captured = None  # type:str or None
+
+    @property
+    def date_captured(self) -> str:
+        """
+        Defaults to the date of the first access.
+        """
+        if self._date_captured is None:
+            self._date_captured = datetime.now().strftime('%m/%d/%Y')
+        return self._date_captured
+
+    @date_captured.setter
+    def date_captured(self, value: str):
+        self._date_captured = value
 
 
 class PCOCOLicense:
+    __slots__ = ('id', 'name', 'url')
+
     def __init__(self):
         self.id = None  # type:int or None
         self.name = ''  # type:str
@@ -45,39 +101,370 @@ class PCOCOLicense:
 
 
 class PCOCOCategory:
+    __slots__ = ('id', 'name', 'supercategory')
+
     def __init__(self):
         self.id = None  # type:int or None
         self.name = ''  # type:str
         self.supercategory = ''  # type:str
 
 
+class IndexedList(list):
+    """
+    A list that indexes its items by some of their attributes, e.g., the images by id and by file name. The index is
+    updated by the list operations, so lookups cost in proportion to their result. Items must not change their
+    indexed attributes while they are in the list.
+
+    keys: the indexed attributes
+    pairs: (key, other) attributes whose distinct other values are counted per key value, e.g., the images of every
+        category of the annotations
+
+    `copy` shares the indexes with the copy until either list changes.
+    """
+    __slots__ = ('keys', 'pairs', '_index', '_duplicates', '_pair_counts', '_shared', '_positions')
+
+    def __init__(self, keys: Tuple[str, ...], items: Iterable = (), pairs: Tuple[Tuple[str, str], ...] = ()):
+        super(IndexedList, self).__init__()
+        self.keys = keys
+        self.pairs = pairs
+        # the first item of every value, and the other ones if the value is not unique
+        self._index = {key: {} for key in keys}  # type: Dict[str, Dict[Any, Any]]
+        self._duplicates = {key: {} for key in keys}  # type: Dict[str, Dict[Any, List[Any]]]
+        # number of items of every (value, other value)
+        self._pair_counts = {pair: {} for pair in pairs}  # type: Dict[Tuple[str, str], Dict[Any, Dict[Any, int]]]
+        # whether the indexes may be used by another list
+        self._shared = False
+        # the position of every item, built by find_all and dropped when the items move
+        self._positions = None  # type: Dict[int, int] or None
+        self.extend(items)
+
+    def __reduce__(self):
+        return self.__class__, (self.keys, list(self), self.pairs)
+
+    def copy(self) -> 'IndexedList':
+        """
+        Returns:
+            a shallow copy. The indexes are copied on the first change of either list.
+        """
+        other = self.__class__.__new__(self.__class__)
+        super(IndexedList, other).extend(self)
+        other.keys = self.keys
+        other.pairs = self.pairs
+        other._index = self._index
+        other._duplicates = self._duplicates
+        other._pair_counts = self._pair_counts
+        other._shared = self._shared = True
+        other._positions = None
+        return other
+
+    __copy__ = copy
+
+    def _unshare(self):
+        if self._shared:
+            self._index = {key: dict(index) for key, index in self._index.items()}
+            self._duplicates = {key: {value: list(others) for value, others in duplicates.items()}
+                                for key, duplicates in self._duplicates.items()}
+            self._pair_counts = {pair: {value: dict(counts) for value, counts in pair_counts.items()}
+                                 for pair, pair_counts in self._pair_counts.items()}
+            self._shared = False
+
+    def find(self, key: str, value) -> List:
+        """
+        Returns:
+            the items whose attribute key equals value, in insertion order
+        """
+        index = self._index[key]
+        if value not in index:
+            return []
+        return [index[value]] + self._duplicates[key].get(value, [])
+
+    def find_all(self, key: str, values: Collection) -> List:
+        """
+        Returns:
+            the items whose attribute key is one of the values, in list order
+        """
+        items = [item for value in dict.fromkeys(values) for item in self.find(key, value)]
+        if len(items) > 1:
+            if self._positions is None:
+                self._positions = {}
+                for i, item in enumerate(self):
+                    self._positions.setdefault(id(item), i)
+            items.sort(key=lambda item: self._positions[id(item)])
+        return items
+
+    def find_count(self, key: str, value) -> int:
+        """
+        Returns:
+            the number of items whose attribute key equals value
+        """
+        if value not in self._index[key]:
+            return 0
+        return 1 + len(self._duplicates[key].get(value, []))
+
+    def find_values(self, key: str) -> KeysView:
+        """
+        Returns:
+            a view of the distinct attributes key of the items
+        """
+        return self._index[key].keys()
+
+    def find_related(self, key: str, value, other: str) -> KeysView:
+        """
+        Returns:
+            a view of the distinct other attributes of the items whose attribute key equals value. (key, other) must
+            be one of the pairs.
+        """
+        return self._pair_counts[key, other].get(value, {}).keys()
+
+    def _add(self, item):
+        self._unshare()
+        for key in self.keys:
+            value = getattr(item, key)
+            index = self._index[key]
+            if value in index:
+                self._duplicates[key].setdefault(value, []).append(item)
+            else:
+                index[value] = item
+        for key, other in self.pairs:
+            counts = self._pair_counts[key, other].setdefault(getattr(item, key), {})
+            other_value = getattr(item, other)
+            counts[other_value] = counts.get(other_value, 0) + 1
+
+    def _discard(self, item):
+        self._unshare()
+        for key in self.keys:
+            value = getattr(item, key)
+            index = self._index[key]
+            duplicates = self._duplicates[key]
+            if index[value] is item:
+                if value in duplicates:
+                    index[value] = duplicates[value].pop(0)
+                else:
+                    del index[value]
+            else:
+                others = duplicates[value]
+                del others[next(i for i, other in enumerate(others) if other is item)]
+            if value in duplicates and len(duplicates[value]) == 0:
+                del duplicates[value]
+        for key, other in self.pairs:
+            value = getattr(item, key)
+            counts = self._pair_counts[key, other][value]
+            other_value = getattr(item, other)
+            counts[other_value] -= 1
+            if counts[other_value] == 0:
+                del counts[other_value]
+                if len(counts) == 0:
+                    del self._pair_counts[key, other][value]
+
+    def append(self, item):
+        super(IndexedList, self).append(item)
+        self._add(item)
+        if self._positions is not None:
+            self._positions.setdefault(id(item), len(self) - 1)
+
+    def extend(self, items: Iterable):
+        start = len(self)
+        super(IndexedList, self).extend(items)
+        for i, item in enumerate(self[start:], start):
+            self._add(item)
+            if self._positions is not None:
+                self._positions.setdefault(id(item), i)
+
+    def __iadd__(self, items: Iterable):
+        self.extend(items)
+        return self
+
+    def __imul__(self, n: int):
+        if n <= 0:
+            self.clear()
+        else:
+            self.extend(list(self) * (n - 1))
+        return self
+
+    def insert(self, i: int, item):
+        super(IndexedList, self).insert(i, item)
+        self._positions = None
+        self._add(item)
+
+    def remove(self, item):
+        # items may compare equal by value, e.g., the boxes, so remove the item itself to keep the indexes right
+        i = next((i for i, other in enumerate(self) if other is item), None)
+        self.pop(self.index(item) if i is None else i)
+
+    def pop(self, i: int = -1):
+        item = super(IndexedList, self).pop(i)
+        self._positions = None
+        self._discard(item)
+        return item
+
+    def clear(self):
+        super(IndexedList, self).clear()
+        self._index = {key: {} for key in self.keys}
+        self._duplicates = {key: {} for key in self.keys}
+        self._pair_counts = {pair: {} for pair in self.pairs}
+        self._shared = False
+        self._positions = None
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            old = self[i]
+            value = list(value)
+        else:
+            old = [self[i]]
+        super(IndexedList, self).__setitem__(i, value)
+        self._positions = None
+        for item in old:
+            self._discard(item)
+        for item in (value if isinstance(i, slice) else [value]):
+            self._add(item)
+
+    def sort(self, *args, **kwargs):
+        super(IndexedList, self).sort(*args, **kwargs)
+        self._positions = None
+
+    def reverse(self):
+        super(IndexedList, self).reverse()
+        self._positions = None
+
+    def __delitem__(self, i):
+        old = self[i] if isinstance(i, slice) else [self[i]]
+        super(IndexedList, self).__delitem__(i)
+        self._positions = None
+        for item in old:
+            self._discard(item)
+
+
+_IMAGE_KEYS = ('id', 'file_name')
+_LICENSE_KEYS = ('id', 'name')
+_CATEGORY_KEYS = ('id', 'name')
+_ANNOTATION_KEYS = ('id', 'image_id', 'category_id')
+_ANNOTATION_PAIRS = (('category_id', 'image_id'),)
+
+
+def _find_all(items: IndexedList, key: str, values: Collection) -> List:
+    """
+    Returns:
+        the items whose attribute key is one of the values, in list order
+    """
+    return items.find_all(key, values)
+
+
+def _select_annotations(annotations: IndexedList, image_ids: Collection[int] or None,
+                        category_ids: Collection[int] or None) -> List:
+    """
+    Returns:
+        the annotations of the images and of the categories. None skips that filter.
+    """
+    filters = [(key, dict.fromkeys(values)) for key, values in (('image_id', image_ids),
+                                                                 ('category_id', category_ids))
+               if values is not None]
+    if len(filters) == 0:
+        return annotations
+    # start from the filter that selects the fewest annotations, then check the others
+    filters.sort(key=lambda f: sum(annotations.find_count(f[0], value) for value in f[1]))
+    key, values = filters[0]
+    anns = _find_all(annotations, key, values)
+    for key, values in filters[1:]:
+        anns = [ann for ann in anns if getattr(ann, key) in values]
+    return anns
+
+
+def _add_all(items: IndexedList, new_items: Iterable, keys: Tuple[str, ...], name: str, assign_ids: bool):
+    """
+    Add many items at once. The keys of the new items are checked in one hashed pass, and every conflict is reported
+    in the same KeyError. Nothing is added if there is a conflict.
+
+    Args:
+        keys: the attributes that must be unique
+        assign_ids: give the new items consecutive ids after the largest id of the items (from 0 if there is none).
+            The ids of an `AnnotationStore` are given to its new rows, and the new items are not changed.
+    """
+    new_items = list(new_items)
+    conflicts = {}
+    for key in keys:
+        if key == 'id' and assign_ids:
+            continue
+        seen = set()
+        for item in new_items:
+            value = getattr(item, key)
+            if value in seen or items.find_count(key, value) != 0:
+                conflicts.setdefault(key, []).append(value)
+            seen.add(value)
+    if len(conflicts) != 0:
+        raise KeyError('%s exist: %s' % (name, conflicts))
+    if assign_ids:
+        start = max((id for id in items.find_values('id') if id is not None), default=-1) + 1
+        ids = range(start, start + len(new_items))
+        if isinstance(items, AnnotationStore):
+            items.extend(new_items, ids)
+            return
+        for item, id in zip(new_items, ids):
+            item.id = id
+    items.extend(new_items)
+
+
+def _indexed(items: Iterable, keys: Tuple[str, ...], pairs: Tuple[Tuple[str, str], ...] = ()) -> IndexedList:
+    if isinstance(items, IndexedList) and items.keys == keys and items.pairs == pairs:
+        return items
+    return IndexedList(keys, items, pairs)
+
+
 class PCOCODataset(ABC):
+    """
+    The images and the licenses, and the annotations and the categories of the subclasses, are held in `IndexedList`s,
+    so that lookups and duplicate checks are O(1). Assigning a plain list indexes a copy of it.
+    """
     def __init__(self):
         self.info = PCOCOInfo()  # type: PCOCOInfo or None
         self.images = []  # type: List[PCOCOImage]
         self.licenses = []  # type: List[PCOCOLicense]
 
+    @property
+    def images(self) -> List[PCOCOImage]:
+        return self._images
+
+    @images.setter
+    def images(self, value: List[PCOCOImage]):
+        self._images = _indexed(value, _IMAGE_KEYS)
+
+    @property
+    def licenses(self) -> List[PCOCOLicense]:
+        return self._licenses
+
+    @licenses.setter
+    def licenses(self, value: List[PCOCOLicense]):
+        self._licenses = _indexed(value, _LICENSE_KEYS)
+
     def add_license(self, license: PCOCOLicense):
-        for lic in self.licenses:
-            if lic.id == license.id or lic.name == license.name:
-                raise KeyError('%s: License exists' % lic.id)
+        for lic in self.licenses.find('id', license.id) + self.licenses.find('name', license.name):
+            raise KeyError('%s: License exists' % lic.id)
         self.licenses.append(license)
 
     def add_image(self, image: PCOCOImage):
-        for img in self.images:
-            if img.id == image.id or img.file_name == image.file_name:
-                raise KeyError('%s: Image exists' % img.id)
+        for img in self.images.find('id', image.id) + self.images.find('file_name', image.file_name):
+            raise KeyError('%s: Image exists' % img.id)
         self.images.append(image)
 
+    def add_licenses(self, licenses: Iterable[PCOCOLicense], assign_ids: bool = False):
+        """
+        Add many licenses at once, see `add_annotations`.
+        """
+        _add_all(self.licenses, licenses, ('id', 'name'), 'Licenses', assign_ids)
+
+    def add_images(self, images: Iterable[PCOCOImage], assign_ids: bool = False):
+        """
+        Add many images at once, see `add_annotations`. Ids and file names must be unique.
+        """
+        _add_all(self.images, images, ('id', 'file_name'), 'Images', assign_ids)
+
     def get_image(self, id: int = None, file_name: str = None, default=None) -> PCOCOImage:
         if id is None and file_name is None:
             raise KeyError('%s %s: Cannot set both to None' % (id, file_name))
         if id is not None and file_name is not None:
             raise KeyError('%s %s: Cannot set both' % (id, file_name))
 
-        imgs = self.images
         if id is not None:
-            imgs = [img for img in imgs if img.id == id]
+            imgs = self.images.find('id', id)
             if len(imgs) == 0:
                 return default
             elif len(imgs) == 1:
@@ -86,7 +473,7 @@ class PCOCODataset(ABC):
                 raise KeyError('%s: more than one image with the same id' % id)
 
         if file_name is not None:
-            imgs = [img for img in imgs if img.file_name == file_name]
+            imgs = self.images.find('file_name', file_name)
             if len(imgs) == 0:
                 return default
             elif len(imgs) == 1:
@@ -102,7 +489,9 @@ class PCOCODataset(ABC):
         :param ids: integer ids specifying img
         :return: imgs: loaded img objects
         """
-        return [img for img in self.images if img.id in ids]
+        if ids is None:
+            return list(self.images)
+        return _find_all(self.images, 'id', ids)
 
 
 ##############################################################################
@@ -111,49 +500,124 @@ class PCOCODataset(ABC):
 
 
 class PCOCOBoundingBox(PCOCOAnnotation, box.Box):
+    __slots__ = _ANNOTATION_SLOTS + ('category_id',)
+
     def __init__(self):
         super(PCOCOBoundingBox, self).__init__()
         self.category_id = None  # type:int or None
 
+    @classmethod
+    def of_values(cls, id: int, image_id: int, category_id: int, xtl: float, ytl: float, xbr: float, ybr: float,
+                  score: float = None, contributor: str = '', attributes: dict = None) -> 'PCOCOBoundingBox':
+        """
+        Fast constructor that sets every field at once, e.g., to decode many annotations.
+        """
+        ann = cls.__new__(cls)
+        ann.id = id
+        ann.image_id = image_id
+        ann.category_id = category_id
+        ann.xtl = xtl
+        ann.ytl = ytl
+        ann.xbr = xbr
+        ann.ybr = ybr
+        ann.score = score
+        ann.contributor = contributor
+        ann._attributes = attributes
+        return ann
+
 
 class PCOCOSegments(PCOCOAnnotation):
+    """
+    The bbox and the area are computed when the segmentation is set or changed with `add_segmentation` or
+    `add_box`, and the polygons are cached. They are not updated when the segmentation list is modified in place.
+    """
+    __slots__ = _ANNOTATION_SLOTS + ('category_id', '_segmentation', 'iscrowd', '_polygons', '_bbox', '_area')
+
     def __init__(self):
         super(PCOCOSegments, self).__init__()
         self.category_id = None  # type:int or None
         self.segmentation = []  # type: List[List[float]]
         self.iscrowd = False  # type:bool
 
+    @classmethod
+    def of_values(cls, id: int, image_id: int, category_id: int, segmentation: List[List[float]],
+                  iscrowd: bool = False, score: float = None, contributor: str = '', attributes: dict = None,
+                  bbox: 'box.Box' = None, area: float = None) -> 'PCOCOSegments':
+        """
+        Fast constructor that sets every field at once, e.g., to decode many annotations.
+
+        Args:
+            bbox, area: bbox and area of the segmentation, if they are already known (see `segmentation_bboxes`)
+        """
+        ann = cls.__new__(cls)
+        ann.id = id
+        ann.image_id = image_id
+        ann.category_id = category_id
+        if area is None:
+            ann.segmentation = segmentation
+        else:
+            ann._segmentation = segmentation
+            ann._polygons = None
+            ann._bbox = bbox
+            ann._area = area
+        ann.iscrowd = iscrowd
+        ann.score = score
+        ann.contributor = contributor
+        ann._attributes = attributes
+        return ann
+
+    @property
+    def segmentation(self) -> List[List[float]]:
+        return self._segmentation
+
+    @segmentation.setter
+    def segmentation(self, value: List[List[float]]):
+        self._segmentation = value
+        self._update()
+
     def add_box(self, box: box.Box):
         self.add_segmentation(box.segment)
 
     def add_segmentation(self, segmentation: List[float]):
-        self.segmentation.append(segmentation)
+        self._segmentation.append(segmentation)
+        self._update()
+
+    def _update(self):
+        self._polygons = None
+        (self._bbox,), (self._area,) = segmentation_bboxes([self._segmentation])
 
     def __contains__(self, item):
         if not type(item) == list and not type(item) == tuple:
             raise TypeError('Has to be a list or a tuple: %s' % type(item))
         if len(item) == 2:
-            point = Point(item[0], item[1])
-            for p in self.polygons:
-                if p.contains(point):
-                    return True
-            return False
+            return bool(shapely.contains_xy(self.polygons, item[0], item[1]).any())
         else:
             raise ValueError('Only support a point')
 
     @property
     def polygons(self) -> List[Polygon]:
-        return [Polygon([(seg[i], seg[i+1]) for i in range(0, len(seg), 2)]) for seg in self.segmentation]
+        """
+        Prepared polygons of the segmentation, built on the first access.
+        """
+        if self._polygons is None:
+            polygons = [Polygon([(seg[i], seg[i+1]) for i in range(0, len(seg), 2)]) for seg in self._segmentation]
+            shapely.prepare(polygons)
+            self._polygons = polygons
+        return self._polygons
 
     @property
     def bbox(self) -> 'box.Box' or None:
-        if len(self.segmentation) == 0:
-            return None
-        else:
-            b = self.box_polygon(self.segmentation[0])
-            for polygon in self.segmentation[1:]:
-                b = box.union(b, self.box_polygon(polygon))
-            return b
+        """
+        The box is shared, do not modify it.
+        """
+        return self._bbox
+
+    @property
+    def area(self) -> float:
+        """
+        Sum of the areas of the polygons, or the number of pixels of a RLE segmentation.
+        """
+        return self._area
 
     @classmethod
     def box_polygon(cls, polygon: List[float]) -> 'box.Box':
@@ -164,30 +628,475 @@ class PCOCOSegments(PCOCOAnnotation):
         return box.Box.of_box(xtl, ytl, xbr, ybr)
 
 
+def segmentation_bboxes(segmentations: List[List[List[float]] or dict]) -> Tuple[List['box.Box' or None], List[float]]:
+    """
+    Bounding boxes and areas of many segmentations at once. The polygons are flattened into one array of points,
+    and the extremes and the shoelace areas are reduced per polygon, then per segmentation.
+
+    Returns:
+        the bbox of every segmentation (None if it has no point), and its area, the sum of the areas of its polygons.
+        The area of a RLE segmentation is its number of pixels. The bboxes of segmentations whose coordinates are all
+        integers, and of RLE segmentations, have integer coordinates.
+    """
+    xyxy = np.full((len(segmentations), 4), np.nan)
+    areas = np.zeros(len(segmentations))
+    integral = np.ones(len(segmentations), dtype=bool)
+    owners = []
+    lengths = []
+    polygons = []
+    for i, segmentation in enumerate(segmentations):
+        if isinstance(segmentation, dict):
+            rle = mask.segmentation_to_rle(segmentation, 0, 0)
+            if rle.bbox is not None:
+                xyxy[i] = rle.bbox
+            areas[i] = rle.area
+            continue
+        for polygon in segmentation:
+            if len(polygon) >= 2:
+                owners.append(i)
+                lengths.append(len(polygon) // 2)
+                polygons.append(polygon if len(polygon) % 2 == 0 else polygon[:-1])
+                if not all(isinstance(v, int) for v in polygon):
+                    integral[i] = False
+
+    if len(polygons) != 0:
+        lengths = np.array(lengths)
+        points = np.fromiter(itertools.chain.from_iterable(polygons), dtype=float, count=2 * np.sum(lengths))
+        x = points[0::2]
+        y = points[1::2]
+        starts = np.cumsum(lengths) - lengths
+        # next point of every point, the last point of a polygon is followed by the first one
+        following = np.arange(1, len(x) + 1)
+        following[starts + lengths - 1] = starts
+        polygon_areas = np.abs(np.add.reduceat(x * y[following] - x[following] * y, starts)) / 2
+
+        owners, owner_starts = np.unique(owners, return_index=True)
+        xyxy[owners, 0] = np.minimum.reduceat(np.minimum.reduceat(x, starts), owner_starts)
+        xyxy[owners, 1] = np.minimum.reduceat(np.minimum.reduceat(y, starts), owner_starts)
+        xyxy[owners, 2] = np.maximum.reduceat(np.maximum.reduceat(x, starts), owner_starts)
+        xyxy[owners, 3] = np.maximum.reduceat(np.maximum.reduceat(y, starts), owner_starts)
+        areas[owners] = np.add.reduceat(polygon_areas, owner_starts)
+
+    has_points = (~np.isnan(xyxy[:, 0])).tolist()
+    bboxes = [None if not h else box.Box.of_box(*(map(int, b) if i else b))
+              for b, h, i in zip(xyxy.tolist(), has_points, integral.tolist())]
+    return bboxes, areas.tolist()
+
+
 class PCOCOImageCaptioning(PCOCOAnnotation):
+    __slots__ = _ANNOTATION_SLOTS + ('caption',)
+
     def __init__(self):
         super(PCOCOImageCaptioning, self).__init__()
         self.caption = None  # type:str or None
 
 
-class PCOCOObjectDetectionDataset(PCOCODataset):
+def _store_column(name: str) -> property:
+    def get(self):
+        if len(self._pending) != 0:
+            self._flush()
+        return getattr(self, '_' + name)
+
+    def set(self, value):
+        setattr(self, '_' + name, value)
+        self._indexes.pop(name, None)
+
+    return property(get, set)
+
+
+class AnnotationStore:
+    """
+    Struct-of-arrays storage of the annotations of an object detection dataset. `dataset.annotations[i]` is a
+    read-only proxy of the row i, a `PCOCOBoundingBox` or a `PCOCOSegments`, and the columns can be passed to the
+    vectorized code without a copy. The store has the lookups of `IndexedList`, on sorted copies of the columns that
+    are built on the first lookup. Rows are only appended, and ids, image ids and category ids must be integers.
+
+    Appended annotations are held until a column is read, then copied into the columns at once, and merged into the
+    sorted copies. Until then the lookups find them in a hash index, so that adding the annotations one by one, with
+    a lookup before every addition, is linear. Do not change the annotations before a column is read.
+
+    id, image_id, category_id: (N,) integer columns
+    score: (N,) scores, nan if missing
+    xyxy: (N, 4) [xtl, ytl, xbr, ybr] of the bounding boxes and of the bboxes of the segments, nan if missing
+    area: (N,) areas
+    iscrowd: (N,) whether the segments are crowds
+    is_segments: (N,) whether the rows are segments
+    polygon_offsets: (N + 1,) the polygons of the row i are polygon_offsets[i]:polygon_offsets[i + 1]
+    coordinate_offsets: (P + 1,) the x, y coordinates of the polygon j are
+        coordinates[coordinate_offsets[j]:coordinate_offsets[j + 1]]
+    rles: RLE segmentations by row
+    contributors, attributes: non-default contributors and attributes by row
+    """
+    keys = _ANNOTATION_KEYS
+    pairs = _ANNOTATION_PAIRS
+    id = _store_column('id')
+    image_id = _store_column('image_id')
+    category_id = _store_column('category_id')
+    score = _store_column('score')
+    xyxy = _store_column('xyxy')
+    area = _store_column('area')
+    iscrowd = _store_column('iscrowd')
+    is_segments = _store_column('is_segments')
+    polygon_offsets = _store_column('polygon_offsets')
+    coordinate_offsets = _store_column('coordinate_offsets')
+    coordinates = _store_column('coordinates')
+    rles = _store_column('rles')
+    contributors = _store_column('contributors')
+    attributes = _store_column('attributes')
+
     def __init__(self):
+        # sorted positions and sorted values of the looked up columns
+        self._indexes = {}  # type: Dict[str, Tuple[np.ndarray, np.ndarray]]
+        # appended annotations that are not in the columns yet, and their rows by key and value
+        self._pending = []  # type: List[PCOCOBoundingBox or PCOCOSegments]
+        self._pending_rows = {key: {} for key in self.keys}  # type: Dict[str, Dict[int, List[int]]]
+        self.id = np.zeros(0, dtype=np.int64)
+        self.image_id = np.zeros(0, dtype=np.int64)
+        self.category_id = np.zeros(0, dtype=np.int64)
+        self.score = np.zeros(0)
+        self.xyxy = np.zeros((0, 4))
+        self.area = np.zeros(0)
+        self.iscrowd = np.zeros(0, dtype=bool)
+        self.is_segments = np.zeros(0, dtype=bool)
+        self.polygon_offsets = np.zeros(1, dtype=np.int64)
+        self.coordinate_offsets = np.zeros(1, dtype=np.int64)
+        self.coordinates = np.zeros(0)
+        self.rles = {}  # type: Dict[int, dict]
+        self.contributors = {}  # type: Dict[int, str]
+        self.attributes = {}  # type: Dict[int, dict]
+
+    @classmethod
+    def of_annotations(cls, annotations: Iterable['PCOCOBoundingBox' or 'PCOCOSegments'],
+                       ids: Collection[int] = None) -> 'AnnotationStore':
+        """
+        Args:
+            ids: the ids of the rows, instead of the ids of the annotations
+        """
+        annotations = list(annotations)
+        xyxy = np.full((len(annotations), 4), np.nan)
+        segmentations = []
+        for i, ann in enumerate(annotations):
+            if isinstance(ann, PCOCOSegments):
+                b = ann.bbox
+                segmentations.append(ann.segmentation)
+            elif isinstance(ann, box.Box):
+                b = ann
+                segmentations.append(None)
+            else:
+                raise TypeError('%s: Not a bounding box or segments' % type(ann))
+            if b is not None:
+                xyxy[i] = b.xtl, b.ytl, b.xbr, b.ybr
+        return cls.of_columns([ann.id for ann in annotations] if ids is None else ids,
+                              [ann.image_id for ann in annotations],
+                              [ann.category_id for ann in annotations],
+                              [ann.score for ann in annotations],
+                              xyxy,
+                              [ann.area for ann in annotations],
+                              [getattr(ann, 'iscrowd', False) for ann in annotations],
+                              segmentations,
+                              [ann.contributor for ann in annotations],
+                              [ann._attributes for ann in annotations])
+
+    @classmethod
+    def of_columns(cls, id: Collection[int], image_id: Collection[int], category_id: Collection[int],
+                   score: Collection[float or None], xyxy: np.ndarray, area: Collection[float],
+                   iscrowd: Collection[bool], segmentations: List[List[List[float]] or dict or None],
+                   contributors: List[str] = None, attributes: List[dict or None] = None) -> 'AnnotationStore':
+        """
+        Args:
+            score: scores, None or nan if missing
+            segmentations: the segmentation of every row, None for the bounding boxes
+        """
+        store = cls()
+        store.id = np.asarray(id, dtype=np.int64).reshape(-1)
+        store.image_id = np.asarray(image_id, dtype=np.int64).reshape(-1)
+        store.category_id = np.asarray(category_id, dtype=np.int64).reshape(-1)
+        store.score = np.array(score, dtype=float).reshape(-1)
+        store.xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+        store.area = np.asarray(area, dtype=float).reshape(-1)
+        store.iscrowd = np.asarray(iscrowd, dtype=bool).reshape(-1)
+        store.is_segments = np.fromiter((seg is not None for seg in segmentations), dtype=bool,
+                                        count=len(segmentations))
+        polygons = []
+        polygon_counts = np.zeros(len(segmentations), dtype=np.int64)
+        for i, seg in enumerate(segmentations):
+            if isinstance(seg, dict):
+                store.rles[i] = seg
+            elif seg is not None:
+                polygons.extend(seg)
+                polygon_counts[i] = len(seg)
+        store.polygon_offsets = np.r_[0, np.cumsum(polygon_counts)]
+        store.coordinate_offsets = np.r_[0, np.cumsum([len(polygon) for polygon in polygons], dtype=np.int64)]
+        store.coordinates = np.fromiter(itertools.chain.from_iterable(polygons), dtype=float,
+                                        count=store.coordinate_offsets[-1])
+        if contributors is not None:
+            store.contributors = {i: c for i, c in enumerate(contributors) if c}
+        if attributes is not None:
+            store.attributes = {i: a for i, a in enumerate(attributes) if a is not None}
+        return store
+
+    def __len__(self):
+        return len(self._id) + len(self._pending)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._row(j) for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError('annotation index out of range')
+        return self._row(int(i) % n)
+
+    def __iter__(self):
+        return (self._row(i) for i in range(len(self)))
+
+    def __add__(self, other: Iterable) -> List:
+        return list(self) + list(other)
+
+    def __radd__(self, other: Iterable) -> List:
+        return list(other) + list(self)
+
+    def _row(self, i: int) -> 'PCOCOBoundingBox' or 'PCOCOSegments':
+        if self.is_segments[i]:
+            ann = _SegmentsRow.__new__(_SegmentsRow)
+            ann._polygons = None
+        else:
+            ann = _BoundingBoxRow.__new__(_BoundingBoxRow)
+        ann._store = self
+        ann._i = i
+        return ann
+
+    def segmentation(self, i: int) -> List[List[float]] or dict:
+        """
+        Returns:
+            the segmentation of the row i, decoded from the columns
+        """
+        if i in self.rles:
+            return self.rles[i]
+        offsets = self.coordinate_offsets
+        return [self.coordinates[offsets[j]:offsets[j + 1]].tolist()
+                for j in range(self.polygon_offsets[i], self.polygon_offsets[i + 1])]
+
+    def _get_index(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        if key not in self._indexes:
+            column = getattr(self, '_' + key)
+            order = np.argsort(column, kind='stable')
+            self._indexes[key] = order, column[order]
+        return self._indexes[key]
+
+    def _find_rows(self, key: str, value) -> np.ndarray:
+        if not isinstance(value, (int, np.integer)):
+            return np.zeros(0, dtype=np.intp)
+        order, values = self._get_index(key)
+        rows = order[np.searchsorted(values, value, 'left'):np.searchsorted(values, value, 'right')]
+        if value in self._pending_rows[key]:
+            rows = np.r_[rows, self._pending_rows[key][value]]
+        return rows
+
+    def find(self, key: str, value) -> List:
+        """
+        Returns:
+            the rows whose column key equals value, in insertion order
+        """
+        return [self._row(i) for i in self._find_rows(key, value).tolist()]
+
+    def find_all(self, key: str, values: Collection) -> List:
+        """
+        Returns:
+            the rows whose column key is one of the values, in row order
+        """
+        rows = [self._find_rows(key, value) for value in dict.fromkeys(values)]
+        return [self._row(i) for i in np.sort(np.concatenate(rows or [np.zeros(0, dtype=np.intp)])).tolist()]
+
+    def find_count(self, key: str, value) -> int:
+        return len(self._find_rows(key, value))
+
+    def find_values(self, key: str) -> KeysView:
+        return dict.fromkeys(np.unique(getattr(self, key)).tolist()).keys()
+
+    def find_related(self, key: str, value, other: str) -> KeysView:
+        return dict.fromkeys(np.unique(getattr(self, other)[self._find_rows(key, value)]).tolist()).keys()
+
+    def append(self, annotation: 'PCOCOBoundingBox' or 'PCOCOSegments'):
+        if not isinstance(annotation, (PCOCOSegments, box.Box)):
+            raise TypeError('%s: Not a bounding box or segments' % type(annotation))
+        values = [getattr(annotation, key) for key in self.keys]
+        if not all(isinstance(value, (int, np.integer)) for value in values):
+            raise TypeError('%s: Not integers' % dict(zip(self.keys, values)))
+        row = len(self)
+        self._pending.append(annotation)
+        for key, value in zip(self.keys, values):
+            self._pending_rows[key].setdefault(value, []).append(row)
+
+    def extend(self, annotations: Iterable['PCOCOBoundingBox' or 'PCOCOSegments'], ids: Collection[int] = None):
+        """
+        Args:
+            ids: the ids of the new rows, instead of the ids of the annotations
+        """
+        if ids is not None:
+            annotations = self.of_annotations(annotations, ids)
+        elif not isinstance(annotations, AnnotationStore):
+            for annotation in annotations:
+                self.append(annotation)
+            return
+        if len(self._pending) != 0:
+            self._flush()
+        self._concatenate(annotations)
+
+    def _flush(self):
+        pending = self._pending
+        self._pending = []
+        self._pending_rows = {key: {} for key in self.keys}
+        self._concatenate(self.of_annotations(pending))
+
+    def _concatenate(self, other: 'AnnotationStore'):
+        n = len(self._id)
+        columns = {name: getattr(other, name) for name in ('id', 'image_id', 'category_id', 'score', 'xyxy', 'area',
+                                                           'iscrowd', 'is_segments')}
+        # merge the new rows into the sorted copies, after the rows of the same values
+        for key, (order, values) in self._indexes.items():
+            new_order = np.argsort(columns[key], kind='stable')
+            new_values = columns[key][new_order]
+            positions = np.searchsorted(values, new_values, 'right')
+            self._indexes[key] = np.insert(order, positions, new_order + n), np.insert(values, positions, new_values)
+        for name, column in columns.items():
+            setattr(self, '_' + name, np.concatenate((getattr(self, '_' + name), column)))
+        self._polygon_offsets = np.r_[self._polygon_offsets, other.polygon_offsets[1:] + self._polygon_offsets[-1]]
+        self._coordinate_offsets = np.r_[self._coordinate_offsets,
+                                         other.coordinate_offsets[1:] + self._coordinate_offsets[-1]]
+        self._coordinates = np.concatenate((self._coordinates, other.coordinates))
+        for name in ('rles', 'contributors', 'attributes'):
+            getattr(self, '_' + name).update({n + i: v for i, v in getattr(other, name).items()})
+
+    def __iadd__(self, annotations: Iterable['PCOCOBoundingBox' or 'PCOCOSegments']):
+        self.extend(annotations)
+        return self
+
+    def clear(self):
+        self.__init__()
+
+
+def _column_property(name: str) -> property:
+    return property(lambda self: getattr(self._store, name)[self._i].item())
+
+
+def _coordinate_property(k: int) -> property:
+    return property(lambda self: self._store.xyxy[self._i, k].item())
+
+
+class _BoundingBoxRow(PCOCOBoundingBox):
+    """
+    A read-only bounding box of an `AnnotationStore`. Copies and pickles are `PCOCOBoundingBox`es.
+    """
+    __slots__ = ('_store', '_i')
+    id = _column_property('id')
+    image_id = _column_property('image_id')
+    category_id = _column_property('category_id')
+    score = property(lambda self: _get_score(self._store, self._i))
+    contributor = property(lambda self: self._store.contributors.get(self._i, ''))
+    _attributes = property(lambda self: self._store.attributes.get(self._i))
+    attributes = property(lambda self: self._store.attributes.get(self._i, {}))
+    xtl = _coordinate_property(0)
+    ytl = _coordinate_property(1)
+    xbr = _coordinate_property(2)
+    ybr = _coordinate_property(3)
+
+    def __reduce__(self):
+        return PCOCOBoundingBox.of_values, (self.id, self.image_id, self.category_id, self.xtl, self.ytl, self.xbr,
+                                            self.ybr, self.score, self.contributor, self._attributes)
+
+
+class _SegmentsRow(PCOCOSegments):
+    """
+    Read-only segments of an `AnnotationStore`. The segmentation is decoded on every access. Copies and pickles are
+    `PCOCOSegments`.
+    """
+    __slots__ = ('_store', '_i')
+    id = _column_property('id')
+    image_id = _column_property('image_id')
+    category_id = _column_property('category_id')
+    score = property(lambda self: _get_score(self._store, self._i))
+    contributor = property(lambda self: self._store.contributors.get(self._i, ''))
+    _attributes = property(lambda self: self._store.attributes.get(self._i))
+    attributes = property(lambda self: self._store.attributes.get(self._i, {}))
+    iscrowd = _column_property('iscrowd')
+    _segmentation = property(lambda self: self._store.segmentation(self._i))
+    _bbox = property(lambda self: _get_bbox(self._store, self._i))
+    _area = _column_property('area')
+
+    def __reduce__(self):
+        return PCOCOSegments.of_values, (self.id, self.image_id, self.category_id, self.segmentation, self.iscrowd,
+                                         self.score, self.contributor, self._attributes, self.bbox, self.area)
+
+
+def _get_score(store: AnnotationStore, i: int) -> float or None:
+    score = store.score[i].item()
+    return None if np.isnan(score) else score
+
+
+def _get_bbox(store: AnnotationStore, i: int) -> 'box.Box' or None:
+    if np.isnan(store.xyxy[i]).any():
+        return None
+    return box.Box.of_box(*store.xyxy[i].tolist())
+
+
+class PCOCOObjectDetectionDataset(PCOCODataset):
+    """
+    columnar: hold the annotations in an `AnnotationStore` instead of a list of objects
+    """
+    def __init__(self, columnar: bool = False):
         super(PCOCOObjectDetectionDataset, self).__init__()
-        self.annotations = []  # type: List[PCOCOBoundingBox or PCOCOSegments]
+        self.annotations = AnnotationStore() if columnar else []  # type: List[PCOCOBoundingBox or PCOCOSegments]
         self.categories = []  # type: List[PCOCOCategory]
 
+    @property
+    def annotations(self) -> List[PCOCOBoundingBox or PCOCOSegments]:
+        return self._annotations
+
+    @annotations.setter
+    def annotations(self, value: List[PCOCOBoundingBox or PCOCOSegments] or AnnotationStore):
+        if isinstance(value, AnnotationStore):
+            self._annotations = value
+        else:
+            self._annotations = _indexed(value, _ANNOTATION_KEYS, _ANNOTATION_PAIRS)
+
+    @property
+    def categories(self) -> List[PCOCOCategory]:
+        return self._categories
+
+    @categories.setter
+    def categories(self, value: List[PCOCOCategory]):
+        self._categories = _indexed(value, _CATEGORY_KEYS)
+
     def add_annotation(self, annotation: 'PCOCOBoundingBox' or 'PCOCOSegments'):
-        for ann in self.annotations:
-            if ann.id == annotation.id:
-                raise KeyError('%s: Annotation exists' % ann.id)
+        for ann in self.annotations.find('id', annotation.id):
+            raise KeyError('%s: Annotation exists' % ann.id)
         self.annotations.append(annotation)
 
     def add_category(self, category: PCOCOCategory):
-        for cat in self.categories:
-            if cat.id == category.id or cat.name == category.name:
-                raise KeyError('%s: Category exists' % cat.id)
+        for cat in self.categories.find('id', category.id) + self.categories.find('name', category.name):
+            raise KeyError('%s: Category exists' % cat.id)
         self.categories.append(category)
 
+    def add_annotations(self, annotations: Iterable['PCOCOBoundingBox' or 'PCOCOSegments'], assign_ids: bool = False):
+        """
+        Add many annotations at once. Unlike calling `add_annotation` on every annotation, all the conflicts with
+        the dataset and within the annotations are reported at once, and nothing is added if there is one.
+
+        Args:
+            annotations: iterable or array of annotations
+            assign_ids: give the annotations consecutive ids after the largest id of the dataset (from 0 if it is
+                empty), instead of checking their ids
+        Raises:
+            KeyError: if ids are not unique
+        """
+        _add_all(self.annotations, annotations, ('id',), 'Annotations', assign_ids)
+
+    def add_categories(self, categories: Iterable[PCOCOCategory], assign_ids: bool = False):
+        """
+        Add many categories at once, see `add_annotations`. Ids and names must be unique.
+        """
+        _add_all(self.categories, categories, ('id', 'name'), 'Categories', assign_ids)
+
     def get_max_category_id(self):
         return max(cat.id for cat in self.categories)
 
@@ -197,9 +1106,8 @@ class PCOCOObjectDetectionDataset(PCOCODataset):
         if id is not None and name is not None:
             raise KeyError('%s %s: Cannot set both' % (id, name))
 
-        cats = self.categories
         if id is not None:
-            cats = [cat for cat in cats if cat.id == id]
+            cats = self.categories.find('id', id)
             if len(cats) == 0:
                 return default
             elif len(cats) == 1:
@@ -208,7 +1116,7 @@ class PCOCOObjectDetectionDataset(PCOCODataset):
                 raise KeyError('%s: more than one category with the same id' % id)
 
         if name is not None:
-            cats = [cat for cat in cats if cat.name == name]
+            cats = self.categories.find('name', name)
             if len(cats) == 0:
                 return default
             elif len(cats) == 1:
@@ -219,7 +1127,7 @@ class PCOCOObjectDetectionDataset(PCOCODataset):
         raise Exception('Should not be here')
 
     def get_annotation(self, id: int, default=None) -> PCOCOAnnotation:
-        anns = [ann for ann in self.annotations if ann.id == id]
+        anns = self.annotations.find('id', id)
         if len(anns) == 0:
             return default
         elif len(anns) == 1:
@@ -228,15 +1136,25 @@ class PCOCOObjectDetectionDataset(PCOCODataset):
             raise KeyError('%s: more than one annotation' % id)
 
     def get_new_dataset(self, annotations: Collection[PCOCOBoundingBox or PCOCOSegments]):
-        new_dataset = PCOCOObjectDetectionDataset()
-        new_dataset.info = copy.deepcopy(self.info)
-        new_dataset.licenses = copy.deepcopy(self.licenses)
-        new_dataset.images = copy.deepcopy(self.images)
-        new_dataset.categories = copy.deepcopy(self.categories)
-        for ann in annotations:
-            new_dataset.add_annotation(ann)
+        """
+        Create a dataset of the annotations with the metadata of this dataset. The lists of images, licenses and
+        categories are copied on write and their items are shared, so they must not be modified in place.
+        """
+        new_dataset = PCOCOObjectDetectionDataset(columnar=isinstance(self.annotations, AnnotationStore))
+        new_dataset.info = copy.copy(self.info)
+        new_dataset.licenses = self.licenses.copy()
+        new_dataset.images = self.images.copy()
+        new_dataset.categories = self.categories.copy()
+        new_dataset.add_annotations(annotations)
         return new_dataset
 
+    def view(self, **filters) -> 'PCOCODatasetView':
+        """
+        Returns:
+            a lazy view of the annotations that satisfy the filters, see `PCOCODatasetView`
+        """
+        return PCOCODatasetView(self, **filters)
+
     def get_category_ids(self, category_names: Collection[str] = None,
                          supercategory_names: Collection[str] = None) -> Collection[int]:
         """
@@ -262,18 +1180,10 @@ class PCOCOObjectDetectionDataset(PCOCODataset):
         :param area_range: get anns for given area range (e.g. [0 inf])
         :return: integer array of ann ids
         """
-        # image_ids = convert_array_argument(image_ids)
-        # category_ids = convert_array_argument(category_ids)
-        # area_range = convert_array_argument(area_range)
-
-        itr = iter(self.annotations)
-        if image_ids is not None:
-            itr = filter(lambda x: x.image_id in image_ids, itr)
-        if category_ids is not None:
-            itr = filter(lambda x: x.category_id in category_ids, itr)
+        anns = _select_annotations(self.annotations, image_ids, category_ids)
         if area_range is not None:
-            itr = filter(lambda x: area_range[0] <= x.area <= area_range[1], itr)
-        return [ann.id for ann in itr]
+            anns = [ann for ann in anns if area_range[0] <= ann.area <= area_range[1]]
+        return [ann.id for ann in anns]
 
     def get_image_ids(self, category_ids: Collection[int] = None) -> Collection[int]:
         """
@@ -281,13 +1191,15 @@ class PCOCOObjectDetectionDataset(PCOCODataset):
         :param category_ids: get imgs with all given cats
         :return: ids: integer array of img ids
         """
-        ids = set(img.id for img in self.images)
-        for i, cat_id in enumerate(category_ids):
-            if i == 0 and len(ids) == 0:
-                ids = set(ann.image_id for ann in self.annotations if ann.category_id == cat_id)
-            else:
-                ids &= set(ann.image_id for ann in self.annotations if ann.category_id == cat_id)
-        return list(ids)
+        if category_ids is None or len(category_ids) == 0:
+            return [img.id for img in self.images]
+        # the images of the category with the fewest images, that are also images of the other categories
+        related = sorted((self.annotations.find_related('category_id', cat_id, 'image_id')
+                          for cat_id in dict.fromkeys(category_ids)), key=len)
+        ids = [id for id in related[0] if all(id in r for r in related[1:])]
+        if len(self.images) != 0:
+            ids = [id for id in ids if self.images.find_count('id', id) != 0]
+        return ids
 
     def get_annotations(self, ids: Collection[int] = None) -> Collection[PCOCOAnnotation]:
         """
@@ -295,7 +1207,9 @@ class PCOCOObjectDetectionDataset(PCOCODataset):
         :param ids: integer ids specifying anns
         :return: anns: loaded ann objects
         """
-        return [ann for ann in self.annotations if ann.id in ids]
+        if ids is None:
+            return list(self.annotations)
+        return _find_all(self.annotations, 'id', ids)
 
     def get_categories(self, ids: Collection[int] = None) -> Collection[PCOCOCategory]:
         """
@@ -303,4 +1217,139 @@ class PCOCOObjectDetectionDataset(PCOCODataset):
         :param ids: integer ids specifying cats
         :return: cats: loaded cat objects
         """
-        return [cat for cat in self.categories if cat.id in ids]
+        if ids is None:
+            return list(self.categories)
+        return _find_all(self.categories, 'id', ids)
+
+
+class PCOCODatasetView:
+    """
+    A read-only view of the annotations of a dataset that satisfy some filters. The filters are applied on the first
+    access to the annotations, and nothing is copied: the view holds the annotations, the images and the categories
+    of the dataset. It has the queries of the dataset, so it can be evaluated like one, e.g., with
+    `get_bounding_boxes`. A view does not follow the changes of the dataset after its first access.
+
+    Args:
+        image_ids: keep the annotations and the images of the images
+        category_ids, category_names, supercategory_names: keep the annotations and the categories of the categories
+        area_range: keep the annotations whose area is in [min, max]
+        score_range: keep the annotations whose score is in [min, max]. Annotations without a score are dropped.
+        iscrowd: keep the crowd annotations, or the other ones. Bounding boxes are not crowds.
+    """
+    def __init__(self, dataset: PCOCOObjectDetectionDataset, image_ids: Collection[int] = None,
+                 category_ids: Collection[int] = None, category_names: Collection[str] = None,
+                 supercategory_names: Collection[str] = None, area_range: Tuple[float, float] = None,
+                 score_range: Tuple[float, float] = None, iscrowd: bool = None):
+        self.dataset = dataset
+        # ordered sets of the kept values, None keeps everything
+        self._image_ids = _as_keys(image_ids)
+        self._category_ids = _as_keys(category_ids)
+        self._category_names = _as_keys(category_names)
+        self._supercategory_names = _as_keys(supercategory_names)
+        self._iscrowd = None if iscrowd is None else {bool(iscrowd): None}
+        self._area_range = area_range
+        self._score_range = score_range
+        self._annotations = None  # type: IndexedList or None
+        self._images = None  # type: IndexedList or None
+        self._categories = None  # type: IndexedList or None
+
+    def view(self, **filters) -> 'PCOCODatasetView':
+        """
+        Returns:
+            a view of the annotations of this view that also satisfy the filters
+        """
+        view = PCOCODatasetView(self.dataset, **filters)
+        view._image_ids = _intersect_keys(self._image_ids, view._image_ids)
+        view._category_ids = _intersect_keys(self._category_ids, view._category_ids)
+        view._category_names = _intersect_keys(self._category_names, view._category_names)
+        view._supercategory_names = _intersect_keys(self._supercategory_names, view._supercategory_names)
+        view._iscrowd = _intersect_keys(self._iscrowd, view._iscrowd)
+        view._area_range = _intersect_range(self._area_range, view._area_range)
+        view._score_range = _intersect_range(self._score_range, view._score_range)
+        return view
+
+    def materialize(self) -> PCOCOObjectDetectionDataset:
+        """
+        Returns:
+            a dataset of the annotations of the view, see `PCOCOObjectDetectionDataset.get_new_dataset`
+        """
+        return self.get_new_dataset(self.annotations)
+
+    @property
+    def info(self) -> PCOCOInfo:
+        return self.dataset.info
+
+    @property
+    def licenses(self) -> List[PCOCOLicense]:
+        return self.dataset.licenses
+
+    @property
+    def images(self) -> List[PCOCOImage]:
+        if self._image_ids is None:
+            return self.dataset.images
+        if self._images is None:
+            self._images = IndexedList(_IMAGE_KEYS, _find_all(self.dataset.images, 'id', self._image_ids))
+        return self._images
+
+    @property
+    def categories(self) -> List[PCOCOCategory]:
+        category_ids = self._get_category_ids()
+        if category_ids is None:
+            return self.dataset.categories
+        if self._categories is None:
+            self._categories = IndexedList(_CATEGORY_KEYS, _find_all(self.dataset.categories, 'id', category_ids))
+        return self._categories
+
+    @property
+    def annotations(self) -> List[PCOCOBoundingBox or PCOCOSegments]:
+        if self._annotations is None:
+            anns = _select_annotations(self.dataset.annotations, self._image_ids, self._get_category_ids())
+            if self._area_range is not None:
+                low, high = self._area_range
+                anns = [ann for ann in anns if low <= ann.area <= high]
+            if self._score_range is not None:
+                low, high = self._score_range
+                anns = [ann for ann in anns if ann.score is not None and low <= ann.score <= high]
+            if self._iscrowd is not None:
+                anns = [ann for ann in anns if bool(getattr(ann, 'iscrowd', False)) in self._iscrowd]
+            self._annotations = IndexedList(_ANNOTATION_KEYS, anns, _ANNOTATION_PAIRS)
+        return self._annotations
+
+    def _get_category_ids(self) -> Dict[int, None] or None:
+        category_ids = self._category_ids
+        if self._category_names is not None or self._supercategory_names is not None:
+            named_ids = self.dataset.get_category_ids(self._category_names, self._supercategory_names)
+            category_ids = _intersect_keys(category_ids, dict.fromkeys(named_ids))
+        return category_ids
+
+    get_image = PCOCODataset.get_image
+    get_images = PCOCODataset.get_images
+    get_category = PCOCOObjectDetectionDataset.get_category
+    get_annotation = PCOCOObjectDetectionDataset.get_annotation
+    get_new_dataset = PCOCOObjectDetectionDataset.get_new_dataset
+    get_category_ids = PCOCOObjectDetectionDataset.get_category_ids
+    get_annotation_ids = PCOCOObjectDetectionDataset.get_annotation_ids
+    get_image_ids = PCOCOObjectDetectionDataset.get_image_ids
+    get_annotations = PCOCOObjectDetectionDataset.get_annotations
+    get_categories = PCOCOObjectDetectionDataset.get_categories
+
+
+def _as_keys(values: Iterable or None) -> Dict[Any, None] or None:
+    return None if values is None else dict.fromkeys(values)
+
+
+def _intersect_keys(keys: Dict[Any, None] or None, other: Dict[Any, None] or None) -> Dict[Any, None] or None:
+    if keys is None:
+        return other
+    if other is None:
+        return keys
+    return {key: None for key in keys if key in other}
+
+
+def _intersect_range(value_range: Tuple[float, float] or None, other: Tuple[float, float] or None) \
+        -> Tuple[float, float] or None:
+    if value_range is None:
+        return other
+    if other is None:
+        return value_range
+    return max(value_range[0], other[0]), min(value_range[1], other[1])
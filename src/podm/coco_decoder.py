@@ -1,9 +1,12 @@
 import copy
 import json
-from typing import Dict
+from typing import Dict, List
 
+import numpy as np
+
+from podm.box import BBFormat, convert_boxes
 from podm.coco import PCOCOLicense, PCOCOInfo, PCOCOImage, PCOCOCategory, PCOCOBoundingBox, PCOCOSegments, \
-    PCOCOObjectDetectionDataset
+    PCOCOObjectDetectionDataset, AnnotationStore, segmentation_bboxes
 
 
 def parse_infon(obj: Dict) -> PCOCOInfo:
@@ -39,37 +42,78 @@ def parse_image(obj: Dict) -> PCOCOImage:
 
 
 def parse_bounding_box(obj: Dict) -> PCOCOBoundingBox:
-    ann = PCOCOBoundingBox()
-    ann.id = obj['id']
-    ann.category_id = obj['category_id']
-    ann.image_id = obj['image_id']
-    ann.xtl = obj['bbox'][0]
-    ann.ytl = obj['bbox'][1]
-    ann.xbr = ann.xtl + obj['bbox'][2]
-    ann.ybr = ann.ytl + obj['bbox'][3]
-    if 'contributor' in obj:
-        ann.contributor = obj['contributor']
-    if 'score' in obj:
-        ann.score = obj['score']
-    if 'attributes' in obj:
-        ann.attributes = obj['attributes']
-    return ann
+    return parse_bounding_boxes([obj])[0]
+
+
+def parse_bounding_boxes(objs: List[Dict]) -> List[PCOCOBoundingBox]:
+    """
+    Parse many bounding boxes at once, the XYWH coordinates are converted as one array.
+    """
+    xyxy = convert_boxes([obj['bbox'][:4] for obj in objs], BBFormat.XYWH).tolist()
+    return [PCOCOBoundingBox.of_values(obj['id'], obj['image_id'], obj['category_id'], *b,
+                                       score=obj.get('score'), contributor=obj.get('contributor', ''),
+                                       attributes=obj.get('attributes'))
+            for obj, b in zip(objs, xyxy)]
 
 
 def parse_segments(obj: Dict) -> PCOCOSegments:
-    ann = PCOCOSegments()
-    ann.id = obj['id']
-    ann.category_id = obj['category_id']
-    ann.image_id = obj['image_id']
-    ann.iscrowd = obj['iscrowd']
-    ann.segmentation = obj['segmentation']
-    if 'score' in obj:
-        ann.score = obj['score']
-    if 'contributor' in obj:
-        ann.contributor = obj['contributor']
-    if 'attributes' in obj:
-        ann.attributes = obj['attributes']
-    return ann
+    return parse_many_segments([obj])[0]
+
+
+def parse_many_segments(objs: List[Dict]) -> List[PCOCOSegments]:
+    """
+    Parse many segments at once, the bboxes and the areas of the segmentations are computed together.
+    """
+    bboxes, areas = segmentation_bboxes([obj['segmentation'] for obj in objs])
+    return [PCOCOSegments.of_values(obj['id'], obj['image_id'], obj['category_id'], obj['segmentation'],
+                                    iscrowd=obj.get('iscrowd', False), score=obj.get('score'),
+                                    contributor=obj.get('contributor', ''), attributes=obj.get('attributes'),
+                                    bbox=bbox, area=area)
+            for obj, bbox, area in zip(objs, bboxes, areas)]
+
+
+def parse_annotations(objs: List[Dict]) -> List[PCOCOBoundingBox or PCOCOSegments]:
+    """
+    Parse annotations with a segmentation as segments, and the others as bounding boxes. The order is kept.
+    """
+    is_segments = ['segmentation' in obj and len(obj['segmentation']) > 0 for obj in objs]
+    bboxes = iter(parse_bounding_boxes([obj for obj, s in zip(objs, is_segments) if not s]))
+    segments = iter(parse_many_segments([obj for obj, s in zip(objs, is_segments) if s]))
+    return [next(segments) if s else next(bboxes) for s in is_segments]
+
+
+def parse_annotation_store(objs: List[Dict], segments: bool = True) -> AnnotationStore:
+    """
+    Parse annotations into columns, without an object per annotation.
+
+    Args:
+        segments: parse the annotations with a segmentation as segments, as `parse_annotations`. Otherwise they are
+            all bounding boxes, as `parse_bounding_boxes`.
+    """
+    segmentations = [obj['segmentation'] if segments and 'segmentation' in obj and len(obj['segmentation']) > 0
+                     else None for obj in objs]
+    is_segments = np.array([seg is not None for seg in segmentations], dtype=bool)
+    xyxy = np.full((len(objs), 4), np.nan)
+    areas = np.zeros(len(objs))
+    if not is_segments.all():
+        boxes = convert_boxes([obj['bbox'][:4] for obj, seg in zip(objs, segmentations) if seg is None],
+                              BBFormat.XYWH)
+        xyxy[~is_segments] = boxes
+        areas[~is_segments] = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if is_segments.any():
+        bboxes, segment_areas = segmentation_bboxes([seg for seg in segmentations if seg is not None])
+        xyxy[is_segments] = [[np.nan] * 4 if b is None else [b.xtl, b.ytl, b.xbr, b.ybr] for b in bboxes]
+        areas[is_segments] = segment_areas
+    return AnnotationStore.of_columns([obj['id'] for obj in objs],
+                                      [obj['image_id'] for obj in objs],
+                                      [obj['category_id'] for obj in objs],
+                                      [obj.get('score') for obj in objs],
+                                      xyxy,
+                                      areas,
+                                      [obj.get('iscrowd', False) for obj in objs],
+                                      segmentations,
+                                      [obj.get('contributor', '') for obj in objs],
+                                      [obj.get('attributes') for obj in objs])
 
 
 def parse_category(obj: Dict) -> PCOCOCategory:
@@ -80,7 +124,11 @@ def parse_category(obj: Dict) -> PCOCOCategory:
     return cat
 
 
-def parse_object_detection_dataset(coco_obj: Dict) -> PCOCOObjectDetectionDataset:
+def parse_object_detection_dataset(coco_obj: Dict, columnar: bool = False) -> PCOCOObjectDetectionDataset:
+    """
+    Args:
+        columnar: hold the annotations in an `AnnotationStore`
+    """
     dataset = PCOCOObjectDetectionDataset()
     dataset.info = parse_infon(coco_obj['info'])
 
@@ -92,12 +140,14 @@ def parse_object_detection_dataset(coco_obj: Dict) -> PCOCOObjectDetectionDatase
         img = parse_image(img_obj)
         dataset.images.append(img)
 
-    for ann_obj in coco_obj['annotations']:
-        if 'segmentation' in ann_obj and len(ann_obj['segmentation']) > 0:
-            ann = parse_segments(ann_obj)
-        else:
-            ann = parse_bounding_box(ann_obj)
-        dataset.add_annotation(ann)
+    if columnar:
+        dataset.annotations = parse_annotation_store(coco_obj['annotations'])
+        ids, counts = np.unique(dataset.annotations.id, return_counts=True)
+        for id in ids[counts > 1].tolist():
+            raise KeyError('%s: Annotation exists' % id)
+    else:
+        for ann in parse_annotations(coco_obj['annotations']):
+            dataset.add_annotation(ann)
 
     for cat_obj in coco_obj['categories']:
         cat = parse_category(cat_obj)
@@ -106,27 +156,49 @@ def parse_object_detection_dataset(coco_obj: Dict) -> PCOCOObjectDetectionDatase
     return dataset
 
 
-def load_true_object_detection_dataset(fp, **kwargs) -> PCOCOObjectDetectionDataset:
+def load_true_object_detection_dataset(fp, columnar: bool = False, **kwargs) -> PCOCOObjectDetectionDataset:
+    coco_obj = json.load(fp, **kwargs)
+    return parse_object_detection_dataset(coco_obj, columnar)
+
+
+def load_pred_object_detection_dataset(fp, dataset: PCOCOObjectDetectionDataset, columnar: bool = False, **kwargs) \
+        -> PCOCOObjectDetectionDataset:
+    coco_obj = json.load(fp, **kwargs)
+    if columnar:
+        return _new_pred_dataset(dataset, parse_annotation_store(coco_obj, segments=False))
+    return _new_pred_dataset(dataset, parse_bounding_boxes(coco_obj))
+
+
+def load_pred_segmentation_dataset(fp, dataset: PCOCOObjectDetectionDataset, columnar: bool = False, **kwargs) \
+        -> PCOCOObjectDetectionDataset:
+    """
+    Load detections in the COCO results format. Detections with a segmentation (polygons or RLE) are segments, the
+    others are bounding boxes.
+    """
     coco_obj = json.load(fp, **kwargs)
-    return parse_object_detection_dataset(coco_obj)
+    if columnar:
+        return _new_pred_dataset(dataset, parse_annotation_store(coco_obj))
+    return _new_pred_dataset(dataset, parse_annotations(coco_obj))
 
 
-def load_pred_object_detection_dataset(fp, dataset: PCOCOObjectDetectionDataset, **kwargs) \
+def _new_pred_dataset(dataset: PCOCOObjectDetectionDataset,
+                      annotations: List[PCOCOBoundingBox or PCOCOSegments] or AnnotationStore) \
         -> PCOCOObjectDetectionDataset:
+    # share the metadata of the ground truth, see get_new_dataset
     new_dataset = PCOCOObjectDetectionDataset()
-    new_dataset.info = copy.deepcopy(dataset.info)
-    new_dataset.licenses = copy.deepcopy(dataset.licenses)
-    new_dataset.images = copy.deepcopy(dataset.images)
-    new_dataset.categories = copy.deepcopy(dataset.categories)
+    new_dataset.info = copy.copy(dataset.info)
+    new_dataset.licenses = dataset.licenses.copy()
+    new_dataset.images = dataset.images.copy()
+    new_dataset.categories = dataset.categories.copy()
     # check annotation
-    coco_obj = json.load(fp, **kwargs)
-    annotations = []
-    for obj in coco_obj:
-        ann = parse_bounding_box(obj)
-        if new_dataset.get_image(id=ann.image_id) is None:
-            print('%s: Cannot find image' % ann.image_id)
-        if new_dataset.get_category(id=ann.category_id) is None:
-            print('%s: Cannot find category' % ann.category_id)
-        annotations.append(ann)
+    if isinstance(annotations, AnnotationStore):
+        keys = zip(annotations.image_id.tolist(), annotations.category_id.tolist())
+    else:
+        keys = ((ann.image_id, ann.category_id) for ann in annotations)
+    for image_id, category_id in keys:
+        if new_dataset.get_image(id=image_id) is None:
+            print('%s: Cannot find image' % image_id)
+        if new_dataset.get_category(id=category_id) is None:
+            print('%s: Cannot find category' % category_id)
     new_dataset.annotations = annotations
     return new_dataset
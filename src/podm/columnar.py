@@ -0,0 +1,271 @@
+"""
+Columnar matching of predictions to ground truths.
+
+Boxes are given as parallel NumPy arrays instead of one Python object per box:
+
+    image: (N,) integer image index
+    category: (N,) integer category index
+    score: (N,) confidence of the detection (predictions only)
+    xyxy: (N, 4) [xtl, ytl, xbr, ybr] coordinates
+
+The matching follows `podm.metrics.get_pascal_voc_metrics`: predictions are visited by decreasing score, each one
+is compared with the ground truths of the same image and category, and it is a TP if the ground truth with the
+highest IOU reaches the threshold and has not been taken by a higher-scored prediction.
+"""
+import sys
+from typing import Tuple
+
+import numpy as np
+
+from podm.box import pairwise_intersection_over_union, paired_intersection_over_union, SortAndSweepIndex, _ranges
+
+# maximum number of (prediction, ground truth) pairs whose IOU is computed at once
+MAX_PAIRS = 1 << 22
+# images with at least this number of ground truths are matched with a spatial index
+SPATIAL_INDEX_MIN_BOXES = 64
+
+
+def match_image(pred_xyxy: np.ndarray, gold_xyxy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the ground truth with the highest IOU for every prediction of one image and category.
+
+    Returns:
+        index of the best ground truth (-1 if no ground truth overlaps)
+        IOU with the best ground truth
+    """
+    n = len(pred_xyxy)
+    if n == 0 or len(gold_xyxy) == 0:
+        return np.full(n, -1, dtype=np.intp), np.zeros(n)
+    ious = pairwise_intersection_over_union(pred_xyxy, gold_xyxy)
+    best = np.argmax(ious, axis=1)
+    best_iou = ious[np.arange(n), best]
+    best[best_iou <= sys.float_info.min] = -1
+    return best, best_iou
+
+
+def match_images(pred_xyxy: np.ndarray, pred_starts: np.ndarray, pred_ends: np.ndarray,
+                 gold_xyxy: np.ndarray, gold_starts: np.ndarray, gold_ends: np.ndarray,
+                 max_pairs: int = MAX_PAIRS, spatial_index_min_boxes: int = None) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    `match_image` over many images at once. The boxes of image k are pred_xyxy[pred_starts[k]:pred_ends[k]] and
+    gold_xyxy[gold_starts[k]:gold_ends[k]]; every image must have ground truths. The IOUs of all
+    (prediction, ground truth) pairs of an image are computed in one vectorized pass, at most max_pairs at a time.
+    Images with at least spatial_index_min_boxes (default SPATIAL_INDEX_MIN_BOXES) ground truths are matched with
+    `match_image_spatial` instead.
+
+    Returns:
+        for every prediction in the concatenated image ranges:
+            row of the best ground truth in gold_xyxy (-1 if no ground truth overlaps)
+            IOU with the best ground truth
+    """
+    pred_starts = np.asarray(pred_starts, dtype=np.intp)
+    gold_starts = np.asarray(gold_starts, dtype=np.intp)
+    num_preds = np.asarray(pred_ends, dtype=np.intp) - pred_starts
+    num_golds = np.asarray(gold_ends, dtype=np.intp) - gold_starts
+    first_pred = np.cumsum(num_preds) - num_preds
+    best_gt = np.full(num_preds.sum(), -1, dtype=np.intp)
+    best_iou = np.zeros(num_preds.sum())
+
+    if spatial_index_min_boxes is None:
+        spatial_index_min_boxes = SPATIAL_INDEX_MIN_BOXES
+    crowded = num_golds >= spatial_index_min_boxes
+    for k in np.flatnonzero(crowded):
+        rows = slice(first_pred[k], first_pred[k] + num_preds[k])
+        best, best_iou[rows] = match_image_spatial(pred_xyxy[pred_starts[k]:pred_starts[k] + num_preds[k]],
+                                                   gold_xyxy[gold_starts[k]:gold_starts[k] + num_golds[k]])
+        best_gt[rows] = np.where(best >= 0, best + gold_starts[k], -1)
+
+    images = np.flatnonzero(~crowded)
+    num_pairs = num_preds[images] * num_golds[images]
+    cumulative_pairs = np.cumsum(num_pairs)
+    start = 0
+    while start < len(images):
+        # images [start, end) hold at most max_pairs pairs, or a single image
+        end = np.searchsorted(cumulative_pairs, cumulative_pairs[start] - num_pairs[start] + max_pairs, side='right')
+        chunk = images[start:max(end, start + 1)]
+        start += len(chunk)
+
+        # one row per prediction of the chunk, then one pair per ground truth of its image
+        pred_image = np.repeat(chunk, num_preds[chunk])
+        preds = _ranges(pred_starts[chunk], num_preds[chunk])
+        pair_pred = np.repeat(np.arange(len(preds)), num_golds[pred_image])
+        pair_first = np.cumsum(num_golds[pred_image]) - num_golds[pred_image]
+        golds = _ranges(gold_starts[pred_image], num_golds[pred_image])
+        ious = paired_intersection_over_union(pred_xyxy[preds[pair_pred]], gold_xyxy[golds])
+
+        # first ground truth with the maximum IOU
+        max_ious = np.maximum.reduceat(ious, pair_first)
+        maximal = np.flatnonzero(ious == max_ious[pair_pred])
+        _, first = np.unique(pair_pred[maximal], return_index=True)
+        best = golds[maximal[first]]
+        best[max_ious <= sys.float_info.min] = -1
+
+        rows = _ranges(first_pred[chunk], num_preds[chunk])
+        best_gt[rows] = best
+        best_iou[rows] = max_ious
+    return best_gt, best_iou
+
+
+def match_image_spatial(pred_xyxy: np.ndarray, gold_xyxy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    `match_image` that only computes the IOU of the overlapping pairs found by a `SortAndSweepIndex` of the ground
+    truths. Faster on crowded images, where most pairs do not overlap.
+    """
+    best_gt = np.full(len(pred_xyxy), -1, dtype=np.intp)
+    best_iou = np.zeros(len(pred_xyxy))
+    pair_pred, pair_gold = SortAndSweepIndex(gold_xyxy).query_pairs(pred_xyxy)
+    ious = paired_intersection_over_union(pred_xyxy[pair_pred], gold_xyxy[pair_gold])
+    valid = ious > sys.float_info.min
+    pair_pred, pair_gold, ious = pair_pred[valid], pair_gold[valid], ious[valid]
+    # first ground truth with the maximum IOU
+    order = np.lexsort((pair_gold, -ious, pair_pred))
+    _, first = np.unique(pair_pred[order], return_index=True)
+    best = order[first]
+    best_gt[pair_pred[best]] = pair_gold[best]
+    best_iou[pair_pred[best]] = ious[best]
+    return best_gt, best_iou
+
+
+def greedy_assign(best_gt: np.ndarray, best_iou: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Assign predictions, sorted by decreasing score, to their best ground truths.
+
+    Args:
+        best_gt: index of the best ground truth of each prediction (-1 if none). Indexes must be unique across
+            images.
+        best_iou: IOU with the best ground truth
+        iou_threshold: IOU threshold indicating which detections will be considered TP or FP
+
+    Returns:
+        tp flags (1 for true positive, 0 for false positive)
+    """
+    valid = np.flatnonzero((best_gt >= 0) & (best_iou >= iou_threshold))
+    # only the first (highest-scored) prediction that reaches a ground truth takes it
+    _, first = np.unique(best_gt[valid], return_index=True)
+    tps = np.zeros(len(best_gt))
+    tps[valid[first]] = 1
+    return tps
+
+
+class EvaluationIndex:
+    """
+    Boxes sorted once by (category, image, -score), giving contiguous slices per category and per image.
+
+    order: position of each sorted box in the input arrays
+    image: sorted image indexes
+    category: sorted category indexes
+    score: sorted scores (None for ground truths)
+    xyxy: sorted (N, 4) coordinates
+    categories: the distinct category indexes
+    """
+    def __init__(self, image: np.ndarray, category: np.ndarray, xyxy: np.ndarray, score: np.ndarray = None):
+        image = np.asarray(image, dtype=np.int64)
+        category = np.asarray(category, dtype=np.int64)
+        if score is None:
+            self.order = np.lexsort((image, category))
+        else:
+            score = np.asarray(score, dtype=float)
+            self.order = np.lexsort((-score, image, category))
+        self.image = image[self.order]
+        self.category = category[self.order]
+        self.score = None if score is None else score[self.order]
+        self.xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)[self.order]
+
+        # (category, image) groups
+        change = np.r_[True, (self.category[1:] != self.category[:-1]) | (self.image[1:] != self.image[:-1])]
+        self._group_starts = np.flatnonzero(change[:len(self.order)])
+        self._group_ends = np.r_[self._group_starts[1:], len(self.order)].astype(np.intp)
+        self._group_images = self.image[self._group_starts]
+        # categories, each one is a run of groups
+        self.categories, self._category_group_starts = np.unique(self.category[self._group_starts], return_index=True)
+        self._category_group_ends = np.r_[self._category_group_starts[1:], len(self._group_starts)].astype(np.intp)
+
+    def __len__(self):
+        return len(self.order)
+
+    def _category_position(self, category: int) -> int:
+        i = np.searchsorted(self.categories, category)
+        if i < len(self.categories) and self.categories[i] == category:
+            return int(i)
+        return -1
+
+    def category_slice(self, category: int) -> slice:
+        """
+        Returns:
+            the slice of the sorted arrays that holds the boxes of the category
+        """
+        i = self._category_position(category)
+        if i < 0:
+            return slice(0, 0)
+        return slice(self._group_starts[self._category_group_starts[i]],
+                     self._group_ends[self._category_group_ends[i] - 1])
+
+    def image_slices(self, category: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns:
+            the sorted images of the category, with the start and the end of their boxes in the sorted arrays
+        """
+        i = self._category_position(category)
+        if i < 0:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty, empty
+        groups = slice(self._category_group_starts[i], self._category_group_ends[i])
+        return self._group_images[groups], self._group_starts[groups], self._group_ends[groups]
+
+    def group_slices(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            the start and the end in the sorted arrays of the boxes of every (category, image) group
+        """
+        return self._group_starts, self._group_ends
+
+    def score_order(self, category: int) -> np.ndarray:
+        """
+        Returns:
+            positions in the input arrays of the boxes of the category, sorted by decreasing score. Boxes with the
+            same score keep their input order.
+        """
+        sl = self.category_slice(category)
+        return self.order[sl][self._score_permutation(sl)]
+
+    def _score_permutation(self, sl: slice) -> np.ndarray:
+        """
+        Returns:
+            the permutation that sorts the boxes of the slice by decreasing score, then by input order
+        """
+        order = self.order[sl]
+        if self.score is None:
+            return np.argsort(order)
+        return np.lexsort((order, -self.score[sl]))
+
+
+def match_category(gold: EvaluationIndex, pred: EvaluationIndex, category: int) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Find the best ground truth of every prediction of one category, vectorized over the images. The best ground truth
+    does not depend on the scores, so it can be found before the predictions are sorted.
+
+    Returns:
+        positions in the pred input arrays of the detections, sorted by decreasing confidence
+        position of their best ground truth in the gold input arrays (-1 if none)
+        IOU with the best ground truth
+        number of ground truths
+    """
+    sl = pred.category_slice(category)
+    best_gt = np.full(sl.stop - sl.start, -1, dtype=np.intp)
+    best_iou = np.zeros(sl.stop - sl.start)
+
+    gold_images, gold_starts, gold_ends = gold.image_slices(category)
+    pred_images, pred_starts, pred_ends = pred.image_slices(category)
+    # images that have both predictions and ground truths
+    _, gi, pi = np.intersect1d(gold_images, pred_images, assume_unique=True, return_indices=True)
+    best, ious = match_images(pred.xyxy, pred_starts[pi], pred_ends[pi], gold.xyxy, gold_starts[gi], gold_ends[gi])
+    rows = _ranges(pred_starts[pi] - sl.start, pred_ends[pi] - pred_starts[pi])
+    best_gt[rows] = np.where(best >= 0, gold.order[np.maximum(best, 0)], -1)
+    best_iou[rows] = ious
+
+    # detections sorted by decreasing confidence
+    sorted_preds = pred._score_permutation(sl)
+    gold_sl = gold.category_slice(category)
+    return pred.order[sl][sorted_preds], best_gt[sorted_preds], best_iou[sorted_preds], gold_sl.stop - gold_sl.start
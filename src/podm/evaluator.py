@@ -0,0 +1,188 @@
+import json
+from typing import List, Dict, Any
+
+import numpy as np
+
+from podm.box import BBFormat
+from podm.columnar import match_category, greedy_assign
+from podm.metrics import BoundingBox, MetricPerClass, MethodAveragePrecision, get_bounding_box_columns, \
+    get_metric_per_class, _get_indexes
+
+
+class StreamingEvaluator:
+    """
+    Incremental PASCAL VOC evaluation, e.g., for online validation during training.
+
+    Each call to `update` matches its images right away. Only the score and the tp flag of every detection, and the
+    number of ground truths, are kept per category. `compute` gives the same results as `get_pascal_voc_metrics` on
+    all the boxes seen so far, in the order they were given.
+
+    All the boxes of an image must be given in the same call to `update`.
+
+    Evaluators are also partial results for distributed evaluation: each shard evaluates its own images, saves its
+    evaluator with `save`, and a reducer combines them with `load` and `merge`. Because images are disjoint across
+    shards, the merged results are the ones of a single evaluator that saw the shards one after another.
+    """
+    def __init__(self, iou_threshold: float = 0.5,
+                 method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation):
+        self.iou_threshold = iou_threshold
+        self.method = method
+        self._scores = {}  # type: Dict[Any, List[np.ndarray]]
+        self._tps = {}  # type: Dict[Any, List[np.ndarray]]
+        self._num_groundtruth = {}  # type: Dict[Any, int]
+
+    @property
+    def labels(self) -> List[Any]:
+        return sorted(self._num_groundtruth)
+
+    def update(self, image_predictions: List[BoundingBox], image_groundtruths: List[BoundingBox]):
+        """
+        Match the detections of a batch of images and accumulate them.
+
+        Args:
+            image_predictions: detected bounding boxes of the images
+            image_groundtruths: ground truth bounding boxes of the images
+        """
+        category_index = {}
+        image_index = {}
+        gold_image, gold_category, _, gold_xyxy = \
+            get_bounding_box_columns(image_groundtruths, image_index, category_index)
+        pred_image, pred_category, pred_score, pred_xyxy = \
+            get_bounding_box_columns(image_predictions, image_index, category_index)
+        self.update_array(gold_image, gold_category, gold_xyxy, pred_image, pred_category, pred_score, pred_xyxy,
+                          list(category_index))
+
+    def update_array(self, gold_image: np.ndarray, gold_category: np.ndarray, gold_xyxy: np.ndarray,
+                     pred_image: np.ndarray, pred_category: np.ndarray, pred_score: np.ndarray,
+                     pred_xyxy: np.ndarray, category_labels: List[Any] = None,
+                     bbox_format: BBFormat = BBFormat.X1Y1X2Y2, image_width: np.ndarray = None,
+                     image_height: np.ndarray = None):
+        """
+        Match the detections of a batch of images stored as arrays and accumulate them.
+        See `get_pascal_voc_metrics_array` for the arguments.
+        """
+        pred_score = np.asarray(pred_score, dtype=float)
+        gold_index, pred_index = _get_indexes(gold_image, gold_category, gold_xyxy,
+                                              pred_image, pred_category, pred_score, pred_xyxy,
+                                              bbox_format, image_width, image_height)
+        for category in np.union1d(gold_index.categories, pred_index.categories):
+            label = category if category_labels is None else category_labels[category]
+            preds, best_gt, best_iou, npos = match_category(gold_index, pred_index, category)
+            tps = greedy_assign(best_gt, best_iou, self.iou_threshold)
+            self._add(label, [pred_score[preds]], [tps.astype(bool)], npos)
+
+    def _add(self, label, scores: List[np.ndarray], tps: List[np.ndarray], npos: int):
+        self._scores.setdefault(label, []).extend(scores)
+        self._tps.setdefault(label, []).extend(tps)
+        self._num_groundtruth[label] = self._num_groundtruth.get(label, 0) + npos
+
+    def _get_sorted(self, label):
+        """
+        Returns:
+            scores and tp flags of the category, sorted by decreasing score. The arrays are compacted in place.
+        """
+        scores = np.concatenate(self._scores[label])
+        tps = np.concatenate(self._tps[label])
+        order = np.argsort(-scores, kind='stable')
+        scores, tps = scores[order], tps[order]
+        self._scores[label] = [scores]
+        self._tps[label] = [tps]
+        return scores, tps
+
+    def compute(self) -> Dict[Any, MetricPerClass]:
+        """
+        Returns:
+            A dictionary containing metrics of each class.
+        """
+        ret = {}
+        for label in self.labels:
+            _, tps = self._get_sorted(label)
+            tps = tps.astype(float)
+            ret[label] = get_metric_per_class(label, tps, 1 - tps, self._num_groundtruth[label], self.method)
+        return ret
+
+    def merge(self, other: 'StreamingEvaluator') -> 'StreamingEvaluator':
+        """
+        Combine two evaluators of disjoint images. Merging is associative.
+
+        Returns:
+            a new evaluator with the detections of self, then the ones of other
+        """
+        if self.iou_threshold != other.iou_threshold or self.method != other.method:
+            raise ValueError('Cannot merge evaluators with different settings: %s %s vs %s %s'
+                             % (self.iou_threshold, self.method, other.iou_threshold, other.method))
+        merged = StreamingEvaluator(self.iou_threshold, self.method)
+        for evaluator in (self, other):
+            for label in evaluator._num_groundtruth:
+                merged._add(label, evaluator._scores[label], evaluator._tps[label], evaluator._num_groundtruth[label])
+        return merged
+
+    def save(self, file):
+        """
+        Save the accumulated detections to a compressed NumPy .npz file. Category labels must be strings, numbers,
+        booleans, None or tuples of them.
+
+        Args:
+            file: file name or file-like object
+        Raises:
+            TypeError: if a label cannot be saved
+        """
+        labels = self.labels
+        sorted_arrays = [self._get_sorted(label) for label in labels]
+        meta = {
+            'iou_threshold': self.iou_threshold,
+            'method': self.method.name,
+            'labels': [_encode_label(label) for label in labels],
+        }
+        np.savez_compressed(file,
+                            meta=np.array(json.dumps(meta)),
+                            scores=np.concatenate([scores for scores, _ in sorted_arrays] + [np.zeros(0)]),
+                            tps=np.concatenate([tps for _, tps in sorted_arrays] + [np.zeros(0, dtype=bool)]),
+                            num_detection=np.array([len(scores) for scores, _ in sorted_arrays], dtype=np.int64),
+                            num_groundtruth=np.array([self._num_groundtruth[label] for label in labels],
+                                                     dtype=np.int64))
+
+    @classmethod
+    def load(cls, file) -> 'StreamingEvaluator':
+        """
+        Load an evaluator saved by `save`.
+
+        Args:
+            file: file name or file-like object
+        """
+        with np.load(file, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            evaluator = StreamingEvaluator(meta['iou_threshold'], MethodAveragePrecision[meta['method']])
+            ends = np.cumsum(data['num_detection'])
+            starts = ends - data['num_detection']
+            scores = data['scores']
+            tps = data['tps']
+            for label, start, end, npos in zip(meta['labels'], starts, ends, data['num_groundtruth']):
+                evaluator._add(_decode_label(label), [scores[start:end]], [tps[start:end]], int(npos))
+        return evaluator
+
+    def reset(self):
+        self._scores.clear()
+        self._tps.clear()
+        self._num_groundtruth.clear()
+
+
+def _encode_label(label):
+    """
+    Returns:
+        the label as JSON, tuples become lists
+    """
+    if isinstance(label, np.generic):
+        label = label.item()
+    if isinstance(label, tuple):
+        return [_encode_label(item) for item in label]
+    if label is None or isinstance(label, (str, int, float)):
+        return label
+    raise TypeError('%r: Cannot save a label of type %s' % (label, type(label).__name__))
+
+
+def _decode_label(label):
+    # lists cannot be labels, they were tuples
+    if isinstance(label, list):
+        return tuple(_decode_label(item) for item in label)
+    return label
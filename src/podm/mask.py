@@ -0,0 +1,250 @@
+"""
+Run-length encoded (RLE) masks, in pure NumPy.
+
+A mask of an h x w image is flattened in column-major order, as in COCO, and stored as the sorted, disjoint
+[start, end) intervals of its foreground pixels. `polygon_to_rle` and `string_to_counts` follow pycocotools, so that
+masks and IOUs are the same as the ones of the COCO API.
+"""
+from typing import List, Tuple, Dict, Union
+
+import numpy as np
+
+# maximum number of (interval, ground truth) values held at once
+MAX_ELEMENTS = 1 << 22
+
+
+class RLE:
+    """
+    height, width: size of the image
+    starts, ends: (K,) sorted [start, end) intervals of the foreground pixels, in column-major order
+    """
+    def __init__(self, height: int, width: int, starts: np.ndarray = None, ends: np.ndarray = None):
+        self.height = height
+        self.width = width
+        self.starts = np.zeros(0, dtype=np.int64) if starts is None else np.asarray(starts, dtype=np.int64)
+        self.ends = np.zeros(0, dtype=np.int64) if ends is None else np.asarray(ends, dtype=np.int64)
+
+    @classmethod
+    def of_counts(cls, counts: np.ndarray, height: int, width: int) -> 'RLE':
+        """
+        Args:
+            counts: COCO run lengths, alternating background and foreground runs, starting with background
+        """
+        boundaries = np.cumsum(np.asarray(counts, dtype=np.int64))
+        # foreground runs are the odd ones
+        starts = boundaries[0::2][:len(boundaries) // 2]
+        ends = boundaries[1::2]
+        nonempty = ends > starts
+        return RLE(height, width, starts[nonempty], ends[nonempty])
+
+    @property
+    def counts(self) -> np.ndarray:
+        """
+        COCO run lengths, alternating background and foreground runs, starting with background.
+        """
+        boundaries = np.stack((self.starts, self.ends), axis=1).reshape(-1)
+        counts = np.diff(np.r_[0, boundaries, self.height * self.width])
+        if len(counts) > 1 and counts[-1] == 0:
+            counts = counts[:-1]
+        return counts
+
+    @property
+    def area(self) -> int:
+        return int(np.sum(self.ends - self.starts))
+
+    @property
+    def bbox(self) -> Tuple[int, int, int, int] or None:
+        """
+        xtl, ytl, xbr, ybr of the foreground pixels, None if the mask is empty.
+        """
+        if len(self.starts) == 0:
+            return None
+        first_columns = self.starts // self.height
+        last_columns = (self.ends - 1) // self.height
+        if np.any(first_columns != last_columns):
+            # a run that crosses columns covers the last row of a column and the first row of the next one
+            ytl, ybr = 0, self.height
+        else:
+            ytl = int(np.min(self.starts % self.height))
+            ybr = int(np.max((self.ends - 1) % self.height)) + 1
+        return int(first_columns[0]), ytl, int(last_columns[-1]) + 1, ybr
+
+    def to_mask(self) -> np.ndarray:
+        """
+        Returns:
+            (h, w) boolean mask
+        """
+        flat = np.zeros(self.height * self.width + 1, dtype=np.int8)
+        np.add.at(flat, self.starts, 1)
+        np.add.at(flat, self.ends, -1)
+        return np.cumsum(flat[:-1]).astype(bool).reshape(self.width, self.height).T
+
+    def __eq__(self, other):
+        if not isinstance(other, RLE):
+            return False
+        return self.height == other.height and self.width == other.width \
+            and np.array_equal(self.starts, other.starts) and np.array_equal(self.ends, other.ends)
+
+
+def merge(rles: List[RLE], height: int, width: int) -> RLE:
+    """
+    Returns:
+        the union of the masks
+    """
+    if len(rles) == 1:
+        return rles[0]
+    starts = np.concatenate([r.starts for r in rles] + [np.zeros(0, dtype=np.int64)])
+    ends = np.concatenate([r.ends for r in rles] + [np.zeros(0, dtype=np.int64)])
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    # an interval starts a new run if it begins after all the previous intervals end
+    previous_ends = np.maximum.accumulate(ends)
+    new = np.r_[True, starts[1:] > previous_ends[:-1]][:len(starts)]
+    run_starts = np.flatnonzero(new)
+    return RLE(height, width, starts[run_starts], np.maximum.reduceat(ends, run_starts) if len(run_starts) else ends)
+
+
+def polygon_to_rle(polygon: List[float], height: int, width: int) -> RLE:
+    """
+    Rasterize a polygon [x1, y1, x2, y2, ...] as pycocotools does: the boundary is traced at 5x resolution, and the
+    pixels whose center is inside are set.
+    """
+    scale = 5
+    xy = np.asarray(polygon, dtype=float).reshape(-1, 2)
+    if len(xy) == 0:
+        return RLE(height, width)
+    # C casts truncate toward zero
+    x = np.trunc(scale * xy[:, 0] + .5).astype(np.int64)
+    y = np.trunc(scale * xy[:, 1] + .5).astype(np.int64)
+    x = np.r_[x, x[0]]
+    y = np.r_[y, y[0]]
+
+    # points densely along every edge
+    xs, xe, ys, ye = x[:-1], x[1:], y[:-1], y[1:]
+    dx = np.abs(xe - xs)
+    dy = np.abs(ys - ye)
+    horizontal = dx >= dy
+    flip = (horizontal & (xs > xe)) | (~horizontal & (ys > ye))
+    xs, xe = np.where(flip, xe, xs), np.where(flip, xs, xe)
+    ys, ye = np.where(flip, ye, ys), np.where(flip, ys, ye)
+    steps = np.where(horizontal, dx, dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(horizontal, (ye - ys) / np.maximum(dx, 1), (xe - xs) / np.maximum(dy, 1))
+    num_points = steps + 1
+    edge = np.repeat(np.arange(len(steps)), num_points)
+    d = np.arange(num_points.sum()) - np.repeat(np.cumsum(num_points) - num_points, num_points)
+    t = np.where(flip[edge], steps[edge] - d, d)
+    u = np.where(horizontal[edge], t + xs[edge], np.trunc(xs[edge] + slope[edge] * t + .5)).astype(np.int64)
+    v = np.where(horizontal[edge], np.trunc(ys[edge] + slope[edge] * t + .5), t + ys[edge]).astype(np.int64)
+
+    # points along the y-boundary, downsampled
+    changed = np.flatnonzero(u[1:] != u[:-1]) + 1
+    uj, uk, vj, vk = u[changed], u[changed - 1], v[changed], v[changed - 1]
+    xd = (np.where(uj < uk, uj, uj - 1) + .5) / scale - .5
+    keep = (np.floor(xd) == xd) & (xd >= 0) & (xd <= width - 1)
+    yd = (np.where(vj < vk, vj, vk) + .5) / scale - .5
+    yd = np.ceil(np.clip(yd, 0, height))
+    positions = np.sort(xd[keep].astype(np.int64) * height + yd[keep].astype(np.int64))
+
+    # every position toggles the mask, positions that appear an even number of times cancel out
+    values, multiplicity = np.unique(positions, return_counts=True)
+    toggles = values[multiplicity % 2 == 1]
+    toggles = toggles[toggles < height * width]
+    return RLE(height, width, toggles[0::2], np.r_[toggles[1::2], height * width][:(len(toggles) + 1) // 2])
+
+
+def string_to_counts(s: str) -> np.ndarray:
+    """
+    Decode the compressed counts of a COCO RLE.
+    """
+    counts = []
+    p = 0
+    while p < len(s):
+        x = 0
+        k = 0
+        more = True
+        while more:
+            c = ord(s[p]) - 48
+            x |= (c & 0x1f) << 5 * k
+            more = c & 0x20
+            p += 1
+            k += 1
+            if not more and (c & 0x10):
+                x |= -1 << 5 * k
+        if len(counts) > 2:
+            x += counts[-2]
+        counts.append(x)
+    return np.array(counts, dtype=np.int64)
+
+
+def segmentation_to_rle(segmentation: Union[List[List[float]], Dict], height: int, width: int) -> RLE:
+    """
+    Args:
+        segmentation: polygons, or a COCO RLE dict with compressed or uncompressed counts
+    """
+    if isinstance(segmentation, dict):
+        height, width = segmentation['size']
+        counts = segmentation['counts']
+        if isinstance(counts, (str, bytes)):
+            counts = string_to_counts(counts.decode('ascii') if isinstance(counts, bytes) else counts)
+        return RLE.of_counts(counts, height, width)
+    return merge([polygon_to_rle(polygon, height, width) for polygon in segmentation], height, width)
+
+
+def pairwise_iou(dts: List[RLE], gts: List[RLE], iscrowd: np.ndarray = None) -> np.ndarray:
+    """
+    IOU between every pair of masks of the same image. For crowd ground truths, the union is the area of the
+    detection, as in pycocotools.
+
+    Returns:
+        (N, M) IOU matrix
+    """
+    intersection = pairwise_intersection(dts, gts)
+    dt_areas = np.array([r.area for r in dts], dtype=float)
+    gt_areas = np.array([r.area for r in gts], dtype=float)
+    union = dt_areas[:, None] + gt_areas[None, :] - intersection
+    if iscrowd is not None:
+        union = np.where(np.asarray(iscrowd, dtype=bool)[None, :], dt_areas[:, None], union)
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=intersection > 0)
+
+
+def pairwise_intersection(dts: List[RLE], gts: List[RLE]) -> np.ndarray:
+    """
+    Intersection areas of every pair of masks of the same image.
+
+    The masks of the ground truths are laid one after another, each shifted by the image size, so that the number of
+    foreground pixels before any position of any mask is one binary search in the concatenated intervals. The
+    intersection of a detection interval [s, e) with a ground truth is then the difference of this count at e and s.
+
+    Returns:
+        (N, M) intersection areas
+    """
+    intersection = np.zeros((len(dts), len(gts)))
+    if len(dts) == 0 or len(gts) == 0:
+        return intersection
+    size = gts[0].height * gts[0].width
+    offsets = np.arange(len(gts), dtype=np.int64) * size
+    gt_starts = np.concatenate([r.starts + o for r, o in zip(gts, offsets)])
+    gt_ends = np.concatenate([r.ends + o for r, o in zip(gts, offsets)])
+    if len(gt_starts) == 0:
+        return intersection
+    before = np.r_[0, np.cumsum(gt_ends - gt_starts)]
+
+    def coverage(x: np.ndarray) -> np.ndarray:
+        # foreground pixels before x
+        k = np.searchsorted(gt_starts, x, side='left')
+        last = np.maximum(k - 1, 0)
+        partial = np.where(k > 0, np.minimum(x, gt_ends[last]) - gt_starts[last], 0)
+        return before[last] * (k > 0) + partial
+
+    dt_starts = np.concatenate([r.starts for r in dts])
+    dt_ends = np.concatenate([r.ends for r in dts])
+    dt_bounds = np.r_[0, np.cumsum([len(r.starts) for r in dts])]
+    block = max(1, MAX_ELEMENTS // max(1, len(dt_starts)))
+    for start in range(0, len(gts), block):
+        columns = slice(start, start + block)
+        covered = coverage(dt_ends[:, None] + offsets[None, columns]) \
+            - coverage(dt_starts[:, None] + offsets[None, columns])
+        cumulative = np.concatenate((np.zeros((1, covered.shape[1])), np.cumsum(covered, axis=0)), axis=0)
+        intersection[:, columns] = cumulative[dt_bounds[1:]] - cumulative[dt_bounds[:-1]]
+    return intersection
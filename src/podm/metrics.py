@@ -1,12 +1,15 @@
+import os
 import sys
 from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Callable, Iterable
 
 import numpy as np
 
-from podm import box
-from podm.coco import PCOCOObjectDetectionDataset, PCOCOBoundingBox, PCOCOSegments
+from podm import box, mask
+from podm.columnar import EvaluationIndex, greedy_assign, match_category, SPATIAL_INDEX_MIN_BOXES
+from podm.coco import PCOCOObjectDetectionDataset, PCOCOBoundingBox, PCOCOSegments, PCOCOAnnotation, AnnotationStore
 
 
 class BoundingBox(box.Box):
@@ -19,6 +22,8 @@ class BoundingBox(box.Box):
     ybr: the Y bottom-right coordinate of the bounding box.
     score: (optional) the confidence of the detected class.
     """
+    __slots__ = ('image', 'category', 'score')
+
     def __init__(self):
         super(BoundingBox, self).__init__()
         self.image = None
@@ -45,8 +50,8 @@ def get_bounding_boxes(dataset: PCOCOObjectDetectionDataset, use_name: bool = Tr
         if isinstance(ann, PCOCOBoundingBox):
             bb = BoundingBox.of_bbox(ann.image_id, ann.category_id, ann.xtl, ann.ytl, ann.xbr, ann.ybr, ann.score)
         elif isinstance(ann, PCOCOSegments):
-            bb = BoundingBox.of_bbox(ann.image_id, ann.category_id,
-                                     ann.bbox.xtl, ann.bbox.ytl, ann.bbox.xbr, ann.bbox.ybr, ann.score)
+            b = ann.bbox
+            bb = BoundingBox.of_bbox(ann.image_id, ann.category_id, b.xtl, b.ytl, b.xbr, b.ybr, ann.score)
         else:
             raise TypeError
         if use_name:
@@ -66,6 +71,8 @@ class MethodAveragePrecision(Enum):
     """
     AllPointsInterpolation = 1
     ElevenPointsInterpolation = 2
+    # COCO-style
+    HundredOnePointsInterpolation = 3
 
 
 class MetricPerClass:
@@ -89,7 +96,9 @@ class MetricPerClass:
 def get_pascal_voc_metrics(gold_standard: List[BoundingBox],
                            predictions: List[BoundingBox],
                            iou_threshold: float = 0.5,
-                           method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation
+                           method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation,
+                           columnar: bool = False,
+                           n_jobs: int = 1
                            ) -> Dict[str, MetricPerClass]:
     """Get the metrics used by the VOC Pascal 2012 challenge.
 
@@ -100,85 +109,592 @@ def get_pascal_voc_metrics(gold_standard: List[BoundingBox],
         method: It can be calculated as the implementation in the official PASCAL VOC toolkit (EveryPointInterpolation),
             or applying the 11-point interpolation as described in the paper "The PASCAL Visual Object Classes(VOC)
             Challenge" or AllPointsInterpolation" (ElevenPointInterpolation);
+        columnar: if True, convert the boxes to arrays and use the vectorized engine
+            (see `get_pascal_voc_metrics_array`). Both engines return the same results.
+        n_jobs: number of processes that evaluate the categories. None or -1 uses all CPUs (default value = 1);
     Returns:
         A dictionary containing metrics of each class.
     """
-    ret = {}  # list containing metrics (precision, recall, average precision) of each class
+    categories, (gold_image, gold_category, _, gold_xyxy), (pred_image, pred_category, pred_score, pred_xyxy) = \
+        _get_columns(gold_standard, predictions)
+    if columnar:
+        return get_pascal_voc_metrics_array(gold_image, gold_category, gold_xyxy,
+                                            pred_image, pred_category, pred_score, pred_xyxy,
+                                            iou_threshold, method, categories, n_jobs)
 
-    # Get all classes
-    categories = sorted(set(b.category for b in gold_standard + predictions))
+    # Group the boxes by class once
+    gold_index = EvaluationIndex(gold_image, gold_category, gold_xyxy)
+    pred_index = EvaluationIndex(pred_image, pred_category, pred_xyxy, pred_score)
 
     # Precision x Recall is obtained individually by each class
-    # Loop through by classes
-    for category in categories:
-        preds = [b for b in predictions if b.category == category]  # type: List[BoundingBox]
-        golds = [b for b in gold_standard if b.category == category]  # type: List[BoundingBox]
-        npos = len(golds)
-
-        # sort detections by decreasing confidence
-        preds = sorted(preds, key=lambda b: b.score, reverse=True)
-        tps = np.zeros(len(preds))
-        fps = np.zeros(len(preds))
-
-        # create dictionary with amount of gts for each image
-        counter = Counter([cc.image for cc in golds])
-        for key, val in counter.items():
-            counter[key] = np.zeros(val)
-
-        # Pre-processing groundtruths of the some image
-        image_name2gt = defaultdict(list)
-        for b in golds:
-            image_name2gt[b.image].append(b)
-
-        # Loop through detections
-        for i in range(len(preds)):
-            # Find ground truth image
-            gt = image_name2gt[preds[i].image]
-            max_iou = sys.float_info.min
-            mas_idx = -1
-            for j in range(len(gt)):
-                iou = box.intersection_over_union(preds[i], gt[j])
-                if iou > max_iou:
-                    max_iou = iou
-                    mas_idx = j
-            # Assign detection as true positive/don't care/false positive
-            if max_iou >= iou_threshold:
-                if counter[preds[i].image][mas_idx] == 0:
-                    tps[i] = 1  # count as true positive
-                    counter[preds[i].image][mas_idx] = 1  # flag as already 'seen'
-                else:
-                    # - A detected "cat" is overlaped with a GT "cat" with IOU >= IOUThreshold.
-                    fps[i] = 1  # count as false positive
+    context = (gold_standard, predictions, gold_index, pred_index, categories, iou_threshold, method)
+    results = _map_chunks(_get_object_metric, context, range(len(categories)),
+                          _get_category_sizes(gold_index, pred_index, range(len(categories))), n_jobs)
+    return {r.label: r for r in results}
+
+
+def _get_object_metric(context: Tuple, c: int) -> MetricPerClass:
+    gold_standard, predictions, gold_index, pred_index, categories, iou_threshold, method = context
+    category = categories[c]
+    # detections sorted by decreasing confidence
+    preds = [predictions[j] for j in pred_index.score_order(c)]  # type: List[BoundingBox]
+    golds = [gold_standard[j] for j in gold_index.order[gold_index.category_slice(c)]]  # type: List[BoundingBox]
+    npos = len(golds)
+
+    tps = np.zeros(len(preds))
+    fps = np.zeros(len(preds))
+
+    # create dictionary with amount of gts for each image
+    counter = Counter([cc.image for cc in golds])
+    for key, val in counter.items():
+        counter[key] = np.zeros(val)
+
+    # Pre-processing groundtruths of the some image
+    image_name2gt = defaultdict(list)
+    for b in golds:
+        image_name2gt[b.image].append(b)
+    # in crowded images, only the ground truths that overlap a detection can have an IOU above 0. They are found
+    # for all the detections of the image at once with a spatial index.
+    image_name2dets = defaultdict(list)
+    for j, b in enumerate(preds):
+        image_name2dets[b.image].append(j)
+    det2candidates = {}
+    for image, dets in image_name2dets.items():
+        gt = image_name2gt.get(image, [])
+        if len(gt) >= SPATIAL_INDEX_MIN_BOXES:
+            index = box.SortAndSweepIndex(box.BoxArray.of_boxes(gt).xyxy)
+            queries, candidates = index.query_pairs(box.BoxArray.of_boxes([preds[j] for j in dets]).xyxy)
+            splits = np.split(candidates, np.searchsorted(queries, np.arange(1, len(dets))))
+            det2candidates.update(zip(dets, (c.tolist() for c in splits)))
+
+    # Loop through detections
+    for i in range(len(preds)):
+        # Find ground truth image
+        gt = image_name2gt[preds[i].image]
+        max_iou = sys.float_info.min
+        mas_idx = -1
+        for j in det2candidates.get(i, range(len(gt))):
+            iou = box.intersection_over_union(preds[i], gt[j])
+            if iou > max_iou:
+                max_iou = iou
+                mas_idx = j
+        # Assign detection as true positive/don't care/false positive
+        if max_iou >= iou_threshold:
+            if counter[preds[i].image][mas_idx] == 0:
+                tps[i] = 1  # count as true positive
+                counter[preds[i].image][mas_idx] = 1  # flag as already 'seen'
             else:
+                # - A detected "cat" is overlaped with a GT "cat" with IOU >= IOUThreshold.
                 fps[i] = 1  # count as false positive
-        # compute precision, recall and average precision
-        cumulative_fps = np.cumsum(fps)
-        cumulative_tps = np.cumsum(tps)
-        recalls = np.divide(cumulative_tps, npos, out=np.full_like(cumulative_tps, np.nan), where=npos != 0)
-        precisions = np.divide(cumulative_tps, (cumulative_fps + cumulative_tps))
-        # Depending on the method, call the right implementation
-        if method == MethodAveragePrecision.AllPointsInterpolation:
-            ap, mrec, mpre, _ = calculate_all_points_average_precision(recalls, precisions)
         else:
-            ap, mrec, mpre = calculate_11_points_average_precision(recalls, precisions)
-        # add class result in the dictionary to be returned
-        r = MetricPerClass()
-        r.label = category
-        r.precision = precisions
-        r.recall = recalls
-        r.ap = ap
-        r.interpolated_recall = np.array(mrec)
-        r.interpolated_precision = np.array(mpre)
-        r.tp = np.sum(tps)
-        r.fp = np.sum(fps)
-        r.num_groundtruth = len(golds)
-        r.num_detection = len(preds)
-        ret[category] = r
+            fps[i] = 1  # count as false positive
+    return get_metric_per_class(category, tps, fps, npos, method)
+
+
+def _get_category_sizes(gold_index: EvaluationIndex, pred_index: EvaluationIndex, categories: Iterable[int]) \
+        -> List[int]:
+    sizes = []
+    for category in categories:
+        gold_sl = gold_index.category_slice(category)
+        pred_sl = pred_index.category_slice(category)
+        sizes.append(gold_sl.stop - gold_sl.start + pred_sl.stop - pred_sl.start)
+    return sizes
+
+
+# state of a worker process, set once by the pool initializer
+_worker_function = None
+_worker_context = None
+
+
+def _init_worker(function: Callable, context: Tuple):
+    global _worker_function, _worker_context
+    _worker_function = function
+    _worker_context = context
+
+
+def _run_worker(item):
+    return _worker_function(_worker_context, item)
+
+
+def _map_chunks(function: Callable, context: Tuple, items: Iterable, sizes: List[int], n_jobs: int = 1) -> List:
+    """
+    Apply function(context, item) to every item, e.g., to every category or to every chunk of resamples.
+
+    If n_jobs is not 1, the items are sent to a process pool, largest first so that the slowest ones start early.
+    The context is sent once to each worker, only the items are sent with the tasks.
+
+    Args:
+        sizes: the amount of work of every item
+    Returns:
+        the results, in the order of the items
+    """
+    items = list(items)
+    if n_jobs is None or n_jobs < 0:
+        n_jobs = os.cpu_count()
+    if n_jobs == 1 or len(items) <= 1:
+        return [function(context, item) for item in items]
+
+    order = np.argsort(-np.asarray(sizes), kind='stable')
+    with ProcessPoolExecutor(max_workers=min(n_jobs, len(items)), initializer=_init_worker,
+                             initargs=(function, context)) as executor:
+        futures = {i: executor.submit(_run_worker, items[i]) for i in order}
+        return [futures[i].result() for i in range(len(items))]
+
+
+def _get_columns(gold_standard: List[BoundingBox], predictions: List[BoundingBox]) \
+        -> Tuple[List[Any], Tuple[np.ndarray, ...], Tuple[np.ndarray, ...]]:
+    """
+    Returns:
+        the sorted categories, the columns of the ground truths and the columns of the predictions
+    """
+    # Get all classes
+    categories = sorted(set(b.category for b in gold_standard + predictions))
+    category_index = {c: i for i, c in enumerate(categories)}
+    image_index = {}
+    return categories, \
+        get_bounding_box_columns(gold_standard, image_index, category_index), \
+        get_bounding_box_columns(predictions, image_index, category_index)
+
+
+def get_bounding_box_columns(bboxes: List[BoundingBox], image_index: Dict[Any, int], category_index: Dict[Any, int]) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convert bounding boxes to columns.
+
+    Args:
+        bboxes: bounding boxes
+        image_index: maps an image to its index. Unknown images are added to it.
+        category_index: maps a category to its index. Unknown categories are added to it.
+
+    Returns:
+        image indexes, category indexes, scores (nan if missing), (N, 4) xyxy coordinates
+    """
+    n = len(bboxes)
+    images = np.fromiter((image_index.setdefault(b.image, len(image_index)) for b in bboxes), dtype=np.int64, count=n)
+    categories = np.fromiter((category_index.setdefault(b.category, len(category_index)) for b in bboxes),
+                             dtype=np.int64, count=n)
+    scores = np.fromiter((np.nan if b.score is None else b.score for b in bboxes), dtype=float, count=n)
+    return images, categories, scores, box.BoxArray.of_boxes(bboxes).xyxy
+
+
+def get_pascal_voc_metrics_array(gold_image: np.ndarray,
+                                 gold_category: np.ndarray,
+                                 gold_xyxy: np.ndarray,
+                                 pred_image: np.ndarray,
+                                 pred_category: np.ndarray,
+                                 pred_score: np.ndarray,
+                                 pred_xyxy: np.ndarray,
+                                 iou_threshold: float = 0.5,
+                                 method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation,
+                                 category_labels: List[Any] = None,
+                                 n_jobs: int = 1,
+                                 bbox_format: box.BBFormat = box.BBFormat.X1Y1X2Y2,
+                                 image_width: np.ndarray = None,
+                                 image_height: np.ndarray = None
+                                 ) -> Dict[Any, MetricPerClass]:
+    """Get the metrics used by the VOC Pascal 2012 challenge from boxes stored as arrays.
+
+    Each image and category gets one IOU matrix, and the score-ordered assignment is vectorized.
+
+    Args:
+        gold_image: (N,) image index of the ground truth boxes;
+        gold_category: (N,) category index of the ground truth boxes;
+        gold_xyxy: (N, 4) [xtl, ytl, xbr, ybr] of the ground truth boxes;
+        pred_image: (M,) image index of the detected boxes;
+        pred_category: (M,) category index of the detected boxes;
+        pred_score: (M,) confidence of the detected boxes;
+        pred_xyxy: (M, 4) [xtl, ytl, xbr, ybr] of the detected boxes;
+        iou_threshold: IOU threshold indicating which detections will be considered TP or FP (default value = 0.5);
+        method: AllPointsInterpolation, ElevenPointsInterpolation or HundredOnePointsInterpolation;
+        category_labels: labels of the category indexes. Default uses the indexes as labels.
+        n_jobs: number of processes that match the categories. None or -1 uses all CPUs (default value = 1);
+        bbox_format: format of gold_xyxy and pred_xyxy (default value = X1Y1X2Y2);
+        image_width: width of each image, indexed by image index. Required by normalized formats;
+        image_height: height of each image, indexed by image index. Required by normalized formats;
+    Returns:
+        A dictionary containing metrics of each class, keyed by category label.
+    """
+    gold_index, pred_index = _get_indexes(gold_image, gold_category, gold_xyxy,
+                                          pred_image, pred_category, pred_score, pred_xyxy,
+                                          bbox_format, image_width, image_height)
+    matches = _match(gold_index, pred_index, n_jobs)
+    return _assign(matches, iou_threshold, method, category_labels)
+
+
+def get_pascal_voc_metrics_dataset(gold_dataset: PCOCOObjectDetectionDataset,
+                                   pred_dataset: PCOCOObjectDetectionDataset,
+                                   iou_threshold: float = 0.5,
+                                   method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation,
+                                   use_name: bool = True,
+                                   n_jobs: int = 1
+                                   ) -> Dict[Any, MetricPerClass]:
+    """Get the metrics used by the VOC Pascal 2012 challenge from the annotations of datasets, with the vectorized
+    engine and without an object per box (see `get_annotation_columns`). The images are identified by their ids.
+
+    Args:
+        gold_dataset: ground truth annotations, with the categories;
+        pred_dataset: detected annotations;
+        iou_threshold: IOU threshold indicating which detections will be considered TP or FP (default value = 0.5);
+        method: AllPointsInterpolation, ElevenPointsInterpolation or HundredOnePointsInterpolation;
+        use_name: key the results by category name instead of category id (default value = True);
+        n_jobs: number of processes that match the categories. None or -1 uses all CPUs (default value = 1);
+    Returns:
+        A dictionary containing metrics of each class, sorted by label.
+    Raises:
+        KeyError: if use_name and a category of the annotations is not a category of the ground truth
+    """
+    gold_image, gold_category, _, gold_xyxy = get_annotation_columns(gold_dataset)
+    pred_image, pred_category, pred_score, pred_xyxy = get_annotation_columns(pred_dataset)
+    category_ids, category = np.unique(np.concatenate((gold_category, pred_category)), return_inverse=True)
+    labels = category_ids.tolist()
+    if use_name:
+        categories = [gold_dataset.get_category(id=id) for id in labels]
+        for id, cat in zip(labels, categories):
+            if cat is None:
+                raise KeyError('%s: Category is not in the ground truth' % id)
+        labels = [cat.name for cat in categories]
+    # number the categories in the order of their labels
+    order = sorted(range(len(labels)), key=labels.__getitem__)
+    rank = np.empty(len(labels), dtype=np.int64)
+    rank[order] = np.arange(len(labels))
+    category = rank[category.reshape(-1)]
+    return get_pascal_voc_metrics_array(gold_image, category[:len(gold_image)], gold_xyxy,
+                                        pred_image, category[len(gold_image):], pred_score, pred_xyxy,
+                                        iou_threshold, method, [labels[i] for i in order], n_jobs)
+
+
+def get_annotation_columns(dataset: PCOCOObjectDetectionDataset) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns:
+        image ids, category ids, scores (nan if missing) and (N, 4) xyxy coordinates of the annotations, the bboxes
+        of the segments. The columns of an `AnnotationStore` are returned without a copy.
+    """
+    anns = dataset.annotations
+    if isinstance(anns, AnnotationStore):
+        return anns.image_id, anns.category_id, anns.score, anns.xyxy
+    n = len(anns)
+    images = np.fromiter((ann.image_id for ann in anns), dtype=np.int64, count=n)
+    categories = np.fromiter((ann.category_id for ann in anns), dtype=np.int64, count=n)
+    scores = np.fromiter((np.nan if ann.score is None else ann.score for ann in anns), dtype=float, count=n)
+    xyxy = np.full((n, 4), np.nan)
+    for i, ann in enumerate(anns):
+        b = ann.bbox if isinstance(ann, PCOCOSegments) else ann
+        if b is not None:
+            xyxy[i] = b.xtl, b.ytl, b.xbr, b.ybr
+    return images, categories, scores, xyxy
+
+
+def _get_indexes(gold_image: np.ndarray, gold_category: np.ndarray, gold_xyxy: np.ndarray,
+                 pred_image: np.ndarray, pred_category: np.ndarray, pred_score: np.ndarray, pred_xyxy: np.ndarray,
+                 bbox_format: box.BBFormat = box.BBFormat.X1Y1X2Y2,
+                 image_width: np.ndarray = None, image_height: np.ndarray = None) \
+        -> Tuple[EvaluationIndex, EvaluationIndex]:
+    """
+    Returns:
+        indexes of the ground truths and of the predictions, with X1Y1X2Y2 coordinates
+    """
+    gold_image = np.asarray(gold_image, dtype=np.int64)
+    pred_image = np.asarray(pred_image, dtype=np.int64)
+    gold_xyxy = box.convert_boxes(gold_xyxy, bbox_format, image_width=image_width, image_height=image_height,
+                                  image=gold_image)
+    pred_xyxy = box.convert_boxes(pred_xyxy, bbox_format, image_width=image_width, image_height=image_height,
+                                  image=pred_image)
+    return EvaluationIndex(gold_image, gold_category, gold_xyxy), \
+        EvaluationIndex(pred_image, pred_category, pred_xyxy, pred_score)
+
+
+def _match(gold_index: EvaluationIndex, pred_index: EvaluationIndex, n_jobs: int = 1) \
+        -> List[Tuple[int, np.ndarray, np.ndarray, int]]:
+    """
+    Match the predictions once. The result can be assigned at any IOU threshold.
+
+    Returns:
+        for each category in gold or pred:
+            category index
+            best ground truth of the detections sorted by decreasing confidence
+            IOU with the best ground truth
+            number of ground truths
+    """
+    categories = np.union1d(gold_index.categories, pred_index.categories)
+    return _map_chunks(_match_category, (gold_index, pred_index), categories,
+                       _get_category_sizes(gold_index, pred_index, categories), n_jobs)
+
+
+def _match_category(context: Tuple, category: int) -> Tuple[int, np.ndarray, np.ndarray, int]:
+    gold_index, pred_index = context
+    _, best_gt, best_iou, npos = match_category(gold_index, pred_index, category)
+    return category, best_gt, best_iou, npos
+
+
+def _assign(matches: List[Tuple[int, np.ndarray, np.ndarray, int]], iou_threshold: float,
+            method: MethodAveragePrecision, category_labels: List[Any] = None) -> Dict[Any, MetricPerClass]:
+    ret = {}
+    for category, best_gt, best_iou, npos in matches:
+        label = category if category_labels is None else category_labels[category]
+        tps = greedy_assign(best_gt, best_iou, iou_threshold)
+        ret[label] = get_metric_per_class(label, tps, 1 - tps, npos, method)
     return ret
 
 
-def calculate_all_points_average_precision(recall: List[float], precision: List[float]) \
-        -> Tuple[float, List[float], List[float], List[int]]:
+class MetricSweep:
+    """
+    Metrics at several IOU thresholds.
+
+    iou_thresholds: (T,) IOU thresholds
+    labels: (C,) category labels
+    ap: (T, C) average precision of each category at each threshold
+    num_groundtruth: (C,) number of ground truths of each category
+    results: metrics of each class, one dictionary per threshold
+    """
+    def __init__(self):
+        self.iou_thresholds = None  # type: None or np.ndarray
+        self.labels = None  # type: None or List[Any]
+        self.ap = None  # type: None or np.ndarray
+        self.num_groundtruth = None  # type: None or np.ndarray
+        self.results = None  # type: None or List[Dict[Any, MetricPerClass]]
+
+    @property
+    def mAP_per_threshold(self) -> np.ndarray:
+        """
+        mAP at each threshold, averaged over the categories that have ground truths
+        """
+        return np.average(self.ap[:, self.num_groundtruth > 0], axis=1)
+
+    @property
+    def mAP(self) -> float:
+        """
+        mAP averaged over the thresholds, e.g., COCO-style mAP@[.5:.95]
+        """
+        return float(np.average(self.mAP_per_threshold))
+
+
+COCO_IOU_THRESHOLDS = np.linspace(.5, .95, 10)
+
+
+def get_pascal_voc_metrics_sweep(gold_standard: List[BoundingBox],
+                                 predictions: List[BoundingBox],
+                                 iou_thresholds: List[float] = COCO_IOU_THRESHOLDS,
+                                 method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation,
+                                 n_jobs: int = 1
+                                 ) -> MetricSweep:
+    """Get the metrics used by the VOC Pascal 2012 challenge at several IOU thresholds.
+
+    The IOUs and the score ordering are computed once. Only the assignment runs for each threshold.
+
+    Args:
+        gold_standard: ground truth bounding boxes;
+        predictions: detected bounding boxes;
+        iou_thresholds: IOU thresholds (default value = .5, .55, ..., .95);
+        method: AllPointsInterpolation, ElevenPointsInterpolation or HundredOnePointsInterpolation;
+        n_jobs: number of processes that match the categories. None or -1 uses all CPUs (default value = 1);
+    Returns:
+        The metrics of each class at each threshold.
+    """
+    categories, (gold_image, gold_category, _, gold_xyxy), (pred_image, pred_category, pred_score, pred_xyxy) = \
+        _get_columns(gold_standard, predictions)
+    return get_pascal_voc_metrics_sweep_array(gold_image, gold_category, gold_xyxy,
+                                              pred_image, pred_category, pred_score, pred_xyxy,
+                                              iou_thresholds, method, categories, n_jobs)
+
+
+def get_pascal_voc_metrics_sweep_array(gold_image: np.ndarray,
+                                       gold_category: np.ndarray,
+                                       gold_xyxy: np.ndarray,
+                                       pred_image: np.ndarray,
+                                       pred_category: np.ndarray,
+                                       pred_score: np.ndarray,
+                                       pred_xyxy: np.ndarray,
+                                       iou_thresholds: List[float] = COCO_IOU_THRESHOLDS,
+                                       method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation,
+                                       category_labels: List[Any] = None,
+                                       n_jobs: int = 1,
+                                       bbox_format: box.BBFormat = box.BBFormat.X1Y1X2Y2,
+                                       image_width: np.ndarray = None,
+                                       image_height: np.ndarray = None
+                                       ) -> MetricSweep:
+    """Get the metrics used by the VOC Pascal 2012 challenge at several IOU thresholds, from boxes stored as arrays.
+
+    See `get_pascal_voc_metrics_array` for the arguments.
+    """
+    matches = _match(*_get_indexes(gold_image, gold_category, gold_xyxy,
+                                   pred_image, pred_category, pred_score, pred_xyxy,
+                                   bbox_format, image_width, image_height), n_jobs)
+    sweep = MetricSweep()
+    sweep.iou_thresholds = np.asarray(iou_thresholds, dtype=float)
+    sweep.labels = [category if category_labels is None else category_labels[category]
+                    for category, _, _, _ in matches]
+    sweep.num_groundtruth = np.array([npos for _, _, _, npos in matches], dtype=int)
+    sweep.results = [_assign(matches, t, method, category_labels) for t in sweep.iou_thresholds]
+    sweep.ap = np.array([[r[label].ap for label in sweep.labels] for r in sweep.results],
+                        dtype=float).reshape(len(sweep.iou_thresholds), len(sweep.labels))
+    return sweep
+
+
+def get_segmentation_metrics(gold_dataset: PCOCOObjectDetectionDataset,
+                             pred_dataset: PCOCOObjectDetectionDataset,
+                             iou_threshold: float = 0.5,
+                             method: MethodAveragePrecision = MethodAveragePrecision.AllPointsInterpolation,
+                             use_name: bool = True) -> Dict[Any, MetricPerClass]:
+    """Get the metrics used by the VOC Pascal 2012 challenge on the masks of the annotations.
+
+    Polygons are rasterized to RLE once per annotation, bounding boxes are used as rectangular masks. The matching
+    and the AP are the ones of `get_pascal_voc_metrics`, on mask IOUs. Crowd ground truths (iscrowd) are not counted
+    as ground truths; a detection that is not a TP and whose intersection with a crowd region covers at least
+    iou_threshold of its area is ignored.
+
+    Images without a size use the smallest canvas that holds their annotations.
+
+    Args:
+        gold_dataset: ground truth annotations, with the images and the categories;
+        pred_dataset: detected annotations;
+        iou_threshold: IOU threshold indicating which detections will be considered TP or FP (default value = 0.5);
+        method: AllPointsInterpolation, ElevenPointsInterpolation or HundredOnePointsInterpolation;
+        use_name: key the results by category name instead of category id (default value = True);
+    Returns:
+        A dictionary containing metrics of each class.
+    """
+    category_names = {cat.id: cat.name for cat in gold_dataset.categories}
+    image_sizes = _get_image_sizes(gold_dataset, gold_dataset.annotations + pred_dataset.annotations)
+
+    def get_label(ann):
+        return category_names[ann.category_id] if use_name else ann.category_id
+
+    categories = sorted(set(get_label(ann) for ann in gold_dataset.annotations + pred_dataset.annotations))
+    category_index = {c: i for i, c in enumerate(categories)}
+    image_index = {}
+    golds = gold_dataset.annotations
+    preds = pred_dataset.annotations
+    gold_index = EvaluationIndex([image_index.setdefault(ann.image_id, len(image_index)) for ann in golds],
+                                 [category_index[get_label(ann)] for ann in golds], np.zeros((len(golds), 4)))
+    pred_index = EvaluationIndex([image_index.setdefault(ann.image_id, len(image_index)) for ann in preds],
+                                 [category_index[get_label(ann)] for ann in preds], np.zeros((len(preds), 4)),
+                                 [ann.score for ann in preds])
+    gold_rles = [_get_rle(ann, *image_sizes[ann.image_id]) for ann in golds]
+    pred_rles = [_get_rle(ann, *image_sizes[ann.image_id]) for ann in preds]
+    gold_crowd = np.array([bool(getattr(ann, 'iscrowd', False)) for ann in golds], dtype=bool)
+
+    ret = {}
+    for i, category in enumerate(categories):
+        best_gt, best_iou, crowd_iou = _match_masks(gold_index, pred_index, gold_rles, pred_rles, gold_crowd, i)
+        tps = greedy_assign(best_gt, best_iou, iou_threshold)
+        counted = (tps == 1) | (crowd_iou < iou_threshold)
+        gold_sl = gold_index.category_slice(i)
+        npos = int(np.sum(~gold_crowd[gold_index.order[gold_sl]]))
+        ret[category] = get_metric_per_class(category, tps[counted], 1 - tps[counted], npos, method)
+    return ret
+
+
+def _get_image_sizes(dataset: PCOCOObjectDetectionDataset, annotations: List[PCOCOAnnotation]) \
+        -> Dict[Any, Tuple[int, int]]:
+    """
+    Returns:
+        the height and the width of every image. Images without a size get the smallest one that holds their
+        annotations.
+    """
+    sizes = {img.id: (img.height, img.width) for img in dataset.images if img.height > 0 and img.width > 0}
+    extents = {}
+    for ann in annotations:
+        if ann.image_id in sizes:
+            continue
+        if isinstance(ann, PCOCOSegments) and isinstance(ann.segmentation, dict):
+            extents[ann.image_id] = tuple(ann.segmentation['size'])
+            continue
+        b = ann.bbox if isinstance(ann, PCOCOSegments) else ann
+        if b is None:
+            continue
+        height, width = extents.get(ann.image_id, (0, 0))
+        extents[ann.image_id] = (max(height, int(np.ceil(b.ybr)) + 1), max(width, int(np.ceil(b.xbr)) + 1))
+    sizes.update(extents)
+    return sizes
+
+
+def _get_rle(ann: PCOCOAnnotation, height: int, width: int) -> mask.RLE:
+    if isinstance(ann, PCOCOSegments):
+        return mask.segmentation_to_rle(ann.segmentation, height, width)
+    if isinstance(ann, PCOCOBoundingBox):
+        return mask.segmentation_to_rle([ann.segment], height, width)
+    raise TypeError
+
+
+def _match_masks(gold_index: EvaluationIndex, pred_index: EvaluationIndex, gold_rles: List[mask.RLE],
+                 pred_rles: List[mask.RLE], gold_crowd: np.ndarray, category: int) \
+        -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Returns:
+        for the detections of the category, sorted by decreasing confidence:
+            position of their best non-crowd ground truth in the gold input (-1 if none)
+            IOU with the best ground truth
+            highest IOU with a crowd ground truth
+    """
+    sl = pred_index.category_slice(category)
+    best_gt = np.full(sl.stop - sl.start, -1, dtype=np.intp)
+    best_iou = np.zeros(sl.stop - sl.start)
+    crowd_iou = np.zeros(sl.stop - sl.start)
+
+    gold_images, gold_starts, gold_ends = gold_index.image_slices(category)
+    pred_images, pred_starts, pred_ends = pred_index.image_slices(category)
+    _, gi, pi = np.intersect1d(gold_images, pred_images, assume_unique=True, return_indices=True)
+    for gold_start, gold_end, pred_start, pred_end in zip(gold_starts[gi], gold_ends[gi], pred_starts[pi],
+                                                          pred_ends[pi]):
+        golds = gold_index.order[gold_start:gold_end]
+        crowd = gold_crowd[golds]
+        ious = mask.pairwise_iou([pred_rles[j] for j in pred_index.order[pred_start:pred_end]],
+                                 [gold_rles[j] for j in golds], crowd)
+        rows = slice(pred_start - sl.start, pred_end - sl.start)
+        # first non-crowd ground truth with the highest IOU
+        ious_gold = np.where(crowd[None, :], 0, ious)
+        best = np.argmax(ious_gold, axis=1)
+        best_iou[rows] = ious_gold[np.arange(len(best)), best]
+        best_gt[rows] = np.where(best_iou[rows] > sys.float_info.min, golds[best], -1)
+        crowd_iou[rows] = np.max(np.where(crowd[None, :], ious, 0), axis=1)
+
+    # detections sorted by decreasing confidence
+    sorted_preds = pred_index._score_permutation(sl)
+    return best_gt[sorted_preds], best_iou[sorted_preds], crowd_iou[sorted_preds]
+
+
+def get_metric_per_class(label, tps: np.ndarray, fps: np.ndarray, npos: int,
+                         method: MethodAveragePrecision) -> MetricPerClass:
+    """
+    Compute precision, recall and average precision of one class.
+
+    Args:
+        label: the class label
+        tps: tp flags of the detections, sorted by decreasing confidence
+        fps: fp flags of the detections, sorted by decreasing confidence
+        npos: number of ground truths
+        method: AllPointsInterpolation, ElevenPointsInterpolation or HundredOnePointsInterpolation
+    """
+    # compute precision, recall and average precision
+    cumulative_fps = np.cumsum(fps)
+    cumulative_tps = np.cumsum(tps)
+    recalls = np.divide(cumulative_tps, npos, out=np.full_like(cumulative_tps, np.nan), where=npos != 0)
+    precisions = np.divide(cumulative_tps, (cumulative_fps + cumulative_tps))
+    # Depending on the method, call the right implementation
+    if method == MethodAveragePrecision.AllPointsInterpolation:
+        ap, mrec, mpre, _ = calculate_all_points_average_precision(recalls, precisions)
+    elif method == MethodAveragePrecision.HundredOnePointsInterpolation:
+        ap, mrec, mpre = calculate_101_points_average_precision(recalls, precisions)
+    else:
+        ap, mrec, mpre = calculate_11_points_average_precision(recalls, precisions)
+    # add class result in the dictionary to be returned
+    r = MetricPerClass()
+    r.label = label
+    r.precision = precisions
+    r.recall = recalls
+    r.ap = ap
+    r.interpolated_recall = mrec
+    r.interpolated_precision = mpre
+    r.tp = np.sum(tps)
+    r.fp = np.sum(fps)
+    r.num_groundtruth = npos
+    r.num_detection = len(tps)
+    return r
+
+
+def calculate_all_points_average_precision(recall: np.ndarray, precision: np.ndarray) \
+        -> Tuple[float, np.ndarray, np.ndarray, np.ndarray]:
     """
     All-point interpolated average precision
 
@@ -188,21 +704,37 @@ def calculate_all_points_average_precision(recall: List[float], precision: List[
         interpolated precision
         interpolated points
     """
-    mrec = [0.0] + [e for e in recall] + [1.0]
-    mpre = [0.0] + [e for e in precision] + [0]
-    for i in range(len(mpre) - 1, 0, -1):
-        mpre[i - 1] = max(mpre[i - 1], mpre[i])
-    ii = []
-    for i in range(len(mrec) - 1):
-        if mrec[i + 1] != mrec[i]:
-            ii.append(i + 1)
-    ap = 0
-    for i in ii:
-        ap = ap + np.sum((mrec[i] - mrec[i - 1]) * mpre[i])
-    return ap, mrec[0:len(mpre) - 1], mpre[0:len(mpre) - 1], ii
+    mrec = np.concatenate(([0.0], np.asarray(recall, dtype=float).ravel(), [1.0]))
+    mpre = np.concatenate(([0.0], np.asarray(precision, dtype=float).ravel(), [0.0]))
+    # precision envelope: the maximum precision at any higher recall
+    mpre = np.maximum.accumulate(mpre[::-1])[::-1]
+    ii = np.flatnonzero(mrec[1:] != mrec[:-1]) + 1
+    ap = np.sum((mrec[ii] - mrec[ii - 1]) * mpre[ii])
+    return ap, mrec[:-1], mpre[:-1], ii
 
 
-def calculate_11_points_average_precision(recall: List[float], precision: List[float]) -> Tuple[float, List[float], List[float]]:
+def _interpolate_precision(recall: np.ndarray, precision: np.ndarray, recall_values: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        for each recall value r, the maximum precision whose recall is above r (0 if there is none)
+    """
+    recall = np.asarray(recall, dtype=float).ravel()
+    precision = np.asarray(precision, dtype=float).ravel()
+    rho_interp = np.zeros(len(recall_values))
+    if len(recall) == 0:
+        return rho_interp
+    # first position whose recall is higher or equal than r. nan recalls are never above r.
+    running_recall = np.maximum.accumulate(np.where(np.isnan(recall), -np.inf, recall))
+    first = np.searchsorted(running_recall, recall_values, side='left')
+    found = first < len(recall)
+    # maximum precision from each position to the end
+    max_precision = np.maximum.accumulate(precision[::-1])[::-1]
+    rho_interp[found] = max_precision[first[found]]
+    return rho_interp
+
+
+def calculate_11_points_average_precision(recall: np.ndarray, precision: np.ndarray) \
+        -> Tuple[float, np.ndarray, np.ndarray]:
     """
     11-point interpolated average precision. This is done by segmenting the recalls evenly into 11 parts:
         {0,0.1,0.2,...,0.9,1}.
@@ -215,36 +747,37 @@ def calculate_11_points_average_precision(recall: List[float], precision: List[f
         average precision, interpolated recall, interpolated precision
 
     """
-    mrec = [e for e in recall]
-    mpre = [e for e in precision]
-    recall_values = np.linspace(0, 1, 11)
-    recall_values = list(recall_values[::-1])
-    rho_interp = []
-    recall_valid = []
-    # For each recallValues (0, 0.1, 0.2, ... , 1)
-    for r in recall_values:
-        # Obtain all recall values higher or equal than r
-        arg_greater_recalls = np.argwhere(mrec[:] >= r)
-        pmax = 0
-        # If there are recalls above r
-        if arg_greater_recalls.size != 0:
-            pmax = max(mpre[arg_greater_recalls.min():])
-        recall_valid.append(r)
-        rho_interp.append(pmax)
+    recall_values = np.linspace(0, 1, 11)[::-1]
+    rho_interp = _interpolate_precision(recall, precision, recall_values)
     # By definition AP = sum(max(precision whose recall is above r))/11
-    ap = sum(rho_interp) / 11
-    # Generating values for the plot
-    rvals = [recall_valid[0]] + [e for e in recall_valid] + [0]
-    pvals = [0] + [e for e in rho_interp] + [0]
-    # rhoInterp = rhoInterp[::-1]
-    cc = []
-    for i in range(len(rvals)):
-        p = (rvals[i], pvals[i - 1])
-        if p not in cc:
-            cc.append(p)
-        p = (rvals[i], pvals[i])
-        if p not in cc:
-            cc.append(p)
-    recall_values = [i[0] for i in reversed(cc)]
-    precision_values = [i[1] for i in reversed(cc)]
-    return ap, recall_values, precision_values
+    ap = np.sum(rho_interp) / 11
+    # Generating values for the plot: a step at each recall value
+    rvals = np.concatenate(([recall_values[0]], recall_values, [0]))
+    pvals = np.concatenate(([0], rho_interp, [0]))
+    points = np.empty((2 * len(rvals), 2))
+    points[0::2, 0] = rvals
+    points[0::2, 1] = np.roll(pvals, 1)
+    points[1::2, 0] = rvals
+    points[1::2, 1] = pvals
+    # remove duplicated points, keeping the first one
+    _, first = np.unique(points, axis=0, return_index=True)
+    points = points[np.sort(first)][::-1]
+    return ap, points[:, 0], points[:, 1]
+
+
+def calculate_101_points_average_precision(recall: np.ndarray, precision: np.ndarray) \
+        -> Tuple[float, np.ndarray, np.ndarray]:
+    """
+    101-point interpolated average precision, as in the COCO evaluation: {0,0.01,0.02,...,0.99,1}.
+
+    Args:
+        recall: recall list
+        precision: precision list
+
+    Returns:
+        average precision, interpolated recall, interpolated precision
+    """
+    recall_values = np.linspace(0, 1, 101)
+    rho_interp = _interpolate_precision(recall, precision, recall_values)
+    ap = np.sum(rho_interp) / 101
+    return ap, recall_values, rho_interp
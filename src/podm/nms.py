@@ -0,0 +1,216 @@
+"""
+Post-processing of raw detections stored as arrays: score threshold, class-aware non-maximum suppression (NMS) and
+top-k detections per image.
+
+Boxes are given as parallel NumPy arrays, as in `podm.columnar`, and overlaps use the IOU of `podm.box`, so that
+filtering and evaluation agree on what overlapping means.
+"""
+from enum import Enum
+from typing import Tuple
+
+import numpy as np
+
+from podm.box import BoxArray, SortAndSweepIndex, paired_intersection_over_union, _ranges
+from podm.columnar import EvaluationIndex, MAX_PAIRS, SPATIAL_INDEX_MIN_BOXES
+
+
+class NMSMethod(Enum):
+    """
+    Hard: removes the boxes that overlap a higher-scored box with an IOU above the threshold.
+    Linear: soft-NMS, multiplies the scores of these boxes by 1 - IOU.
+    Gaussian: soft-NMS, multiplies the scores of all the overlapping boxes by exp(-IOU^2 / sigma).
+    """
+    Hard = 1
+    Linear = 2
+    Gaussian = 3
+
+
+def filter_detections(image: np.ndarray, category: np.ndarray, score: np.ndarray, xyxy: np.ndarray,
+                      score_threshold: float = None, iou_threshold: float = None,
+                      method: NMSMethod = NMSMethod.Hard, sigma: float = 0.5, max_detections: int = None,
+                      class_aware: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Drop the detections below score_threshold, then apply NMS, then keep the max_detections highest-scored
+    detections of every image. Each step is skipped if its argument is None.
+
+    Args:
+        image: (N,) image index of the detections
+        category: (N,) category index of the detections
+        score: (N,) confidence of the detections
+        xyxy: (N, 4) [xtl, ytl, xbr, ybr] coordinates, or a BoxArray
+        score_threshold: minimum score of the kept detections
+        iou_threshold: IOU threshold of the NMS
+        method: Hard, Linear or Gaussian
+        sigma: parameter of the Gaussian soft-NMS
+        max_detections: maximum number of detections per image
+        class_aware: if False, the NMS compares boxes of different categories
+
+    Returns:
+        positions of the kept detections in the input arrays, in increasing order, and their scores (decayed by
+        soft-NMS)
+    """
+    image = np.asarray(image, dtype=np.int64)
+    category = np.asarray(category, dtype=np.int64)
+    score = np.asarray(score, dtype=float)
+    xyxy = _get_xyxy(xyxy)
+
+    keep = np.arange(len(score))
+    if score_threshold is not None:
+        keep = np.flatnonzero(score >= score_threshold)
+    kept_score = score[keep]
+    if iou_threshold is not None:
+        nms_keep, kept_score = non_maximum_suppression(image[keep], category[keep], kept_score, xyxy[keep],
+                                                       iou_threshold, method, sigma, score_threshold, class_aware)
+        keep = keep[nms_keep]
+    if max_detections is not None:
+        top = top_k_per_image(image[keep], kept_score, max_detections)
+        keep, kept_score = keep[top], kept_score[top]
+    return keep, kept_score
+
+
+def non_maximum_suppression(image: np.ndarray, category: np.ndarray, score: np.ndarray, xyxy: np.ndarray,
+                            iou_threshold: float = 0.5, method: NMSMethod = NMSMethod.Hard, sigma: float = 0.5,
+                            score_threshold: float = None, class_aware: bool = True) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Non-maximum suppression within every image and category. Boxes with the same score are visited in input order.
+
+    See `filter_detections` for the arguments. score_threshold removes the boxes whose score is below it after NMS,
+    e.g., whose score decays below it during soft-NMS.
+
+    Returns:
+        positions of the kept detections in the input arrays, in increasing order, and their scores
+    """
+    score = np.asarray(score, dtype=float)
+    if not class_aware:
+        category = np.zeros(len(score), dtype=np.int64)
+    index = EvaluationIndex(image, category, _get_xyxy(xyxy), score)
+    starts, ends = index.group_slices()
+
+    if method == NMSMethod.Hard:
+        kept = _hard_nms(index.xyxy, starts, ends, iou_threshold)
+        sorted_score = index.score
+    else:
+        kept = np.ones(len(index), dtype=bool)
+        sorted_score = index.score.copy()
+        for start, end in zip(starts, ends):
+            sorted_score[start:end] = _soft_nms(index.xyxy[start:end], sorted_score[start:end], iou_threshold,
+                                                method, sigma)
+    if score_threshold is not None:
+        kept &= sorted_score >= score_threshold
+
+    positions = index.order[kept]
+    order = np.argsort(positions)
+    return positions[order], sorted_score[kept][order]
+
+
+def top_k_per_image(image: np.ndarray, score: np.ndarray, k: int) -> np.ndarray:
+    """
+    Returns:
+        positions of the k highest-scored detections of every image, in increasing order. Boxes with the same
+        score are taken in input order.
+    """
+    image = np.asarray(image, dtype=np.int64)
+    order = np.lexsort((-np.asarray(score, dtype=float), image))
+    sorted_image = image[order]
+    # rank of every detection within its image
+    starts = np.flatnonzero(np.r_[True, sorted_image[1:] != sorted_image[:-1]][:len(order)])
+    lengths = np.diff(np.r_[starts, len(order)])
+    ranks = np.arange(len(order)) - np.repeat(starts, lengths)
+    return np.sort(order[ranks < k])
+
+
+def _get_xyxy(xyxy) -> np.ndarray:
+    if isinstance(xyxy, BoxArray):
+        return xyxy.xyxy
+    return np.asarray(xyxy, dtype=float).reshape(-1, 4)
+
+
+def _hard_nms(xyxy: np.ndarray, starts: np.ndarray, ends: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """
+    Hard NMS of boxes sorted by decreasing score within groups [starts[g], ends[g]).
+
+    A box is kept if no kept box before it overlaps it. Instead of visiting the boxes one by one, every round
+    decides, in all groups at once, the boxes that only depend on decided boxes: those overlapped by a kept box are
+    suppressed, those that are not overlapped by any kept or undecided box are kept. The first undecided box of every
+    group is always decided, so this ends, usually after a few rounds.
+
+    Returns:
+        (N,) kept flags
+    """
+    first, second = _overlapping_pairs(xyxy, starts, ends, iou_threshold)
+    # 0: undecided, 1: kept, -1: suppressed
+    state = np.zeros(len(xyxy), dtype=np.int8)
+    while True:
+        undecided = state == 0
+        if not undecided.any():
+            break
+        blocked = np.zeros(len(xyxy), dtype=bool)
+        blocked[second[state[first] >= 0]] = True
+        suppressed = np.zeros(len(xyxy), dtype=bool)
+        suppressed[second[state[first] == 1]] = True
+        state[undecided & suppressed] = -1
+        state[undecided & ~blocked] = 1
+        # only the pairs between a kept or undecided box and an undecided box still matter
+        live = (state[first] >= 0) & (state[second] == 0)
+        first, second = first[live], second[live]
+    return state == 1
+
+
+def _overlapping_pairs(xyxy: np.ndarray, starts: np.ndarray, ends: np.ndarray, iou_threshold: float,
+                       max_pairs: int = MAX_PAIRS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        (i, j) pairs of boxes of the same group, with i < j and an IOU above iou_threshold
+    """
+    lengths = ends - starts
+    firsts = []
+    seconds = []
+
+    # crowded groups: overlapping pairs from a spatial index
+    for start, end in zip(starts[lengths >= SPATIAL_INDEX_MIN_BOXES], ends[lengths >= SPATIAL_INDEX_MIN_BOXES]):
+        first, second = SortAndSweepIndex(xyxy[start:end]).query_pairs(xyxy[start:end])
+        before = first < second
+        firsts.append(first[before] + start)
+        seconds.append(second[before] + start)
+
+    # other groups: every box against the next boxes of its group, at most max_pairs at a time
+    boxes = _ranges(starts[lengths < SPATIAL_INDEX_MIN_BOXES], lengths[lengths < SPATIAL_INDEX_MIN_BOXES])
+    counts = np.repeat(ends[lengths < SPATIAL_INDEX_MIN_BOXES], lengths[lengths < SPATIAL_INDEX_MIN_BOXES]) - boxes - 1
+    cumulative_counts = np.cumsum(counts)
+    start = 0
+    while start < len(boxes):
+        end = np.searchsorted(cumulative_counts, cumulative_counts[start] - counts[start] + max_pairs, side='right')
+        chunk = slice(start, max(end, start + 1))
+        start = chunk.stop
+        firsts.append(np.repeat(boxes[chunk], counts[chunk]))
+        seconds.append(_ranges(boxes[chunk] + 1, counts[chunk]))
+
+    first = np.concatenate(firsts + [np.zeros(0, dtype=np.intp)])
+    second = np.concatenate(seconds + [np.zeros(0, dtype=np.intp)])
+    overlap = paired_intersection_over_union(xyxy[first], xyxy[second]) > iou_threshold
+    return first[overlap], second[overlap]
+
+
+def _soft_nms(xyxy: np.ndarray, score: np.ndarray, iou_threshold: float, method: NMSMethod, sigma: float) \
+        -> np.ndarray:
+    """
+    Soft-NMS of the boxes of one group.
+
+    Returns:
+        the decayed scores
+    """
+    score = score.copy()
+    remaining = np.arange(len(score))
+    while len(remaining) > 1:
+        # argmax takes the first box among the ones with the highest score
+        best = np.argmax(score[remaining])
+        selected = remaining[best]
+        remaining = np.delete(remaining, best)
+        ious = paired_intersection_over_union(np.broadcast_to(xyxy[selected], (len(remaining), 4)),
+                                              xyxy[remaining])
+        if method == NMSMethod.Linear:
+            score[remaining] *= np.where(ious > iou_threshold, 1 - ious, 1)
+        else:
+            score[remaining] *= np.exp(-ious ** 2 / sigma)
+    return score
@@ -20,7 +20,7 @@ import docopt
 import tqdm
 import pandas as pd
 from podm import coco_encoder
-from podm.box import BBFormat, Box
+from podm.box import BBFormat, Box, convert_boxes
 from podm.coco import PCOCOObjectDetectionDataset, PCOCOImage, PCOCOCategory, PCOCOBoundingBox
 
 
@@ -65,34 +65,41 @@ class PascalVoc2COCO:
     def __init__(self, format: BBFormat = BBFormat.X1Y1X2Y2):
         self.format = format
 
+    def convert_boxes(self, df: pd.DataFrame) -> list:
+        """
+        Returns:
+            the [xtl, ytl, xbr, ybr] coordinates of every row
+        """
+        return convert_boxes(df[['xtl', 'ytl', 'xbr', 'ybr']].to_numpy(), self.format).tolist()
+
     def convert_gold(self, src) -> PCOCOObjectDetectionDataset:
         df = convert_pascal_to_df(src)
 
         dataset = PCOCOObjectDetectionDataset()
         # add image
-        for i, name in enumerate(df['name'].unique()):
+        images = []
+        for name in df['name'].unique():
             img = PCOCOImage()
-            img.id = i
             img.file_name = name
-            dataset.add_image(img)
+            images.append(img)
+        dataset.add_images(images, assign_ids=True)
         # add category
-        for i, label in enumerate(df['label'].unique()):
+        categories = []
+        for label in df['label'].unique():
             cat = PCOCOCategory()
-            cat.id = i
             cat.name = label
-            dataset.add_category(cat)
+            categories.append(cat)
+        dataset.add_categories(categories, assign_ids=True)
         # add annotation
-        for i, row in tqdm.tqdm(df.iterrows(), total=len(df)):
-            box = Box.of_box(row['xtl'], row['ytl'], row['xbr'], row['ybr'])
-            if self.format == BBFormat.XYWH:
-                box.xbr += box.xtl
-                box.ybr += box.ytl
-            ann = PCOCOBoundingBox()
-            ann.image_id = dataset.get_image(file_name=row['name']).id
-            ann.id = i
-            ann.category_id = dataset.get_category(name=row['label']).id
-            ann.set_box(box)
-            dataset.add_annotation(ann)
+        image_ids = df['name'].map({img.file_name: img.id for img in images}).tolist()
+        category_ids = df['label'].map({cat.name: cat.id for cat in categories}).tolist()
+        xyxy = self.convert_boxes(df)
+        annotations = []
+        for image_id, category_id, row_xyxy in zip(image_ids, category_ids, xyxy):
+            ann = PCOCOBoundingBox.of_values(None, image_id, category_id, *row_xyxy)
+            ann.verify()
+            annotations.append(ann)
+        dataset.add_annotations(annotations, assign_ids=True)
         return dataset
 
     def convert_gold_file(self, src, dest):
@@ -104,6 +111,7 @@ class PascalVoc2COCO:
         gold_dataset = self.convert_gold(src_gold)
 
         df = convert_pascal_to_df(src_pred)
+        xyxy = self.convert_boxes(df)
         # check cat
         subrows = []
         for i, row in tqdm.tqdm(df.iterrows(), total=len(df)):
@@ -113,16 +121,13 @@ class PascalVoc2COCO:
             if gold_dataset.get_image(file_name=row['name']) is None:
                 warnings.warn('%s: Image does not exist' % row['name'])
                 continue
-            subrows.append(row)
+            subrows.append((row, xyxy[i]))
         if len(subrows) < len(df):
             warnings.warn('Remove %s rows' % (len(df) - len(subrows)))
 
         annotations = []
-        for i, row in tqdm.tqdm(enumerate(subrows), total=len(subrows)):
-            box = Box.of_box(row['xtl'], row['ytl'], row['xbr'], row['ybr'])
-            if self.format == BBFormat.XYWH:
-                box.xbr += box.xtl
-                box.ybr += box.ytl
+        for i, (row, row_xyxy) in tqdm.tqdm(enumerate(subrows), total=len(subrows)):
+            box = Box.of_box(*row_xyxy)
             ann = PCOCOBoundingBox()
             ann.image_id = gold_dataset.get_image(file_name=row['name']).id
             ann.id = i
@@ -0,0 +1,133 @@
+"""
+Spatial queries over the annotations of a dataset.
+
+The annotations of every image are held in a shapely STRtree, built on the first query of the image. Segments are
+indexed by their polygons, bounding boxes by their rectangle. A point is contained by a geometry if it lies in its
+interior, as in `PCOCOSegments.__contains__`.
+
+`box_contains_points` tests points against the boxes of the annotations instead, with the half-open semantics of
+`Box.__contains__`.
+"""
+from typing import Collection, Dict, List, Tuple, Union
+
+import numpy as np
+import shapely
+from shapely.geometry.base import BaseGeometry
+
+from podm import box
+from podm.box import _contains_points_pairs
+from podm.coco import PCOCOBoundingBox, PCOCOSegments, PCOCOObjectDetectionDataset
+
+
+class AnnotationIndex:
+    """
+    annotations: the indexed annotations. Queries return positions in this list.
+    """
+    def __init__(self, annotations: Collection[PCOCOBoundingBox or PCOCOSegments]):
+        self.annotations = list(annotations)
+        self._image_positions = {}  # type: Dict[int, List[int]]
+        for i, ann in enumerate(self.annotations):
+            self._image_positions.setdefault(ann.image_id, []).append(i)
+        self._trees = {}  # type: Dict[int, Tuple[shapely.STRtree, np.ndarray]]
+
+    @classmethod
+    def of_dataset(cls, dataset: PCOCOObjectDetectionDataset) -> 'AnnotationIndex':
+        return AnnotationIndex(dataset.annotations)
+
+    def _get_tree(self, image_id: int) -> Tuple[shapely.STRtree, np.ndarray]:
+        """
+        Returns:
+            the tree of the geometries of the image, and the position of the annotation of every geometry
+        """
+        if image_id not in self._trees:
+            geometries = []
+            owners = []
+            for i in self._image_positions.get(image_id, []):
+                ann = self.annotations[i]
+                if isinstance(ann, PCOCOSegments):
+                    polygons = ann.polygons
+                elif isinstance(ann, box.Box):
+                    polygons = [shapely.box(ann.xtl, ann.ytl, ann.xbr, ann.ybr)]
+                else:
+                    raise TypeError('%s: Not a bounding box or segments' % type(ann))
+                geometries.extend(polygons)
+                owners.extend([i] * len(polygons))
+            self._trees[image_id] = (shapely.STRtree(geometries), np.array(owners, dtype=np.intp))
+        return self._trees[image_id]
+
+    def contains_points(self, points: np.ndarray, image_ids: Union[int, np.ndarray]) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the annotations that contain the points.
+
+        Args:
+            points: (N, 2) x and y of the points
+            image_ids: image of the points, one for all of them or (N,)
+
+        Returns:
+            positions of the points, and positions of the annotations that contain them, sorted by point then
+            annotation
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        image_ids = np.broadcast_to(np.asarray(image_ids), (len(points),))
+        point_positions = [np.zeros(0, dtype=np.intp)]
+        annotation_positions = [np.zeros(0, dtype=np.intp)]
+        images, inverse = np.unique(image_ids, return_inverse=True)
+        for k, image_id in enumerate(images):
+            tree, owners = self._get_tree(image_id.item())
+            positions = np.flatnonzero(inverse == k)
+            pairs = tree.query(shapely.points(points[positions]), predicate='within')
+            point_positions.append(positions[pairs[0]])
+            annotation_positions.append(owners[pairs[1]])
+        return _unique_pairs(np.concatenate(point_positions), np.concatenate(annotation_positions))
+
+    def intersects(self, region: Union[box.Box, BaseGeometry], image_id: int) -> np.ndarray:
+        """
+        Find the annotations of the image that intersect the region.
+
+        Returns:
+            sorted positions of the annotations
+        """
+        if isinstance(region, box.Box):
+            region = shapely.box(region.xtl, region.ytl, region.xbr, region.ybr)
+        tree, owners = self._get_tree(image_id)
+        return np.unique(owners[tree.query(region, predicate='intersects')])
+
+
+def box_contains_points(dataset: PCOCOObjectDetectionDataset, points: np.ndarray, image_ids: np.ndarray,
+                        max_pairs: int = 1 << 22) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized `Box.__contains__` of the annotations and the points of the same image. Segments use their bbox.
+
+    Args:
+        points: (M, 2) x and y of the points
+        image_ids: (M,) image of the points
+        max_pairs: maximum number of candidates checked at a time
+    Returns:
+        positions of the annotations in dataset.annotations, and positions of the points they contain, sorted by
+        annotation then point
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    xyxy = np.full((len(dataset.annotations), 4), np.nan)
+    for i, ann in enumerate(dataset.annotations):
+        b = ann.bbox if isinstance(ann, PCOCOSegments) else ann
+        if b is not None:
+            xyxy[i] = b.xtl, b.ytl, b.xbr, b.ybr
+    annotation_image_ids = np.asarray([ann.image_id for ann in dataset.annotations])
+    _, groups = np.unique(np.concatenate((annotation_image_ids, np.asarray(image_ids).reshape(-1))),
+                          return_inverse=True)
+    groups = groups.reshape(-1).astype(np.int64)
+    return _contains_points_pairs(xyxy, points, groups[:len(xyxy)], groups[len(xyxy):], max_pairs)
+
+
+def _unique_pairs(first: np.ndarray, second: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        the distinct pairs, sorted by first then second
+    """
+    if len(first) == 0:
+        return first, second
+    order = np.lexsort((second, first))
+    first, second = first[order], second[order]
+    keep = np.r_[True, (first[1:] != first[:-1]) | (second[1:] != second[:-1])]
+    return first[keep], second[keep]
@@ -0,0 +1,151 @@
+"""
+Bulk validation of boxes and datasets.
+
+`Box.of_box` asserts each box on its own, which stops at the first bad box and is skipped under `python -O`.
+These functions check all the boxes at once and report every problem, so that the boxes can be trusted afterwards,
+e.g., by the IOU functions that do not verify their inputs.
+"""
+from collections import Counter
+from typing import Any, Dict, List
+
+import numpy as np
+
+from podm.box import BoxArray
+from podm.coco import PCOCOObjectDetectionDataset, PCOCOSegments, AnnotationStore
+
+
+class ValidationReport:
+    """
+    Problems found in boxes or in a dataset. Boxes are reported by position, in the box array or in the annotations
+    of the dataset.
+
+    nan: boxes with a NaN coordinate
+    inverted: boxes with xtl > xbr or ytl > ybr
+    zero_area: boxes with a zero width or height
+    out_of_image: boxes that are not inside their image
+    dangling_image_ids: annotations whose image_id is not the id of an image
+    dangling_category_ids: annotations whose category_id is not the id of a category
+    duplicate_annotation_ids: ids shared by several annotations
+    duplicate_image_ids: ids shared by several images
+    duplicate_category_ids: ids shared by several categories
+    """
+    _fields = ('nan', 'inverted', 'zero_area', 'out_of_image', 'dangling_image_ids', 'dangling_category_ids',
+               'duplicate_annotation_ids', 'duplicate_image_ids', 'duplicate_category_ids')
+
+    def __init__(self):
+        self.nan = np.zeros(0, dtype=np.intp)  # type: np.ndarray
+        self.inverted = np.zeros(0, dtype=np.intp)  # type: np.ndarray
+        self.zero_area = np.zeros(0, dtype=np.intp)  # type: np.ndarray
+        self.out_of_image = np.zeros(0, dtype=np.intp)  # type: np.ndarray
+        self.dangling_image_ids = np.zeros(0, dtype=np.intp)  # type: np.ndarray
+        self.dangling_category_ids = np.zeros(0, dtype=np.intp)  # type: np.ndarray
+        self.duplicate_annotation_ids = []  # type: List[Any]
+        self.duplicate_image_ids = []  # type: List[Any]
+        self.duplicate_category_ids = []  # type: List[Any]
+
+    @property
+    def problems(self) -> Dict[str, Any]:
+        """
+        Returns:
+            the non-empty problems, keyed by name
+        """
+        return {name: getattr(self, name) for name in self._fields if len(getattr(self, name)) > 0}
+
+    @property
+    def is_valid(self) -> bool:
+        return len(self.problems) == 0
+
+    def __str__(self):
+        if self.is_valid:
+            return 'ValidationReport[valid]'
+        return 'ValidationReport[{}]'.format(
+            ', '.join('{}={} {}'.format(name, len(value), _head(value)) for name, value in self.problems.items()))
+
+
+def _head(values, n: int = 5) -> str:
+    values = list(values[:n]) + (['...'] if len(values) > n else [])
+    return '[{}]'.format(', '.join(str(v) for v in values))
+
+
+def validate_boxes(xyxy: np.ndarray, image_width: np.ndarray = None, image_height: np.ndarray = None,
+                   image: np.ndarray = None) -> ValidationReport:
+    """
+    Check the geometry of (N, 4) [xtl, ytl, xbr, ybr] boxes.
+
+    Args:
+        xyxy: (N, 4) coordinates, or a BoxArray
+        image_width: width of the image of each box, or of each image if image is given. nan or 0 skips the
+            out-of-image check.
+        image_height: height of the image of each box, or of each image if image is given
+        image: (N,) image index of each box
+    """
+    if isinstance(xyxy, BoxArray):
+        xyxy = xyxy.xyxy
+    xyxy = np.asarray(xyxy, dtype=float).reshape(-1, 4)
+    report = ValidationReport()
+    nan = np.isnan(xyxy).any(axis=1)
+    width = xyxy[:, 2] - xyxy[:, 0]
+    height = xyxy[:, 3] - xyxy[:, 1]
+    report.nan = np.flatnonzero(nan)
+    report.inverted = np.flatnonzero((width < 0) | (height < 0))
+    report.zero_area = np.flatnonzero((width == 0) | (height == 0))
+    if image_width is not None and image_height is not None:
+        image_width = np.asarray(image_width, dtype=float)
+        image_height = np.asarray(image_height, dtype=float)
+        if image is not None:
+            image_width, image_height = image_width[image], image_height[image]
+        image_width, image_height = np.broadcast_arrays(image_width, image_height)
+        # images without a size are not checked
+        known = ~np.isnan(image_width) & ~np.isnan(image_height) & (image_width > 0) & (image_height > 0)
+        outside = (xyxy[:, 0] < 0) | (xyxy[:, 1] < 0) | (xyxy[:, 2] > image_width) | (xyxy[:, 3] > image_height)
+        report.out_of_image = np.flatnonzero(known & outside)
+    return report
+
+
+def validate_dataset(dataset: PCOCOObjectDetectionDataset) -> ValidationReport:
+    """
+    Check the boxes of the annotations, the ids they refer to, and the uniqueness of the ids. Segments are checked
+    through their bounding box.
+    """
+    annotations = dataset.annotations
+    n = len(annotations)
+    images = {img.id: img for img in dataset.images}
+    category_ids = {cat.id for cat in dataset.categories}
+
+    if isinstance(annotations, AnnotationStore):
+        # the columns of the store, and the sizes of the images in the order of their ids
+        xyxy = annotations.xyxy
+        ids = np.array(sorted(i for i in images if isinstance(i, (int, np.integer))), dtype=np.int64)
+        sizes = np.array([(images[i].width, images[i].height) for i in ids.tolist()], dtype=float).reshape(-1, 2)
+        found = np.isin(annotations.image_id, ids)
+        size = np.full((n, 2), np.nan)
+        size[found] = sizes[np.searchsorted(ids, annotations.image_id[found])]
+        dangling_images = ~found
+        dangling_categories = ~np.isin(annotations.category_id,
+                                       [i for i in category_ids if isinstance(i, (int, np.integer))])
+        annotation_ids = annotations.id.tolist()
+    else:
+        xyxy = np.full((n, 4), np.nan)
+        for i, ann in enumerate(annotations):
+            b = ann.bbox if isinstance(ann, PCOCOSegments) else ann
+            if b is not None:
+                xyxy[i] = (b.xtl, b.ytl, b.xbr, b.ybr)
+        image_ids = [ann.image_id for ann in annotations]
+        size = np.array([(images[i].width, images[i].height) if i in images else (np.nan, np.nan)
+                         for i in image_ids], dtype=float).reshape(n, 2)
+        dangling_images = np.fromiter((i not in images for i in image_ids), dtype=bool, count=n)
+        dangling_categories = np.fromiter((ann.category_id not in category_ids for ann in annotations), dtype=bool,
+                                          count=n)
+        annotation_ids = [ann.id for ann in annotations]
+
+    report = validate_boxes(xyxy, size[:, 0], size[:, 1])
+    report.dangling_image_ids = np.flatnonzero(dangling_images)
+    report.dangling_category_ids = np.flatnonzero(dangling_categories)
+    report.duplicate_annotation_ids = _get_duplicates(annotation_ids)
+    report.duplicate_image_ids = _get_duplicates(img.id for img in dataset.images)
+    report.duplicate_category_ids = _get_duplicates(cat.id for cat in dataset.categories)
+    return report
+
+
+def _get_duplicates(ids) -> List[Any]:
+    return [i for i, count in Counter(ids).items() if count > 1]
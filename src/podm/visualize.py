@@ -29,6 +29,8 @@ def plot_precision_recall_curve(result: MetricPerClass,
     if show_interpolated_precision:
         if method == MethodAveragePrecision.AllPointsInterpolation:
             plt.plot(mrec, mpre, '--r', label='Interpolated precision (every point)')
+        elif method == MethodAveragePrecision.HundredOnePointsInterpolation:
+            plt.plot(mrec, mpre, '--r', label='101-point interpolated precision')
         elif method == MethodAveragePrecision.ElevenPointsInterpolation:
             # Uncomment the line below if you want to plot the area
             # plt.plot(mrec, mpre, 'or', label='11-point interpolated precision')
@@ -70,3 +70,19 @@ def assert_results(actuals: Dict[Any, MetricPerClass], expecteds, key, classes=N
             expected = expecteds[label][key]
             assert np.allclose(actual, expected, rtol=1e-1, equal_nan=True),\
                 f'Failed. Expected:{expected}, Actual:{actual}'
+
+
+def assert_same_results(expecteds: Dict[Any, MetricPerClass], actuals: Dict[Any, MetricPerClass]):
+    assert list(expecteds.keys()) == list(actuals.keys())
+    for label, expected in expecteds.items():
+        actual = actuals[label]
+        assert actual.label == expected.label
+        assert np.isclose(actual.ap, expected.ap, rtol=1e-9, equal_nan=True)
+        assert np.array_equal(actual.precision, expected.precision, equal_nan=True)
+        assert np.array_equal(actual.recall, expected.recall, equal_nan=True)
+        assert np.allclose(actual.interpolated_precision, expected.interpolated_precision, equal_nan=True)
+        assert np.allclose(actual.interpolated_recall, expected.interpolated_recall, equal_nan=True)
+        assert actual.tp == expected.tp
+        assert actual.fp == expected.fp
+        assert actual.num_groundtruth == expected.num_groundtruth
+        assert actual.num_detection == expected.num_detection
@@ -0,0 +1,56 @@
+import math
+
+import numpy as np
+import pytest
+
+from podm import coco_decoder
+from podm.bootstrap import bootstrap_pascal_voc_metrics
+from podm.metrics import get_pascal_voc_metrics, get_bounding_boxes, MethodAveragePrecision, MetricPerClass, \
+    BoundingBox
+
+
+@pytest.fixture(scope='module')
+def bounding_boxes(sample_dir):
+    with open(sample_dir / 'groundtruths_coco.json') as fp:
+        gold_dataset = coco_decoder.load_true_object_detection_dataset(fp)
+    with open(sample_dir / 'detections_coco.json') as fp:
+        pred_dataset = coco_decoder.load_pred_object_detection_dataset(fp, gold_dataset)
+    return get_bounding_boxes(gold_dataset), get_bounding_boxes(pred_dataset)
+
+
+@pytest.mark.parametrize('method', list(MethodAveragePrecision))
+def test_bootstrap(bounding_boxes, method):
+    golds, preds = bounding_boxes
+    result = bootstrap_pascal_voc_metrics(golds, preds, .5, method, num_samples=50, seed=0)
+
+    expecteds = get_pascal_voc_metrics(golds, preds, .5, method)
+    assert result.labels == list(expecteds.keys())
+    for label, ap in zip(result.labels, result.ap):
+        if expecteds[label].num_groundtruth > 0:
+            assert math.isclose(ap, expecteds[label].ap, abs_tol=1e-12)
+    assert math.isclose(result.mAP, MetricPerClass.mAP(expecteds))
+
+    assert result.ap_samples.shape == (50, len(result.labels))
+    assert result.mAP_samples.shape == (50,)
+    low, high = result.mAP_interval(.9)
+    assert low <= result.mAP <= high
+    assert result.ap_interval().shape == (len(result.labels), 2)
+
+
+def test_bootstrap_seed(bounding_boxes):
+    golds, preds = bounding_boxes
+    result1 = bootstrap_pascal_voc_metrics(golds, preds, num_samples=40, seed=1)
+    result2 = bootstrap_pascal_voc_metrics(golds, preds, num_samples=40, seed=1, n_jobs=2)
+    assert np.array_equal(result1.ap_samples, result2.ap_samples, equal_nan=True)
+    result3 = bootstrap_pascal_voc_metrics(golds, preds, num_samples=40, seed=2)
+    assert not np.array_equal(result1.mAP_samples, result3.mAP_samples)
+
+
+def test_bootstrap_resample():
+    # two identical images: every resample has the same AP
+    golds = [BoundingBox.of_bbox(i, 'cat', 0, 0, 10, 10) for i in range(2)]
+    preds = [BoundingBox.of_bbox(i, 'cat', 0, 0, 10, 10, .9) for i in range(2)] + \
+            [BoundingBox.of_bbox(i, 'cat', 20, 20, 30, 30, .5) for i in range(2)]
+    result = bootstrap_pascal_voc_metrics(golds, preds, num_samples=20, seed=0)
+    assert np.allclose(result.ap_samples, result.ap[0])
+    assert result.ap[0] == 1
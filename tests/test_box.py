@@ -4,6 +4,8 @@ from podm import box
 from podm.box import Box
 import math
 
+import numpy as np
+
 
 def test_iou():
     box1 = Box.of_box(0., 0., 10., 10.)
@@ -24,6 +26,47 @@ def test_iou():
     assert math.isclose(box.intersection_over_union(box1, box2), 0.142857142857, rel_tol=1e-6)
 
 
+def test_pairwise_iou():
+    boxes1 = [Box.of_box(0., 0., 10., 10.), Box.of_box(0., 0., 2., 2.), Box.of_box(5., 5., 5., 5.)]
+    boxes2 = [Box.of_box(1., 1., 11., 11.), Box.of_box(12., 12., 22., 22.), Box.of_box(1., 1., 3., 3.)]
+    ious = box.pairwise_intersection_over_union([[b.xtl, b.ytl, b.xbr, b.ybr] for b in boxes1],
+                                                [[b.xtl, b.ytl, b.xbr, b.ybr] for b in boxes2])
+    assert ious.shape == (3, 3)
+    for i, box1 in enumerate(boxes1[:2]):
+        for j, box2 in enumerate(boxes2):
+            assert math.isclose(ious[i, j], box.intersection_over_union(box1, box2), rel_tol=1e-12)
+    # a degenerate box has no area
+    assert np.all(ious[2] == 0)
+
+
+def test_box_array():
+    boxes = [Box.of_box(0., 0., 10., 10.), Box.of_box(1., 2., 11., 6.), Box.of_box(20., 20., 22., 22.)]
+    array = box.BoxArray.of_boxes(boxes)
+    assert len(array) == 3
+    assert array.to_boxes() == boxes
+    assert array.width.tolist() == [b.width for b in boxes]
+    assert array.height.tolist() == [b.height for b in boxes]
+    assert array.area.tolist() == [b.area for b in boxes]
+    assert [tuple(c) for c in array.center.tolist()] == [b.center for b in boxes]
+    assert array[1:] == box.BoxArray.of_boxes(boxes[1:])
+    assert len(box.BoxArray()) == 0
+
+    other = box.BoxArray([[1., 1., 11., 11.], [0., 0., 10., 10.], [0., 0., 1., 1.]])
+    assert array.union(other).to_boxes() == [box.union(b1, b2) for b1, b2 in zip(boxes, other.to_boxes())]
+    assert array.intersection(other)[:2].to_boxes() == \
+        [box.intersection(b1, b2) for b1, b2 in zip(boxes[:2], other.to_boxes()[:2])]
+    assert array.intersection(other).area[2] == 0
+    assert array.union_areas(other)[:2].tolist() == \
+        [box.union_areas(b1, b2) for b1, b2 in zip(boxes[:2], other.to_boxes()[:2])]
+    ious = array.intersection_over_union(other)
+    for iou, b1, b2 in zip(ious, boxes, other.to_boxes()):
+        assert math.isclose(iou, box.intersection_over_union(b1, b2), rel_tol=1e-12)
+    assert np.array_equal(array.pairwise_intersection_over_union(other)[np.arange(3), np.arange(3)], ious)
+
+    with pytest.raises(AssertionError):
+        box.BoxArray([[1., 0., 0., 1.]]).verify()
+
+
 def test_union():
     box1 = Box.of_box(0., 0., 10., 10.)
     box2 = Box.of_box(1., 1., 11., 11.)
@@ -42,3 +85,70 @@ def test_box():
 
     with pytest.raises(AssertionError):
         Box.of_box(0., 0., -1, 10.)
+
+
+def test_sort_and_sweep_index():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 100, (300, 2))
+    boxes = np.concatenate((xy, xy + rng.uniform(0, 20, (300, 2))), axis=1)
+    xy = rng.uniform(0, 100, (200, 2))
+    queries = np.concatenate((xy, xy + rng.uniform(0, 20, (200, 2))), axis=1)
+    index = box.SortAndSweepIndex(boxes)
+    assert len(index) == 300
+
+    xtl = np.maximum(queries[:, None, 0], boxes[None, :, 0])
+    ytl = np.maximum(queries[:, None, 1], boxes[None, :, 1])
+    xbr = np.minimum(queries[:, None, 2], boxes[None, :, 2])
+    ybr = np.minimum(queries[:, None, 3], boxes[None, :, 3])
+    expected = np.nonzero((xbr > xtl) & (ybr > ytl))
+    for max_pairs in (1, 100, 1 << 22):
+        pair_query, pair_box = index.query_pairs(queries, max_pairs)
+        assert np.array_equal(pair_query, expected[0])
+        assert np.array_equal(pair_box, expected[1])
+    assert np.array_equal(index.query(queries[0]), expected[1][expected[0] == 0])
+
+    assert len(box.SortAndSweepIndex(np.zeros((0, 4))).query([0, 0, 1, 1])) == 0
+
+
+def test_contains_points():
+    rng = np.random.default_rng(0)
+    xy = rng.integers(0, 20, (50, 2))
+    boxes = np.concatenate((xy, xy + rng.integers(0, 8, (50, 2))), axis=1).astype(float)
+    boxes[0] = [-np.inf, -np.inf, np.inf, np.inf]
+    points = rng.integers(-2, 30, (300, 2)).astype(float)
+    points[0] = [np.nan, 1]
+    expected = np.array([[tuple(p) in Box.of_box(*b) for p in points] for b in boxes])
+
+    assert np.array_equal(box.contains_points(boxes, points), expected)
+    assert np.array_equal(box.contains_points(box.BoxArray(boxes), points), expected)
+    for max_pairs in (1, 100, 1 << 22):
+        pair_box, pair_point = box.contains_points(boxes, points, sparse=True, max_pairs=max_pairs)
+        assert np.array_equal(pair_box, np.nonzero(expected)[0])
+        assert np.array_equal(pair_point, np.nonzero(expected)[1])
+
+    pair_box, pair_point = box.contains_points(np.zeros((0, 4)), points, sparse=True)
+    assert len(pair_box) == len(pair_point) == 0
+    assert box.contains_points(boxes, np.zeros((0, 2))).shape == (50, 0)
+
+
+def test_convert_boxes():
+    xyxy = np.array([[10, 20, 30, 60], [0, 0, 5, 5]])
+    xywh = box.convert_boxes(xyxy, box.BBFormat.X1Y1X2Y2, box.BBFormat.XYWH)
+    assert xywh.tolist() == [[10, 20, 20, 40], [0, 0, 5, 5]]
+    assert xywh.dtype.kind == 'i'
+    assert box.convert_boxes(xywh, box.BBFormat.XYWH).tolist() == xyxy.tolist()
+    assert box.convert_boxes(xyxy, box.BBFormat.X1Y1X2Y2, box.BBFormat.CXCYWH).tolist() == \
+        [[20, 40, 20, 40], [2.5, 2.5, 5, 5]]
+
+    # normalized by the size of the image of each box
+    width = np.array([100, 50])
+    height = np.array([200, 10])
+    image = np.array([1, 0])
+    normalized = box.convert_boxes(xyxy, box.BBFormat.X1Y1X2Y2, box.BBFormat.CXCYWH_NORMALIZED, width, height, image)
+    assert np.allclose(normalized, [[.4, 4, .4, 4], [.025, .0125, .05, .025]])
+    for fmt in box.BBFormat:
+        converted = box.convert_boxes(xyxy, box.BBFormat.X1Y1X2Y2, fmt, width, height, image)
+        assert np.allclose(box.convert_boxes(converted, fmt, box.BBFormat.X1Y1X2Y2, width, height, image), xyxy)
+
+    with pytest.raises(ValueError):
+        box.convert_boxes(xyxy, box.BBFormat.XYWH_NORMALIZED)
@@ -1,3 +1,6 @@
+import copy
+import pickle
+
 import pytest
 
 from podm import coco, coco_decoder
@@ -149,6 +152,244 @@ def test_gets(dataset):
     assert 2 in ann_ids
 
 
+def test_indexed_list(dataset):
+    images = dataset.images
+    assert isinstance(images, coco.IndexedList)
+    assert images.find('id', 3) == [images[3]]
+    assert images.find('file_name', '-1') == []
+
+    # the index follows the list operations
+    img = images.pop(3)
+    assert dataset.get_image(id=3) is None
+    images.insert(0, img)
+    assert dataset.get_image(file_name='3') is img
+    images[0] = images[1]
+    assert dataset.get_image(id=3) is None
+    with pytest.raises(KeyError):
+        dataset.get_image(id=images[1].id)
+    del images[0]
+    assert dataset.get_image(id=images[0].id) is images[0]
+    images[2:4] = [img]
+    assert dataset.get_image(id=3) is img
+    images.remove(img)
+    assert dataset.get_image(id=3) is None
+
+    # assigned lists are indexed, copies keep their index
+    dataset.annotations = list(dataset.annotations)
+    assert dataset.get_annotation(id=5).id == 5
+    new_dataset = copy.deepcopy(dataset)
+    assert new_dataset.get_annotation(id=5) is new_dataset.annotations[5]
+    new_dataset.annotations.clear()
+    assert new_dataset.get_annotation(id=5) is None
+    assert dataset.get_annotation(id=5) is dataset.annotations[5]
+
+
+def test_get_new_dataset(dataset):
+    annotations = [coco.PCOCOBoundingBox.of_values(i, 0, 0, 0, 0, 1, 1) for i in range(3)]
+    new_dataset = dataset.get_new_dataset(annotations)
+    # the metadata is shared
+    assert new_dataset.images is not dataset.images
+    assert new_dataset.get_image(id=3) is dataset.get_image(id=3)
+    assert new_dataset.images._index is dataset.images._index
+    assert [ann.id for ann in new_dataset.annotations] == [0, 1, 2]
+
+    # and copied on write
+    img = coco.PCOCOImage()
+    img.id, img.file_name = -1, '-1'
+    new_dataset.add_image(img)
+    assert new_dataset.get_image(id=-1) is img
+    assert dataset.get_image(id=-1) is None
+    dataset.images.pop(3)
+    assert dataset.get_image(id=3) is None
+    assert new_dataset.get_image(id=3).id == 3
+    new_dataset.info.description = 'new'
+    assert dataset.info.description != 'new'
+
+
+def test_inverted_indexes(dataset):
+    for i in range(10, 20):
+        dataset.add_annotation(coco.PCOCOBoundingBox.of_values(i, i % 3, i % 2, 0, 0, 1, 1))
+    assert dataset.annotations.find_count('image_id', 1) == 5
+    assert sorted(dataset.annotations.find_related('category_id', 1, 'image_id')) == [0, 1, 2]
+
+    assert sorted(dataset.get_annotation_ids(image_ids=[1])) == [1, 10, 13, 16, 19]
+    assert sorted(dataset.get_annotation_ids(image_ids=[1, 2], category_ids=[0])) == [10, 14, 16]
+    assert sorted(dataset.get_image_ids(category_ids=[0, 1])) == [0, 1, 2]
+    assert sorted(dataset.get_image_ids(category_ids=[0, 2])) == [2]
+    assert sorted(dataset.get_image_ids()) == list(range(10))
+
+    # removed annotations leave the indexes
+    dataset.annotations.remove(dataset.get_annotation(14))
+    dataset.annotations.remove(dataset.get_annotation(2))
+    assert sorted(dataset.get_image_ids(category_ids=[0, 2])) == []
+    assert sorted(dataset.get_annotation_ids(image_ids=[1, 2], category_ids=[0])) == [10, 16]
+    # results are in list order, not in the order of the ids
+    assert [ann.id for ann in dataset.get_annotations([16, 10, -1])] == [10, 16]
+    assert dataset.get_annotation_ids(image_ids=[2, 1], category_ids=[0]) == [10, 16]
+    last = dataset.annotations.pop()
+    dataset.annotations.insert(0, last)
+    assert [ann.id for ann in dataset.get_annotations([16, 10, last.id])] == [last.id, 10, 16]
+    dataset.annotations.reverse()
+    assert [ann.id for ann in dataset.get_annotations([16, 10, last.id])] == [16, 10, last.id]
+    assert [cat.id for cat in dataset.get_categories([2, 0])] == [cat.id for cat in dataset.categories
+                                                                  if cat.id in (0, 2)]
+
+
+def test_bulk_add(dataset):
+    n = len(dataset.annotations)
+    annotations = [coco.PCOCOBoundingBox.of_values(i, 0, 0, 0, 0, 1, 1) for i in (1, 20, 20, 21)]
+    with pytest.raises(KeyError, match=r"\{'id': \[1, 20\]\}"):
+        dataset.add_annotations(annotations)
+    # nothing is added on a conflict
+    assert len(dataset.annotations) == n
+
+    dataset.add_annotations(annotations, assign_ids=True)
+    assert [ann.id for ann in annotations] == list(range(n, n + 4))
+    assert dataset.get_annotation(n + 3) is annotations[3]
+
+    categories = []
+    for name in ('x', 'y'):
+        category = coco.PCOCOCategory()
+        category.name = name
+        categories.append(category)
+    dataset.add_categories(categories, assign_ids=True)
+    assert dataset.get_category(name='y').id == max(cat.id for cat in dataset.categories)
+    with pytest.raises(KeyError, match='name'):
+        dataset.add_categories(categories[:1], assign_ids=True)
+
+    images = []
+    for file_name in ('a.jpg', 'b.jpg'):
+        image = coco.PCOCOImage()
+        image.file_name = file_name
+        images.append(image)
+    dataset = coco.PCOCOObjectDetectionDataset()
+    dataset.add_images(images, assign_ids=True)
+    assert [img.id for img in dataset.images] == [0, 1]
+
+
+def test_view(dataset):
+    dataset.annotations[3].score = .9
+    dataset.annotations[4].score = .1
+    view = dataset.view(image_ids=[2, 3, 4, 5], supercategory_names=['s3', 's4', 's5'])
+    assert view.get_annotation_ids() == [3, 4, 5]
+    assert [img.id for img in view.images] == [2, 3, 4, 5]
+    assert [cat.id for cat in view.categories] == [3, 4, 5]
+    assert view.get_image(id=1) is None
+    assert view.get_annotation(3) is dataset.get_annotation(3)
+    # views compose
+    narrower = view.view(category_ids=[4, 5, 6], score_range=(0, .5))
+    assert [ann.id for ann in narrower.annotations] == [4]
+    assert [cat.id for cat in narrower.categories] == [4, 5]
+    assert view.view(area_range=(0, 10)).annotations == []
+    assert view.view(iscrowd=False).view(iscrowd=True).annotations == []
+
+    new_dataset = narrower.materialize()
+    assert isinstance(new_dataset, coco.PCOCOObjectDetectionDataset)
+    assert new_dataset.get_annotation_ids() == [4]
+    assert len(new_dataset.images) == 4
+    # the dataset is not changed
+    assert len(dataset.annotations) == len(dataset.images) == 10
+
+
+def test_annotation_store(dataset):
+    annotations = list(dataset.annotations) + [
+        coco.PCOCOSegments.of_values(10, 1, 2, [[0, 0, 4, 0, 0, 3]], iscrowd=True, score=.5, attributes={'a': 1}),
+        coco.PCOCOSegments.of_values(11, 1, 3, {'size': [4, 3], 'counts': [5, 2, 5]}, contributor='x')]
+    store = coco.AnnotationStore.of_annotations(annotations)
+    assert len(store) == 12
+    assert store.xyxy.shape == (12, 4)
+    assert store.polygon_offsets.tolist() == [0] * 11 + [1, 1]
+
+    # rows are proxies of the annotations
+    ann = store[3]
+    assert isinstance(ann, coco.PCOCOBoundingBox)
+    assert (ann.id, ann.image_id, ann.category_id, ann.score) == (3, 3, 3, None)
+    assert ann == Box.of_box(0, 0, 10, 10)
+    with pytest.raises(AttributeError):
+        ann.id = 5
+    segments = store[-2]
+    assert isinstance(segments, coco.PCOCOSegments)
+    assert segments.segmentation == [[0, 0, 4, 0, 0, 3]]
+    assert (segments.score, segments.iscrowd, segments.area, segments.attributes) == (.5, True, 6, {'a': 1})
+    assert segments.bbox == Box.of_box(0, 0, 4, 3)
+    assert (1, 1) in segments
+    assert store[11].segmentation == annotations[11].segmentation
+    assert store[11].contributor == 'x'
+    assert [ann.id for ann in store[9:11]] == [9, 10]
+    # reading the attributes does not change the store
+    assert store[0].attributes == {}
+    assert 0 not in store.attributes
+
+    # copies and pickles of the rows are plain annotations
+    for row, cls in ((store[3], coco.PCOCOBoundingBox), (segments, coco.PCOCOSegments)):
+        for other in (copy.copy(row), copy.deepcopy(row), pickle.loads(pickle.dumps(row))):
+            assert type(other) is cls
+            assert (other.id, other.image_id, other.category_id, other.score, other.attributes) == \
+                   (row.id, row.image_id, row.category_id, row.score, row.attributes)
+    assert copy.copy(store[3]) == store[3]
+    other = copy.deepcopy(segments)
+    assert other.bbox == segments.bbox
+    assert (other.segmentation, other.iscrowd, other.area) == (segments.segmentation, True, 6)
+    other.attributes['b'] = 2
+    assert segments.attributes == {'a': 1}
+
+    # a dataset with the store has the same queries
+    columnar = coco.PCOCOObjectDetectionDataset(columnar=True)
+    columnar.images = dataset.images
+    columnar.categories = dataset.categories
+    columnar.add_annotations(annotations)
+    dataset.add_annotations(annotations[10:])
+    assert isinstance(columnar.annotations, coco.AnnotationStore)
+    assert columnar.get_annotation(10).category_id == 2
+    assert columnar.get_annotation(12) is None
+    assert sorted(columnar.get_annotation_ids(image_ids=[1])) == sorted(dataset.get_annotation_ids(image_ids=[1]))
+    assert sorted(columnar.get_image_ids(category_ids=[1, 2])) == sorted(dataset.get_image_ids(category_ids=[1, 2]))
+    assert columnar.get_annotation_ids(area_range=(1, 10)) == [10, 11]
+    assert [ann.id for ann in columnar.view(iscrowd=True).annotations] == [10]
+    with pytest.raises(KeyError):
+        columnar.add_annotation(coco.PCOCOBoundingBox.of_values(3, 0, 0, 0, 0, 1, 1))
+    new_annotations = [coco.PCOCOBoundingBox.of_values(None, 0, 0, 0, 0, 1, 1)]
+    columnar.add_annotations(new_annotations, assign_ids=True)
+    assert columnar.annotations[-1].id == 12
+    # the ids are given to the rows, so the rows of a store can be added again
+    columnar.add_annotations(columnar.annotations[:2], assign_ids=True)
+    assert [ann.id for ann in columnar.annotations[-3:]] == [12, 13, 14]
+    assert [ann.image_id for ann in columnar.annotations[-2:]] == [0, 1]
+    assert columnar.get_annotation(14).image_id == 1
+    assert new_annotations[0].id is None
+    assert isinstance(columnar.get_new_dataset(columnar.annotations[:2]).annotations, coco.AnnotationStore)
+
+
+def test_annotation_store_appends():
+    store = coco.AnnotationStore()
+    assert store.find_count('category_id', 0) == 0
+    annotations = []
+    for i in range(30):
+        ann = coco.PCOCOBoundingBox.of_values(i, i % 4, i % 3, i, 0, i + 1, 1)
+        store.append(ann)
+        annotations.append(ann)
+        # the lookups between the appends find every row, in insertion order
+        assert [a.id for a in store.find('image_id', i % 4)] == [a.id for a in annotations if a.image_id == i % 4]
+        assert store.find_count('id', i) == 1
+        if i % 7 == 0:
+            # reading a column takes in the appended rows
+            assert store.id.tolist() == list(range(i + 1))
+    assert len(store) == 30
+    assert store[-1] == annotations[-1]
+    store.extend(coco.AnnotationStore.of_annotations(annotations[:5]))
+    assert [a.id for a in store.find('id', 3)] == [3, 3]
+    assert store.xyxy[33].tolist() == [3, 0, 4, 1]
+
+    # the sorted copies are updated in place, as if they were built from the columns
+    rebuilt = coco.AnnotationStore.of_annotations(list(store))
+    for key in store.keys:
+        assert store._get_index(key)[0].tolist() == rebuilt._get_index(key)[0].tolist()
+
+    with pytest.raises(TypeError):
+        store.append(coco.PCOCOBoundingBox.of_values(None, 0, 0, 0, 0, 1, 1))
+    assert len(store) == 35
+
+
 def test_segments():
     segments = coco.PCOCOSegments()
     segments.add_box(Box.of_box(0, 0, 10, 10))
@@ -160,3 +401,70 @@ def test_segments():
 
     segments = coco.PCOCOSegments()
     assert segments.bbox is None
+
+
+def test_segments_cache():
+    segments = coco.PCOCOSegments.of_values(1, 2, 3, [Box.of_box(0, 0, 10, 10).segment])
+    polygons = segments.polygons
+    assert segments.polygons is polygons
+    assert (5, 5) in segments
+    assert (15, 15) not in segments
+    # points on the boundary are outside
+    assert (10, 5) not in segments
+
+    segments.add_box(Box.of_box(10, 10, 20, 20))
+    assert segments.polygons is not polygons
+    assert (15, 15) in segments
+    assert segments.bbox == Box.of_box(0, 0, 20, 20)
+
+    segments.segmentation = [Box.of_box(30, 30, 40, 40).segment]
+    assert (5, 5) not in segments
+    assert segments.bbox == Box.of_box(30, 30, 40, 40)
+
+
+def test_segmentation_bboxes():
+    segmentations = [[[0, 0, 4, 0, 0, 3]], [], [[0, 0, 10, 0, 10, 10, 0, 10], [20, 20, 30, 20, 30, 30]],
+                     {'size': [4, 3], 'counts': [5, 2, 5]}]
+    bboxes, areas = coco.segmentation_bboxes(segmentations)
+    assert bboxes == [Box.of_box(0, 0, 4, 3), None, Box.of_box(0, 0, 30, 30), Box.of_box(1, 1, 2, 3)]
+    assert areas == [6, 0, 150, 2]
+
+    segments = coco.PCOCOSegments()
+    assert segments.area == 0
+    segments.add_segmentation(segmentations[0][0])
+    assert segments.area == 6
+    segments.add_box(Box.of_box(10, 10, 12, 12))
+    assert segments.area == 10
+    assert segments.bbox == Box.of_box(0, 0, 12, 12)
+
+    dataset = coco.PCOCOObjectDetectionDataset()
+    for i, segmentation in enumerate(segmentations):
+        dataset.add_annotation(coco.PCOCOSegments.of_values(i, 0, 0, segmentation))
+    assert dataset.get_annotation_ids(area_range=(1, 10)) == [0, 3]
+
+
+def test_slots():
+    ann = coco.PCOCOBoundingBox()
+    assert not hasattr(ann, '__dict__')
+    with pytest.raises(AttributeError):
+        ann.foo = 1
+    # created on the first access
+    assert ann._attributes is None
+    ann.attributes['ID'] = 1
+    assert ann.attributes == {'ID': 1}
+
+    img = coco.PCOCOImage()
+    assert img._date_captured is None
+    assert len(img.date_captured) == 10
+    img.date_captured = '01/01/2022'
+    assert img.date_captured == '01/01/2022'
+
+    ann = coco.PCOCOBoundingBox.of_values(1, 2, 3, 0, 0, 10, 10, score=.5)
+    assert (ann.id, ann.image_id, ann.category_id, ann.score, ann.contributor) == (1, 2, 3, .5, '')
+    assert ann == Box.of_box(0, 0, 10, 10)
+    assert ann.attributes == {}
+
+    ann = coco.PCOCOSegments.of_values(1, 2, 3, [[0, 0, 0, 10, 10, 10]], attributes={'ID': 1})
+    assert ann.bbox == Box.of_box(0, 0, 10, 10)
+    assert ann.attributes == {'ID': 1}
+    assert not ann.iscrowd
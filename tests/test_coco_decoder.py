@@ -1,4 +1,5 @@
-from podm import coco_decoder
+from podm import coco_decoder, coco_encoder
+from podm.coco import AnnotationStore
 
 
 def test_load_true(sample_dir):
@@ -25,6 +26,24 @@ def test_load_pred(sample_dir):
     assert len(pred_dataset.annotations) == 494
 
 
+def test_load_columnar(sample_dir):
+    with open(sample_dir / 'groundtruths_coco.json') as fp:
+        gold_dataset = coco_decoder.load_true_object_detection_dataset(fp, columnar=True)
+    with open(sample_dir / 'detections_coco.json') as fp:
+        pred_dataset = coco_decoder.load_pred_object_detection_dataset(fp, gold_dataset, columnar=True)
+
+    assert isinstance(gold_dataset.annotations, AnnotationStore)
+    assert len(gold_dataset.annotations) == 686
+    assert len(pred_dataset.images) == 85
+    assert len(pred_dataset.annotations) == 494
+    assert coco_encoder.toJSON(gold_dataset) == coco_encoder.toJSON(_load(sample_dir / 'groundtruths_coco.json'))
+
+
+def _load(path):
+    with open(path) as fp:
+        return coco_decoder.load_true_object_detection_dataset(fp)
+
+
 # def test_sample3(tests_dir):
 #     with open(tests_dir / 'sample_3/groundtruths_coco.json') as fp:
 #         dataset = pcoco_decoder.load_true_bounding_box_dataset(fp)
@@ -1,4 +1,5 @@
 import io
+import json
 
 import pytest
 
@@ -61,3 +62,21 @@ def test_loads(dataset):
     assert len(dataset.annotations) == 10
     assert len(dataset.licenses) == 2
 
+
+def test_round_trip(sample_dir):
+    with open(sample_dir / 'groundtruths_coco.json') as fp:
+        expected = json.load(fp)
+    dataset = coco_decoder.load_true_object_detection_dataset(io.StringIO(json.dumps(expected)))
+    actual = json.loads(coco_encoder.dumps(dataset))
+    # compare the text, so that integers do not become floats
+    for key in ('images', 'categories'):
+        assert json.dumps(actual[key], sort_keys=True) == json.dumps(expected[key], sort_keys=True)
+    for ann, expected_ann in zip(actual['annotations'], expected['annotations']):
+        ann = {key: ann[key] for key in expected_ann}
+        assert json.dumps(ann, sort_keys=True) == json.dumps(expected_ann, sort_keys=True)
+
+    # the area is the one of the bbox, as in the dataset files
+    triangle = coco.PCOCOSegments.of_values(0, 0, 0, [[0, 0, 4, 0, 0, 3]])
+    ann = coco_encoder.toJSON(triangle)
+    assert json.dumps(ann['bbox']) == '[0, 0, 4, 3]'
+    assert json.dumps(ann['area']) == '12'
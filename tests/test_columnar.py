@@ -0,0 +1,62 @@
+import numpy as np
+
+from podm.columnar import EvaluationIndex, greedy_assign, match_category
+
+
+def test_evaluation_index():
+    image = [1, 0, 1, 0, 2, 1]
+    category = [0, 1, 0, 0, 1, 0]
+    score = [.5, .9, .7, .5, .1, .5]
+    xyxy = np.arange(24).reshape(6, 4)
+    index = EvaluationIndex(image, category, xyxy, score)
+
+    assert len(index) == 6
+    assert index.categories.tolist() == [0, 1]
+    assert index.order.tolist() == [3, 2, 0, 5, 1, 4]
+    assert np.array_equal(index.xyxy, xyxy[index.order])
+
+    sl = index.category_slice(0)
+    assert index.order[sl].tolist() == [3, 2, 0, 5]
+    assert index.category_slice(5) == slice(0, 0)
+
+    images, starts, ends = index.image_slices(0)
+    assert images.tolist() == [0, 1]
+    assert [index.order[s:e].tolist() for s, e in zip(starts, ends)] == [[3], [2, 0, 5]]
+    assert len(index.image_slices(5)[0]) == 0
+
+    # ties keep the input order
+    assert index.score_order(0).tolist() == [2, 0, 3, 5]
+    assert index.score_order(1).tolist() == [1, 4]
+
+
+def test_evaluation_index_empty():
+    index = EvaluationIndex([], [], np.zeros((0, 4)))
+    assert len(index) == 0
+    assert len(index.categories) == 0
+    assert index.category_slice(0) == slice(0, 0)
+    assert len(index.score_order(0)) == 0
+
+
+def test_greedy_assign():
+    best_gt = np.array([0, 0, -1, 1, 2])
+    best_iou = np.array([.6, .9, 0, .4, .8])
+    assert greedy_assign(best_gt, best_iou, .5).tolist() == [1, 0, 0, 0, 1]
+    assert greedy_assign(best_gt, best_iou, .3).tolist() == [1, 0, 0, 1, 1]
+
+
+def test_match_category():
+    gold_xyxy = [[0, 0, 10, 10], [0, 0, 10, 10], [20, 20, 30, 30]]
+    pred_xyxy = [[1, 1, 11, 11], [20, 20, 30, 30], [20, 20, 30, 30]]
+    gold = EvaluationIndex([0, 1, 0], [0, 0, 0], gold_xyxy)
+    pred = EvaluationIndex([0, 1, 0], [0, 0, 1], pred_xyxy, [.5, .9, .7])
+    preds, best_gt, best_iou, npos = match_category(gold, pred, 0)
+    assert preds.tolist() == [1, 0]
+    assert best_gt.tolist() == [-1, 0]
+    assert np.isclose(best_iou[1], 0.680672268908)
+    assert npos == 3
+    assert greedy_assign(best_gt, best_iou, .5).tolist() == [0, 1]
+
+    preds, best_gt, _, npos = match_category(gold, pred, 1)
+    assert preds.tolist() == [2]
+    assert best_gt.tolist() == [-1]
+    assert npos == 0
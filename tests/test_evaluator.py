@@ -0,0 +1,105 @@
+from collections import defaultdict
+
+import pytest
+
+from helpers.utils import assert_same_results
+from podm import coco_decoder
+from podm.evaluator import StreamingEvaluator
+from podm.metrics import get_pascal_voc_metrics, get_bounding_boxes, BoundingBox
+
+
+def _get_bounding_boxes_helper(sample_dir):
+    with open(sample_dir / 'groundtruths_coco.json') as fp:
+        gold_dataset = coco_decoder.load_true_object_detection_dataset(fp)
+    with open(sample_dir / 'detections_coco.json') as fp:
+        pred_dataset = coco_decoder.load_pred_object_detection_dataset(fp, gold_dataset)
+    return get_bounding_boxes(gold_dataset), get_bounding_boxes(pred_dataset)
+
+
+@pytest.mark.parametrize('sample', ['sample', 'sample_3'])
+@pytest.mark.parametrize('batch_size', [1, 7])
+def test_streaming_evaluator(tests_dir, sample, batch_size):
+    golds, preds = _get_bounding_boxes_helper(tests_dir / sample)
+    image_golds = defaultdict(list)
+    image_preds = defaultdict(list)
+    for b in golds:
+        image_golds[b.image].append(b)
+    for b in preds:
+        image_preds[b.image].append(b)
+    images = list(image_golds.keys() | image_preds.keys())
+
+    evaluator = StreamingEvaluator(.5)
+    streamed_golds = []
+    streamed_preds = []
+    for i in range(0, len(images), batch_size):
+        batch_golds = [b for image in images[i:i + batch_size] for b in image_golds[image]]
+        batch_preds = [b for image in images[i:i + batch_size] for b in image_preds[image]]
+        evaluator.update(batch_preds, batch_golds)
+        streamed_golds += batch_golds
+        streamed_preds += batch_preds
+
+        if i == 0:
+            assert_same_results(get_pascal_voc_metrics(streamed_golds, streamed_preds, .5), evaluator.compute())
+    assert_same_results(get_pascal_voc_metrics(streamed_golds, streamed_preds, .5), evaluator.compute())
+
+    evaluator.reset()
+    assert evaluator.compute() == {}
+
+
+def test_streaming_evaluator_update():
+    evaluator = StreamingEvaluator(.5)
+    evaluator.update([BoundingBox.of_bbox('a', 'cat', 0, 0, 10, 10, .9),
+                      BoundingBox.of_bbox('a', 'cat', 0, 0, 10, 10, .8)],
+                     [BoundingBox.of_bbox('a', 'cat', 0, 0, 10, 10)])
+    evaluator.update([BoundingBox.of_bbox('b', 'dog', 0, 0, 10, 10, .7)],
+                     [BoundingBox.of_bbox('b', 'cat', 0, 0, 10, 10)])
+    results = evaluator.compute()
+    assert list(results.keys()) == ['cat', 'dog']
+    assert results['cat'].tp == 1
+    assert results['cat'].fp == 1
+    assert results['cat'].num_groundtruth == 2
+    assert results['dog'].fp == 1
+    assert results['dog'].num_groundtruth == 0
+
+
+def test_merge_and_save(sample_dir, tmp_path):
+    golds, preds = _get_bounding_boxes_helper(sample_dir)
+    images = sorted(set(b.image for b in golds + preds))
+
+    # three shards of disjoint images
+    shards = [images[0::3], images[1::3], images[2::3]]
+    shard_golds = [[b for b in golds if b.image in set(shard)] for shard in shards]
+    shard_preds = [[b for b in preds if b.image in set(shard)] for shard in shards]
+    for i in range(3):
+        evaluator = StreamingEvaluator(.5)
+        evaluator.update(shard_preds[i], shard_golds[i])
+        evaluator.save(tmp_path / ('shard%d.npz' % i))
+
+    evaluators = [StreamingEvaluator.load(tmp_path / ('shard%d.npz' % i)) for i in range(3)]
+    expecteds = get_pascal_voc_metrics(sum(shard_golds, []), sum(shard_preds, []), .5)
+    assert_same_results(expecteds, evaluators[0].merge(evaluators[1]).merge(evaluators[2]).compute())
+    assert_same_results(expecteds, evaluators[0].merge(evaluators[1].merge(evaluators[2])).compute())
+
+
+def test_save_labels(tmp_path):
+    labels = [('animal', 'cat'), ('animal', 'dog'), 3]
+    evaluator = StreamingEvaluator(.5)
+    evaluator.update_array([0], [0], [[0, 0, 10, 10]], [0, 0], [0, 1], [.9, .8], [[0, 0, 10, 10], [0, 0, 5, 5]],
+                           category_labels=labels)
+    evaluator.save(tmp_path / 'tuple.npz')
+    loaded = StreamingEvaluator.load(tmp_path / 'tuple.npz')
+    assert sorted(loaded.labels, key=str) == sorted(evaluator.labels, key=str)
+    # the loaded evaluator merges with one that has the original labels
+    merged = loaded.merge(evaluator).compute()
+    assert merged[('animal', 'cat')].tp == 2
+    assert merged[('animal', 'dog')].fp == 2
+
+    evaluator = StreamingEvaluator(.5)
+    evaluator.update_array([0], [0], [[0, 0, 10, 10]], [], [], [], [], category_labels=[frozenset('a')])
+    with pytest.raises(TypeError):
+        evaluator.save(tmp_path / 'frozenset.npz')
+
+
+def test_merge_settings():
+    with pytest.raises(ValueError):
+        StreamingEvaluator(.5).merge(StreamingEvaluator(.75))
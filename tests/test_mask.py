@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from pycocotools import mask as mu
+
+from podm import coco_decoder, mask
+from podm.coco import PCOCOObjectDetectionDataset, PCOCOImage, PCOCOCategory, PCOCOSegments
+from podm.metrics import get_segmentation_metrics, get_pascal_voc_metrics, get_bounding_boxes
+
+
+def _random_polygons(rng, height, width, n):
+    polygons = []
+    for _ in range(n):
+        center = rng.uniform(0, [width, height])
+        radius = rng.uniform(1, 20)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, rng.integers(3, 8)))
+        points = np.stack((center[0] + radius * np.cos(angles), center[1] + radius * np.sin(angles)), axis=1)
+        polygons.append([points.reshape(-1).tolist()])
+    return polygons
+
+
+def test_polygon_to_rle():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        height, width = (int(v) for v in rng.integers(1, 60, 2))
+        polygons = [rng.uniform(-5, max(width, height) + 5, 2 * rng.integers(3, 9)).tolist()
+                    for _ in range(rng.integers(1, 3))]
+        expected = mu.merge(mu.frPyObjects(polygons, height, width))
+        actual = mask.segmentation_to_rle(polygons, height, width)
+        assert np.array_equal(actual.to_mask(), mu.decode(expected).astype(bool))
+        assert actual.area == mu.area(expected)
+        if actual.area > 0:
+            xtl, ytl, xbr, ybr = actual.bbox
+            assert np.array_equal([xtl, ytl, xbr - xtl, ybr - ytl], mu.toBbox(expected))
+        else:
+            assert actual.bbox is None
+        # compressed counts
+        assert mask.segmentation_to_rle({'size': [height, width], 'counts': expected['counts']}, 0, 0) == actual
+        # uncompressed counts
+        assert mask.segmentation_to_rle({'size': [height, width], 'counts': actual.counts.tolist()}, 0, 0) == actual
+
+
+def test_rle():
+    rle = mask.RLE.of_counts([2, 3, 4, 1], 5, 2)
+    assert rle.area == 4
+    assert np.array_equal(rle.starts, [2, 9])
+    assert np.array_equal(rle.ends, [5, 10])
+    assert np.array_equal(rle.counts, [2, 3, 4, 1])
+    assert rle.to_mask().shape == (5, 2)
+    assert mask.merge([rle, mask.RLE(5, 2, [4], [7])], 5, 2) == mask.RLE(5, 2, [2, 9], [7, 10])
+
+
+def test_pairwise_iou():
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        height, width = (int(v) for v in rng.integers(5, 80, 2))
+        dts = _random_polygons(rng, height, width, rng.integers(0, 6))
+        gts = _random_polygons(rng, height, width, rng.integers(0, 6))
+        iscrowd = rng.integers(0, 2, len(gts))
+        actual = mask.pairwise_iou([mask.segmentation_to_rle(p, height, width) for p in dts],
+                                   [mask.segmentation_to_rle(p, height, width) for p in gts], iscrowd)
+        assert actual.shape == (len(dts), len(gts))
+        if len(dts) and len(gts):
+            expected = mu.iou([mu.merge(mu.frPyObjects(p, height, width)) for p in dts],
+                              [mu.merge(mu.frPyObjects(p, height, width)) for p in gts], iscrowd.tolist())
+            assert np.allclose(actual, expected)
+
+
+@pytest.mark.parametrize('sample', ['sample', 'sample_3'])
+def test_segmentation_metrics(tests_dir, sample):
+    # the segmentations of the samples are the boxes
+    with open(tests_dir / sample / 'groundtruths_coco.json') as fp:
+        gold_dataset = coco_decoder.load_true_object_detection_dataset(fp)
+    with open(tests_dir / sample / 'detections_coco.json') as fp:
+        pred_dataset = coco_decoder.load_pred_segmentation_dataset(fp, gold_dataset)
+    assert all(isinstance(ann, PCOCOSegments) for ann in pred_dataset.annotations)
+
+    expecteds = get_pascal_voc_metrics(get_bounding_boxes(gold_dataset), get_bounding_boxes(pred_dataset), .5)
+    actuals = get_segmentation_metrics(gold_dataset, pred_dataset, .5)
+    assert list(expecteds) == list(actuals)
+    for label in expecteds:
+        assert np.isclose(expecteds[label].ap, actuals[label].ap, equal_nan=True)
+        assert expecteds[label].tp == actuals[label].tp
+
+
+def test_segmentation_metrics_crowd():
+    def square(id, x, y, size, iscrowd=False, score=None):
+        polygon = [x, y, x + size, y, x + size, y + size, x, y + size]
+        return PCOCOSegments.of_values(id, 0, 1, [polygon], iscrowd=iscrowd, score=score)
+
+    gold_dataset = PCOCOObjectDetectionDataset()
+    image = PCOCOImage()
+    image.id, image.width, image.height = 0, 100, 100
+    gold_dataset.images.append(image)
+    category = PCOCOCategory()
+    category.id, category.name = 1, 'a'
+    gold_dataset.categories.append(category)
+    gold_dataset.annotations = [square(0, 0, 0, 10), square(1, 50, 50, 40, iscrowd=True)]
+    pred_dataset = PCOCOObjectDetectionDataset()
+    pred_dataset.images = gold_dataset.images
+    pred_dataset.categories = gold_dataset.categories
+    # a TP, a detection inside the crowd region, and a FP
+    pred_dataset.annotations = [square(0, 0, 0, 10, score=.9), square(1, 60, 60, 10, score=.8),
+                                square(2, 20, 20, 10, score=.7)]
+
+    result = get_segmentation_metrics(gold_dataset, pred_dataset)['a']
+    assert result.num_groundtruth == 1
+    assert result.num_detection == 2
+    assert result.tp == 1
+    assert result.fp == 1
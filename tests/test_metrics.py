@@ -1,6 +1,7 @@
 import numpy as np
 
-from podm.metrics import calculate_11_points_average_precision, calculate_all_points_average_precision
+from podm.metrics import calculate_11_points_average_precision, calculate_all_points_average_precision, \
+    calculate_101_points_average_precision
 
 
 def test_calculate_11_points_average_precision():
@@ -10,6 +11,8 @@ def test_calculate_11_points_average_precision():
     assert np.allclose(ap, 0.545, rtol=1e-3, equal_nan=True)
     assert np.allclose(r_values, [0, 0, .1, .2, .3, .4, .5, .5, .6, .7, .8, .9, 1], rtol=1e-1)
     assert np.allclose(p_values, [0, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0], rtol=1e-1)
+    assert isinstance(r_values, np.ndarray)
+    assert isinstance(p_values, np.ndarray)
 
 
 def test_calculate_all_points_average_precision():
@@ -18,4 +21,29 @@ def test_calculate_all_points_average_precision():
     ap, r_values, p_values, ii = calculate_all_points_average_precision([recall], [precision])
     assert np.allclose(ap, 0.5, rtol=1e-1, equal_nan=True)
     assert np.allclose(r_values, [0, 0.5], rtol=1e-1)
-    assert np.allclose(p_values, [1, 1], rtol=1e-1)
\ No newline at end of file
+    assert np.allclose(p_values, [1, 1], rtol=1e-1)
+    assert isinstance(r_values, np.ndarray)
+    assert isinstance(p_values, np.ndarray)
+
+
+def test_calculate_101_points_average_precision():
+    recall = 0.5
+    precision = 1
+    ap, r_values, p_values = calculate_101_points_average_precision([recall], [precision])
+    assert np.allclose(ap, 51 / 101, rtol=1e-6)
+    assert np.allclose(r_values, np.linspace(0, 1, 101))
+    assert np.allclose(p_values, [1] * 51 + [0] * 50)
+
+    # the precision at r is the maximum precision whose recall is above r
+    ap, r_values, p_values = calculate_101_points_average_precision([.2, .2, .4, .6], [1, .5, .67, .75])
+    assert np.allclose(p_values[:61], [1] * 21 + [.75] * 40)
+    assert np.allclose(p_values[61:], 0)
+
+
+def test_calculate_average_precision_empty():
+    ap, r_values, p_values, ii = calculate_all_points_average_precision(np.zeros(0), np.zeros(0))
+    assert ap == 0
+    ap, r_values, p_values = calculate_11_points_average_precision(np.zeros(0), np.zeros(0))
+    assert ap == 0
+    ap, r_values, p_values = calculate_101_points_average_precision(np.zeros(0), np.zeros(0))
+    assert ap == 0
@@ -0,0 +1,88 @@
+import math
+
+import numpy as np
+import pytest
+
+from podm import box
+from podm.box import Box, BoxArray
+from podm.nms import NMSMethod, filter_detections, non_maximum_suppression, top_k_per_image
+
+
+def _nms(image, category, score, xyxy, iou_threshold, method, sigma=0.5):
+    """
+    Reference NMS, one box at a time.
+    """
+    score = list(score)
+    boxes = [Box.of_box(*b) for b in xyxy.tolist()]
+    kept = []
+    for group in set(zip(image, category)):
+        remaining = [i for i in range(len(score)) if (image[i], category[i]) == group]
+        while remaining:
+            best = max(remaining, key=lambda i: (score[i], -i))
+            remaining.remove(best)
+            kept.append(best)
+            for i in list(remaining):
+                iou = box.intersection_over_union(boxes[best], boxes[i])
+                if method == NMSMethod.Hard:
+                    if iou > iou_threshold:
+                        remaining.remove(i)
+                elif method == NMSMethod.Linear:
+                    if iou > iou_threshold:
+                        score[i] *= 1 - iou
+                else:
+                    score[i] *= math.exp(-iou ** 2 / sigma)
+    kept.sort()
+    return kept, [score[i] for i in kept]
+
+
+def _random_detections(rng, n):
+    image = rng.integers(0, 3, n)
+    category = rng.integers(0, 2, n)
+    score = rng.integers(0, 20, n) / 20
+    xy = rng.uniform(0, 50, (n, 2))
+    xyxy = np.concatenate((xy, xy + rng.uniform(1, 30, (n, 2))), axis=1)
+    return image, category, score, xyxy
+
+
+@pytest.mark.parametrize('method', list(NMSMethod))
+def test_non_maximum_suppression(method):
+    rng = np.random.default_rng(0)
+    image, category, score, xyxy = _random_detections(rng, 300)
+    expected_keep, expected_score = _nms(image, category, score, xyxy, .3, method)
+    keep, kept_score = non_maximum_suppression(image, category, score, xyxy, .3, method)
+    assert keep.tolist() == expected_keep
+    assert np.allclose(kept_score, expected_score)
+
+
+def test_non_maximum_suppression_crowded(monkeypatch):
+    rng = np.random.default_rng(1)
+    image, category, score, xyxy = _random_detections(rng, 300)
+    expected_keep, _ = non_maximum_suppression(image, category, score, xyxy, .3)
+    monkeypatch.setattr('podm.nms.SPATIAL_INDEX_MIN_BOXES', 1)
+    keep, _ = non_maximum_suppression(image, category, score, xyxy, .3)
+    assert np.array_equal(keep, expected_keep)
+    keep, _ = non_maximum_suppression(image, category, score, BoxArray(xyxy), .3, class_aware=False)
+    assert keep.tolist() == _nms(image, np.zeros(300), score, xyxy, .3, NMSMethod.Hard)[0]
+
+
+def test_top_k_per_image():
+    image = [0, 1, 0, 0, 1, 2]
+    score = [.5, .9, .7, .5, .1, .3]
+    assert top_k_per_image(image, score, 2).tolist() == [0, 1, 2, 4, 5]
+    assert top_k_per_image(image, score, 1).tolist() == [1, 2, 5]
+    assert len(top_k_per_image([], [], 1)) == 0
+
+
+def test_filter_detections():
+    image = [0, 0, 0, 1]
+    category = [0, 0, 1, 0]
+    score = [.9, .8, .7, .01]
+    xyxy = [[0, 0, 10, 10], [1, 1, 11, 11], [0, 0, 10, 10], [0, 0, 10, 10]]
+    keep, kept_score = filter_detections(image, category, score, xyxy, score_threshold=.05, iou_threshold=.5)
+    assert keep.tolist() == [0, 2]
+    assert kept_score.tolist() == [.9, .7]
+    keep, _ = filter_detections(image, category, score, xyxy, iou_threshold=.5, max_detections=1)
+    assert keep.tolist() == [0, 3]
+    keep, kept_score = filter_detections(image, category, score, xyxy, iou_threshold=.5, method=NMSMethod.Linear,
+                                         score_threshold=.5)
+    assert keep.tolist() == [0, 2]
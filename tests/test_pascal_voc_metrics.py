@@ -2,9 +2,15 @@ import json
 import math
 from pathlib import Path
 
-from helpers.utils import assert_results
+import numpy as np
+import pytest
+
+from helpers.utils import assert_results, assert_same_results
 from podm import coco_decoder
-from podm.metrics import get_pascal_voc_metrics, MetricPerClass, get_bounding_boxes
+from podm.box import BBFormat, convert_boxes
+from podm.coco import PCOCOBoundingBox
+from podm.metrics import get_pascal_voc_metrics, MetricPerClass, get_bounding_boxes, MethodAveragePrecision, \
+    get_pascal_voc_metrics_array, get_pascal_voc_metrics_sweep, get_pascal_voc_metrics_dataset, get_annotation_columns
 
 
 def _get_dataset_helper(sample_dir):
@@ -50,5 +56,121 @@ def test_sample3(tests_dir):
     assert_results(results, RESULT0_3, 'ap')
 
 
+@pytest.mark.parametrize('sample', ['sample', 'sample_3'])
+@pytest.mark.parametrize('iou_threshold', [.3, .5, .75])
+@pytest.mark.parametrize('method', list(MethodAveragePrecision))
+def test_columnar(tests_dir, sample, iou_threshold, method):
+    gold_dataset, pred_dataset, _ = _get_dataset_helper(tests_dir / sample)
+
+    expecteds = get_pascal_voc_metrics(gold_dataset, pred_dataset, iou_threshold, method)
+    actuals = get_pascal_voc_metrics(gold_dataset, pred_dataset, iou_threshold, method, columnar=True)
+    assert_same_results(expecteds, actuals)
+
+
+@pytest.mark.parametrize('sample', ['sample', 'sample_3'])
+def test_sweep(tests_dir, sample):
+    gold_dataset, pred_dataset, _ = _get_dataset_helper(tests_dir / sample)
+
+    sweep = get_pascal_voc_metrics_sweep(gold_dataset, pred_dataset)
+    assert sweep.ap.shape == (10, len(sweep.labels))
+    for t, results in zip(sweep.iou_thresholds, sweep.results):
+        expecteds = get_pascal_voc_metrics(gold_dataset, pred_dataset, t)
+        assert_same_results(expecteds, results)
+        assert np.allclose([expecteds[label].ap for label in sweep.labels], sweep.ap[sweep.iou_thresholds == t][0],
+                           equal_nan=True)
+    mAPs = [MetricPerClass.mAP(results) for results in sweep.results]
+    assert np.allclose(sweep.mAP_per_threshold, mAPs)
+    assert math.isclose(sweep.mAP, np.average(mAPs))
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_n_jobs(sample_dir, columnar):
+    gold_dataset, pred_dataset, _ = _get_dataset_helper(sample_dir)
+
+    expecteds = get_pascal_voc_metrics(gold_dataset, pred_dataset, .5)
+    actuals = get_pascal_voc_metrics(gold_dataset, pred_dataset, .5, columnar=columnar, n_jobs=2)
+    assert_same_results(expecteds, actuals)
+
+    sweep = get_pascal_voc_metrics_sweep(gold_dataset, pred_dataset, [.5, .75], n_jobs=2)
+    assert_same_results(expecteds, sweep.results[0])
+
+
+@pytest.mark.parametrize('sample', ['sample', 'sample_3'])
+@pytest.mark.parametrize('columnar', [False, True])
+def test_dataset_metrics(tests_dir, sample, columnar):
+    gold_boxes, pred_boxes, _ = _get_dataset_helper(tests_dir / sample)
+    with open(tests_dir / sample / 'groundtruths_coco.json') as fp:
+        gold_dataset = coco_decoder.load_true_object_detection_dataset(fp, columnar=columnar)
+    with open(tests_dir / sample / 'detections_coco.json') as fp:
+        pred_dataset = coco_decoder.load_pred_object_detection_dataset(fp, gold_dataset, columnar=columnar)
+
+    expecteds = get_pascal_voc_metrics(gold_boxes, pred_boxes, .5)
+    actuals = get_pascal_voc_metrics_dataset(gold_dataset, pred_dataset, .5)
+    assert list(expecteds) == list(actuals)
+    assert_same_results(expecteds, actuals)
+    if columnar:
+        # the columns are not copied
+        assert get_annotation_columns(pred_dataset)[3] is pred_dataset.annotations.xyxy
+
+    # the names of the categories are in the ground truth
+    pred_dataset.add_annotation(PCOCOBoundingBox.of_values(-1, gold_dataset.images[0].id, 99, 0, 0, 1, 1, score=.5))
+    with pytest.raises(KeyError, match='99: Category is not in the ground truth'):
+        get_pascal_voc_metrics_dataset(gold_dataset, pred_dataset, .5)
+    assert get_pascal_voc_metrics_dataset(gold_dataset, pred_dataset, .5, use_name=False)[99].fp == 1
+
+
+def test_pascal_voc_metrics_array():
+    gold_xyxy = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [0, 0, 10, 10]])
+    pred_xyxy = np.array([[1, 1, 11, 11], [0, 0, 10, 10], [20, 20, 30, 30], [50, 50, 60, 60]])
+    results = get_pascal_voc_metrics_array([0, 0, 1], [0, 0, 1], gold_xyxy,
+                                           [0, 0, 0, 1], [0, 0, 0, 1], [.9, .8, .7, .6], pred_xyxy,
+                                           category_labels=['a', 'b'])
+    assert list(results.keys()) == ['a', 'b']
+    # both predictions of image 0 hit the first box, only the highest-scored one is a TP
+    assert results['a'].tp == 2
+    assert results['a'].fp == 1
+    assert results['b'].tp == 0
+    assert results['b'].fp == 1
+    assert results['b'].num_groundtruth == 1
+
+
+@pytest.mark.parametrize('sample', ['sample', 'sample_3'])
+def test_spatial_index(tests_dir, sample, monkeypatch):
+    gold_dataset, pred_dataset, _ = _get_dataset_helper(tests_dir / sample)
+
+    expecteds = get_pascal_voc_metrics(gold_dataset, pred_dataset, .5)
+    # every image is matched with a spatial index
+    monkeypatch.setattr('podm.columnar.SPATIAL_INDEX_MIN_BOXES', 1)
+    monkeypatch.setattr('podm.metrics.SPATIAL_INDEX_MIN_BOXES', 1)
+    for columnar in (False, True):
+        actuals = get_pascal_voc_metrics(gold_dataset, pred_dataset, .5, columnar=columnar)
+        assert_same_results(expecteds, actuals)
+
+
+def test_pascal_voc_metrics_array_format():
+    rng = np.random.default_rng(0)
+    width = np.array([640., 320.])
+    height = np.array([480., 240.])
+    gold_image = rng.integers(0, 2, 50)
+    pred_image = rng.integers(0, 2, 80)
+    scale = np.stack((width, height, width, height), axis=1)
+    gold_xyxy = np.sort(rng.uniform(0, 1, (50, 2, 2)), axis=1).reshape(50, 4) * scale[gold_image]
+    pred_xyxy = np.sort(rng.uniform(0, 1, (80, 2, 2)), axis=1).reshape(80, 4) * scale[pred_image]
+    gold_category = rng.integers(0, 3, 50)
+    pred_category = rng.integers(0, 3, 80)
+    pred_score = rng.random(80)
+
+    expecteds = get_pascal_voc_metrics_array(gold_image, gold_category, gold_xyxy,
+                                             pred_image, pred_category, pred_score, pred_xyxy, .1)
+    fmt = BBFormat.CXCYWH_NORMALIZED
+    actuals = get_pascal_voc_metrics_array(
+        gold_image, gold_category, convert_boxes(gold_xyxy, BBFormat.X1Y1X2Y2, fmt, width, height, gold_image),
+        pred_image, pred_category, pred_score,
+        convert_boxes(pred_xyxy, BBFormat.X1Y1X2Y2, fmt, width, height, pred_image),
+        .1, bbox_format=fmt, image_width=width, image_height=height)
+    for label in expecteds:
+        assert np.isclose(expecteds[label].ap, actuals[label].ap, equal_nan=True)
+
+
 if __name__ == '__main__':
     test_sample2(Path(__file__).parent)
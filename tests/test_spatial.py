@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from podm import coco_decoder
+from podm.box import Box
+from podm.spatial import AnnotationIndex, box_contains_points
+
+
+@pytest.fixture
+def dataset(sample_dir):
+    with open(sample_dir / 'groundtruths_coco.json') as fp:
+        return coco_decoder.load_true_object_detection_dataset(fp)
+
+
+def test_contains_points(dataset):
+    index = AnnotationIndex.of_dataset(dataset)
+    rng = np.random.default_rng(0)
+    image_ids = rng.choice([img.id for img in dataset.images], 2000)
+    points = rng.uniform(0, 600, (2000, 2))
+    # points on the edges of the boxes
+    points[:100] = [[ann.xtl, ann.ytl] for ann in (dataset.annotations[i].bbox for i in range(100))]
+    image_ids[:100] = [dataset.annotations[i].image_id for i in range(100)]
+
+    point_positions, annotation_positions = index.contains_points(points, image_ids)
+    expected = [(i, j) for i, (point, image_id) in enumerate(zip(points, image_ids))
+                for j, ann in enumerate(dataset.annotations)
+                if ann.image_id == image_id and tuple(point) in ann]
+    assert list(zip(point_positions.tolist(), annotation_positions.tolist())) == expected
+
+    # one image for all the points
+    image_id = dataset.annotations[0].image_id
+    point_positions, annotation_positions = index.contains_points(points, image_id)
+    assert all(dataset.annotations[j].image_id == image_id for j in annotation_positions)
+    point_positions, _ = index.contains_points(np.zeros((0, 2)), image_id)
+    assert len(point_positions) == 0
+
+
+def test_intersects(dataset):
+    index = AnnotationIndex.of_dataset(dataset)
+    region = Box.of_box(0, 0, 100, 100)
+    for img in dataset.images:
+        expected = [j for j, ann in enumerate(dataset.annotations)
+                    if ann.image_id == img.id and ann.bbox.xtl <= 100 and ann.bbox.ytl <= 100]
+        assert index.intersects(region, img.id).tolist() == expected
+    assert len(index.intersects(region, -1)) == 0
+
+
+def test_box_contains_points(dataset):
+    rng = np.random.default_rng(0)
+    image_ids = rng.choice([img.id for img in dataset.images], 2000)
+    points = rng.integers(0, 600, (2000, 2)).astype(float)
+
+    annotation_positions, point_positions = box_contains_points(dataset, points, image_ids)
+    expected = [(j, i) for j, ann in enumerate(dataset.annotations)
+                for i, (point, image_id) in enumerate(zip(points, image_ids))
+                if ann.image_id == image_id and tuple(point) in ann.bbox]
+    assert list(zip(annotation_positions.tolist(), point_positions.tolist())) == expected
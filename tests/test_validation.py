@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from podm import coco
+from podm.box import Box, BoxArray
+from podm.validation import validate_boxes, validate_dataset
+
+
+def test_validate_boxes():
+    xyxy = [[0, 0, 10, 10], [5, 0, 1, 10], [0, 0, 0, 10], [np.nan, 0, 10, 10], [-1, 0, 10, 10], [0, 0, 10, 30]]
+    report = validate_boxes(xyxy)
+    assert not report.is_valid
+    assert report.inverted.tolist() == [1]
+    assert report.zero_area.tolist() == [2]
+    assert report.nan.tolist() == [3]
+    assert len(report.out_of_image) == 0
+
+    report = validate_boxes(BoxArray(xyxy), image_width=[20, 0], image_height=[20, 0], image=[0, 0, 0, 0, 0, 1])
+    assert report.out_of_image.tolist() == [4]
+    assert set(report.problems) == {'nan', 'inverted', 'zero_area', 'out_of_image'}
+    assert 'inverted=1 [1]' in str(report)
+
+    assert validate_boxes(np.zeros((0, 4))).is_valid
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_validate_dataset(columnar):
+    dataset = coco.PCOCOObjectDetectionDataset(columnar=columnar)
+    for i in range(2):
+        img = coco.PCOCOImage()
+        img.id = i
+        img.file_name = str(i)
+        img.width = 20
+        img.height = 20
+        dataset.images.append(img)
+        cat = coco.PCOCOCategory()
+        cat.id = i
+        cat.name = str(i)
+        dataset.categories.append(cat)
+    # duplicate image id
+    dataset.images.append(dataset.images[0])
+
+    for i, (image_id, category_id, b) in enumerate([(0, 0, Box.of_box(0, 0, 10, 10)),
+                                                     (1, 5, Box.of_box(0, 0, 30, 10)),
+                                                     (7, 1, Box.of_box(0, 0, 10, 10))]):
+        ann = coco.PCOCOBoundingBox()
+        ann.id = min(i, 1)
+        ann.image_id = image_id
+        ann.category_id = category_id
+        ann.set_box(b)
+        dataset.annotations.append(ann)
+    ann = coco.PCOCOSegments()
+    ann.id = 3
+    ann.image_id = 0
+    ann.category_id = 0
+    dataset.annotations.append(ann)
+
+    report = validate_dataset(dataset)
+    assert isinstance(dataset.annotations, coco.AnnotationStore) == columnar
+    assert report.out_of_image.tolist() == [1]
+    assert report.dangling_category_ids.tolist() == [1]
+    assert report.dangling_image_ids.tolist() == [2]
+    # a segment without polygons has no bounding box
+    assert report.nan.tolist() == [3]
+    assert report.duplicate_annotation_ids == [1]
+    assert report.duplicate_image_ids == [0]
+    assert report.duplicate_category_ids == []